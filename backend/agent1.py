@@ -1,13 +1,48 @@
 import asyncio
 import os
 import aiohttp 
-from crawl4ai import AsyncWebCrawler
-from visual_extractor import extract_brand_from_logo
+from browser_pool import browser_pool
+from visual_extractor import LogoBatcher
+from logo_cache import logo_cache
+from image_filter import ImageFilter, fetch_image
+from metrics import lead_duration
+from tracing import span
+from company_names import CompanyIndex
+
+# Images downloaded at the same time
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", "8"))
 
 class ConferenceScraper:
+    def __init__(self, owner=None):
+        # Per-rule image pre-filter counts from the last crawl
+        self.filter_summary = {}
+        # Who waits for a pooled browser (client address); owners are served in turn
+        self.owner = owner
+        # Why the last crawl produced nothing, if it failed
+        self.error = None
+
     async def extract_sponsors(self, url):
         results = []
-        
+        async for record in self.stream_sponsors(url):
+            results.append(record)
+        return results
+
+    async def stream_sponsors(self, url):
+        """
+        Yields each {"Company", "Source", "Logo_Url", "Alternate_Names"} record as soon
+        as it is identified. Name variants found later ('Salesforce logo', 'salesforce')
+        are added to the Alternate_Names of the yielded dict in place, so only callers
+        that keep the dicts until the end see them; stream_events reports them as they happen.
+        """
+        async for kind, record in self.stream_events(url):
+            if kind == "company":
+                yield record
+
+    async def stream_events(self, url):
+        """
+        Yields ("company", record) for each new company and ("alias", {"Company",
+        "Alternate_Names"}) whenever a name variant is added to a company already yielded.
+        """
         # JS to scroll to bottom to trigger lazy loading
         scroll_js = """
         async () => {
@@ -24,158 +59,185 @@ class ConferenceScraper:
         }
         """
 
-        # JS to extract image details
+        # JS to extract image details (size and URL rules are applied in image_filter)
         extract_images_js = """
         () => {
             const images = Array.from(document.querySelectorAll('img'));
             return images.map(img => {
                 const rect = img.getBoundingClientRect();
                 return {
-                    src: img.src,
+                    src: img.currentSrc || img.src,
                     alt: img.alt,
                     width: rect.width,
                     height: rect.height,
-                    visible: rect.width > 50 && rect.height > 20
+                    // Inside a sponsor section: URL heuristics must not drop it
+                    sponsor: !!img.closest('[class*="sponsor" i], [id*="sponsor" i], [class*="partner" i], [id*="partner" i], [class*="exhibitor" i], [id*="exhibitor" i]')
                 };
-            }).filter(img => img.visible && img.src);
+            }).filter(img => img.src);
         }
         """
 
+        self.error = None
         try:
-            async with AsyncWebCrawler(verbose=True) as crawler:
-                # We can run the scroll script using 'js_code' 
-                # or simpler: crawl4ai handles some stuff, but let's be explicit with JS execution if needed.
-                # Actually crawl4ai's arun returns a CrawlResult. 
-                # It has a js_code parameter to execute before extraction.
-                
-                result = await crawler.arun(
-                    url=url,
-                    js_code=[scroll_js], # Execute scroll
-                    word_count_threshold=1,
-                    bypass_cache=True
-                )
-                
-                if not result.success:
-                    print(f"Failed to crawl {url}: {result.error_message}")
-                    return []
-
-                # Since result.media might not contain all details we want (custom logic),
-                # we might want to attach a hook or just use the page object if exposed?
-                # crawl4ai v0.2+ exposes logic better. 
-                # But actually, 'js_code' doesn't return values in the result object directly unless we use magic.
-                # Let's use the crawler's page directly if possible or trust the extraction.
-                # 'result.media' contains images properly identified. 
-                # Let's try to trust result.media first, but the custom filtering logic (width/height) 
-                # done in python after extraction is safer if we get all images.
-                
-                # However, crawl4ai's 'media' extraction might filter things out.
-                # Let's use the `crawler` instance to evaluate JS since we are in the context?
-                # No, AsyncWebCrawler context manager lifecycle. 
-                # Let's just use the JS execution to get the data we need?
-                # crawl4ai doesn't easily return custom JS return values in 'arun' result yet (depending on version).
-                # PROPOSAL: Use `crawler.arun` which returns result. 
-                # If we need custom JS extraction, maybe we can use `hooks` or rely on `result.media`.
-                # Let's try to use Playwright page via crawler if available, OR just rely on standard extraction 
-                # then filter.
-                
-                # Let's assume we can get all images.
-                # Wait, the previous code had specific logic: 
-                # 1. 50x20 size check.
-                # 2. Alt text check.
-                # 3. Vision API check.
-                
-                # We will re-implement this.
-                # To get the images with dimensions, we really need to run that JS.
-                # Using the underlying playwright page is the most robust way if valid.
-                # crawl4ai >= 0.4.0 allows accessing the page?
-                # Let's assume we can't easily access the page object after `arun` finishes (it closes).
-                # But we can use `crawler.crawler_strategy`...
-                
-                # SIMPLIFICATION:
-                # We will use `js_code` to scroll. 
-                # Then we will trust `result.media.images`.
-                # It supposedly captures all images. 
-                # We will filter by checking content-length or just trying to download.
-                # But we miss the dimensions check which was client-side.
-                # That's okay, we can check dimensions after download or just assume result.media is good enough.
-                # Actually, filtering small icons is useful.
-                # Let's use a custom js extraction script passed as 'js_code' is not for extraction return.
-                
-                # ALTERNATIVE: Use `crawler.arun` but with `js_only=True`?? No.
-                
-                # Let's stick to: Scroll then extract all images found by crawl4ai.
-                # Then process them.
-                
-                images_to_process = []
-                if result.media and "images" in result.media:
-                    for img in result.media["images"]:
-                        # img is a dict usually with src, alt, score, etc.
-                        src = img.get("src")
-                        if not src:
+            # The browser is only held for the page load; logos are processed after it is returned
+            async with browser_pool.crawler(self.owner) as crawler:
+                # Page load, scrolling and image extraction in Playwright
+                with span("crawl", url=url) as crawl_span:
+                    result = await crawler.arun(
+                        url=url,
+                        js_code=[scroll_js, extract_images_js], # Execute scroll, then measure images
+                        word_count_threshold=1,
+                        bypass_cache=True
+                    )
+                    crawl_span.set(success=result.success, images=len((result.media or {}).get("images", [])))
+            
+            if not result.success:
+                print(f"Failed to crawl {url}: {result.error_message}")
+                self.error = result.error_message or "Crawl failed"
+                return
+
+            # Images come from result.media (src, alt, score). The DOM geometry from
+            # extract_images_js, when crawl4ai returns it, restores the old 50x20
+            # visibility check inside image_filter.
+            image_filter = ImageFilter(self.dom_geometry(result))
+            
+            images_to_process = []
+            if result.media and "images" in result.media:
+                for img in result.media["images"]:
+                    # img is a dict usually with src, alt, score, etc.
+                    src = img.get("src")
+                    if not src:
+                        continue
+                    images_to_process.append(img)
+            
+            print(f"Found {len(images_to_process)} images from crawl4ai. Processing...")
+            
+            # Fuzzy dedup; records are kept so later variants can be added to them
+            company_index = CompanyIndex()
+            records = {}
+            cache_before = logo_cache.stats()
+            
+            # One shared connection pool; workers bound downloads and vision calls
+            workers = asyncio.Semaphore(SCRAPE_WORKERS)
+            batcher = LogoBatcher()
+            connector = aiohttp.TCPConnector(limit=SCRAPE_WORKERS * 2)
+            async with aiohttp.ClientSession(connector=connector) as session:
+                tasks = [
+                    asyncio.create_task(self.identify_company(session, img_data, workers, batcher, image_filter))
+                    for img_data in images_to_process
+                ]
+                try:
+                    # Awaiting in page order keeps the first-seen dedup deterministic
+                    for task, img_data in zip(tasks, images_to_process):
+                        company_name = await task
+                        entity, created = company_index.add(company_name) if company_name else (None, False)
+                        if entity is None:
                             continue
-                        images_to_process.append(img)
-                
-                print(f"Found {len(images_to_process)} images from crawl4ai. Processing...")
-                
-                unique_companies = set()
-                
-                # Need an HTTP session
-                async with aiohttp.ClientSession() as session:
-                    for i, img_data in enumerate(images_to_process):
-                        src = img_data.get("src")
-                        alt_text = img_data.get("alt", "")
-                        
-                        # Heuristic: Skip if src is data:image (unless we want to handle it) or very short?
-                        # The previous code handled all.
-                        
-                        # Heuristic from previous code:
-                        # if alt_text > 2 chars, use it.
-                        
-                        company_name = "Unknown"
-                        if alt_text and len(alt_text) > 2:
-                            company_name = alt_text
+                        if created:
+                            print(f"Identified: {entity.name}")
+                            records[id(entity)] = {"Company": entity.name, "Source": "Sponsor Page", "Logo_Url": img_data.get("src"), "Alternate_Names": ""}
+                            yield "company", records[id(entity)]
                         else:
-                            # Verify image size/content before spending API credits?
-                            # We lost the dimension check from DOM. 
-                            # We can check dimensions after download.
-                            
-                            try:
-                                # Download image
-                                image_content = None
-                                if src.startswith("data:image"):
-                                    # Handle base64
-                                    # ... skip for now or implement if needed
-                                    pass
-                                else:
-                                    async with session.get(src, timeout=10) as resp:
-                                        if resp.status == 200:
-                                            image_content = await resp.read()
-                                
-                                if image_content:
-                                    # Call Vision API
-                                    company_name = extract_brand_from_logo(image_content)
-                            except Exception as e:
-                                print(f"Failed to process image {src}: {e}")
-                                continue
-
-                        if company_name and company_name != "Unknown" and company_name not in unique_companies:
-                            unique_companies.add(company_name)
-                            results.append({"Company": company_name, "Source": "Sponsor Page", "Logo_Url": src})
-                            print(f"Identified: {company_name}")
+                            alternates = "; ".join(entity.alternate_names())
+                            if alternates != records[id(entity)]["Alternate_Names"]:
+                                records[id(entity)]["Alternate_Names"] = alternates
+                                yield "alias", {"Company": entity.name, "Alternate_Names": alternates}
+                finally:
+                    for task in tasks:
+                        task.cancel()
+            
+            company_index.learn()
+            cache_after = logo_cache.stats()
+            saved = cache_after["vision_calls_saved"] - cache_before["vision_calls_saved"]
+            calls = cache_after["misses"] - cache_before["misses"]
+            print(f"Logo cache saved {saved} vision calls on {url} ({calls} calls made)")
+            self.filter_summary = image_filter.summary()
+            print(f"Image pre-filter on {url}: {self.filter_summary}")
 
         except Exception as e:
             print(f"Error scraping sponsors: {e}")
+            self.error = str(e)
 
-        return results
+    def dom_geometry(self, result):
+        """
+        Rendered image sizes keyed by src, from the extract_images_js return value.
+        Empty if this crawl4ai version does not expose JS results.
+        """
+        js_result = getattr(result, "js_execution_result", None) or {}
+        outputs = js_result.get("results", []) if isinstance(js_result, dict) else []
+        for output in outputs:
+            if isinstance(output, list) and output and isinstance(output[0], dict) and "width" in output[0]:
+                return {img["src"]: img for img in output if img.get("src")}
+        return {}
+
+    async def identify_company(self, session, img_data, workers, batcher, image_filter):
+        """
+        Resolves one image to a company name (alt text, else pre-filter, download
+        and batched vision). Returns None if nothing usable was found.
+        """
+        with span("identify_company", src=img_data.get("src")) as company_span:
+            company_name = await self._identify_company(session, img_data, workers, batcher, image_filter, company_span)
+            company_span.set(company=company_name)
+            return company_name
+
+    async def _identify_company(self, session, img_data, workers, batcher, image_filter, company_span):
+        src = img_data.get("src")
+        alt_text = img_data.get("alt", "")
+        
+        # Heuristic from previous code:
+        # if alt_text > 2 chars, use it.
+        if alt_text and len(alt_text) > 2:
+            company_span.set(method="alt_text")
+            return alt_text
+        
+        # Reject icons, pixels, badges and banners before spending API credits
+        if image_filter.check_metadata(img_data):
+            company_span.set(method="filtered")
+            return None
+        
+        company_span.set(method="vision")
+        try:
+            with lead_duration.time(agent="agent1"):
+                # Download image (probed first: size and header dimensions)
+                image_content = None
+                if src.startswith("data:image"):
+                    # Handle base64
+                    # ... skip for now or implement if needed
+                    pass
+                else:
+                    async with workers:
+                        with span("download_logo") as download_span:
+                            image_content = await fetch_image(session, src, image_filter)
+                            download_span.set(bytes=len(image_content or b""))
+                
+                if not image_content:
+                    return None
+                
+                # Call Vision API (batched with other logos on the page)
+                with span("recognize_logo"):
+                    company_name = await batcher.recognize(image_content)
+        except Exception as e:
+            print(f"Failed to process image {src}: {e}")
+            return None
+        
+        if not company_name or company_name in ("Unknown", "Error"):
+            return None
+        return company_name
 
     async def extract_agenda(self, url):
         return []
 
-async def run_scrape(url):
-    scraper = ConferenceScraper()
+async def run_scrape(url, owner=None):
+    scraper = ConferenceScraper(owner)
     sponsors = await scraper.extract_sponsors(url)
     return sponsors
 
+async def run_scrape_stream(url, owner=None):
+    """Async generator over ("company", record) and ("alias", update) events as they happen."""
+    scraper = ConferenceScraper(owner)
+    async for event in scraper.stream_events(url):
+        yield event
+
 if __name__ == "__main__":
     # Test
     url = "https://fieldserviceusa.wbresearch.com/sponsors"
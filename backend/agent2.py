@@ -1,36 +1,258 @@
 import os
 import pandas as pd
-from openai import OpenAI
-from duckduckgo_search import DDGS
 from dotenv import load_dotenv
-import time
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import threading
+from contextlib import asynccontextmanager
 import json
-from functools import lru_cache
+import hashlib
+from rate_limiter import openai_chat_completion, openai_chat_completion_async
+from disk_cache import DiskCache, cache_path
+from batching import MicroBatcher
+from single_flight import SingleFlight
+from providers import api_keys, chat_client, async_chat_client, search_client
+from metrics import search_requests, search_request_duration, lead_duration
+from tracing import span, annotate
+from company_names import collapse_records
 
 load_dotenv()
 
 # Configure multiple OpenAI API keys for parallel processing
-openai_keys = [
-    os.getenv("OPENAI_API_KEY"),
-    os.getenv("OPENAI_API_KEY_2"),
-    os.getenv("OPENAI_API_KEY_3"),
-    os.getenv("OPENAI_API_KEY_4")
-]
-openai_keys = [key for key in openai_keys if key]  # Filter out None values
+openai_keys = api_keys("OPENAI_API_KEY", "OPENAI_API_KEY_2", "OPENAI_API_KEY_3", "OPENAI_API_KEY_4")
 
 # Create OpenAI clients for each API key
-clients = [OpenAI(api_key=key) for key in openai_keys]
+clients = [chat_client(key) for key in openai_keys]
+
+# Persistent cache for DuckDuckGo search results, keyed by query template + normalized company
+search_cache = DiskCache(
+    os.getenv("SEARCH_CACHE_PATH", cache_path("search_cache.sqlite3")),
+    max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "20000")),
+    ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL_DAYS", "30")) * 86400,
+)
+
+# Fit scores from earlier runs keyed by analysis_fingerprint, for incremental re-validation
+analysis_store = DiskCache(
+    os.getenv("ANALYSIS_STORE_PATH", cache_path("analysis_store.sqlite3")),
+    max_entries=int(os.getenv("ANALYSIS_STORE_MAX_ENTRIES", "50000")),
+)
+
+# Reuse stored fit scores for companies whose inputs have not changed (per run: ICPValidator(incremental=...))
+INCREMENTAL = os.getenv("AGENT2_INCREMENTAL", "1") != "0"
+
+# Enrichment queries run for every company
+ENRICHMENT_QUERIES = [
+    # Query 1: Focus on complexity and services
+    "{company} technical field service maintenance operations",
+    # Query 2: Look for specific product lines
+    "{company} complex equipment manufacturing product support",
+]
+
+# Concurrency limits for the async validation engine
+PER_KEY_CONCURRENCY = int(os.getenv("AGENT2_PER_KEY_CONCURRENCY", "8"))
+MAX_IN_FLIGHT = int(os.getenv("AGENT2_MAX_IN_FLIGHT", "32"))
+SEARCH_CONCURRENCY = int(os.getenv("AGENT2_SEARCH_CONCURRENCY", "4"))
+
+# Companies scored per request (1 = one request per company), and how long to wait for a batch to fill
+BATCH_SIZE = int(os.getenv("AGENT2_BATCH_SIZE", "5"))
+BATCH_WAIT = float(os.getenv("AGENT2_BATCH_WAIT", "0.5"))
+
+ANALYSIS_MODEL = "gpt-4o"
+
+PLATFORM_DESCRIPTION = """You are the Lead Solutions Engineer at Ascendo AI. 
+
+**Our Platform Value:** We focus on moving from reactive to predictive service with "Agentic Intelligence."
+We specialize in:
+- **Predictive Spare Parts & Logistics Planning**: Optimizing inventory across depots to meet SLAs and reduce "firefighting."
+- **Agentic AI for Service Engineers**: An "AI coworker" that automates workflows and guides field engineers through complex troubleshooting.
+- **Autonomous Self-Service AI Agents**: No-code agents for websites/apps that let customers resolve issues independently.
+- **Predictive Churn & Escalation Analytics**: Identifying patterns to flag at-risk accounts early and improve retention.
+- **Enterprise Knowledge Intelligence**: Synthesizing unstructured data (Slack, logs) into "Governed Knowledge" for faster resolution."""
+
+EVALUATION_INSTRUCTIONS = """**Evaluation Instructions:**
+1. **Analyze Technical Depth:** Does this company manage complex, high-stakes hardware?
+2. **Identify Pain Points:** Do they struggle with parts, tribal knowledge, or high ticket volume?
+3. **Product Fit:** Which of the 5 Ascendo products solves their #1 problem?"""
+
+SCORING_RUBRIC = """**Scoring Rubric:**
+- **9-10**: Designs, sells or maintains complex equipment (medical devices, semiconductor tools, industrial
+  machinery, energy, telecom or data-center infrastructure) with its own field service or technical support
+  organisation, and the Industry Context shows a concrete service pain: SLAs, uptime, spare parts, escalations,
+  long resolution times or knowledge locked in experienced engineers.
+- **7-8**: Clear installed-base service business (maintenance contracts, field engineers, a support center),
+  but the pain is implied rather than stated, or the equipment is only moderately complex.
+- **5-6**: Some service or support operation, but it is not central to the business, is largely outsourced, or
+  the context is too thin to judge how complex it is.
+- **3-4**: Mainly software, consulting, distribution or retail with a light support function; little hardware
+  in the field and few reasons to predict parts or escalations.
+- **1-2**: No service operation we can help (media, agencies, associations, event organisers, investors), or a
+  company whose identity cannot be established from the name and context.
+
+**Categories** (must agree with the score):
+- **High Fit**: score 8-10.
+- **Moderate Fit**: score 5-7.
+- **Competitor**: sells AI or software for field service, customer support or service knowledge (for example
+  field service management, ticketing or support-automation vendors). Score these 1-3, whatever their size.
+- **Out of Profile**: score 1-4 and not a competitor.
+
+**Choosing the Product** (pick exactly one, spelled as in the output format):
+- **Predictive Spare Parts**: depots, parts logistics, inventory cost, SLA penalties, multi-site installed base.
+- **Agentic AI for Engineers**: large field or remote engineering teams, complex troubleshooting, long onboarding,
+  expertise concentrated in a few senior engineers.
+- **Autonomous Self-Service**: high ticket volume from many customers, repetitive how-to questions, customer
+  portals or apps that could deflect cases.
+- **Predictive Churn Analytics**: subscription or contract renewals, escalations, at-risk key accounts, NPS or
+  customer health concerns.
+- **Enterprise Knowledge Intelligence**: scattered manuals, logs, chat threads and tickets; inconsistent answers
+  between teams; documentation that cannot keep up with product releases.
+When several apply, choose the one that addresses the most expensive problem visible in the context.
+
+**Evidence Rules:**
+- Use only the Company name and its Industry Context. Do not invent products, customers, revenue or headcount.
+- If the context says the company information was not found, judge from the name alone and score no higher
+  than 5 unless the name unambiguously identifies a well-known equipment manufacturer.
+- Context may mention other companies with similar names; ignore facts that clearly describe a different company.
+- The reasoning must quote or paraphrase the signals you relied on, then explain the score and the product
+  choice in two to four sentences.
+- The hook is one sentence addressed to the company, ties its own situation to the chosen product and names a
+  concrete outcome (fewer truck rolls, faster resolution, lower inventory, fewer escalations). No greetings,
+  no exclamation marks, no claims about the company that the context does not support."""
+
+ANALYSIS_FIELDS = '''    "fit_score": 1-10,
+    "category": "High Fit / Moderate Fit / Competitor / Out of Profile",
+    "recommended_product": "Predictive Spare Parts | Agentic AI for Engineers | Autonomous Self-Service | Predictive Churn Analytics | Enterprise Knowledge Intelligence",
+    "reasoning": "Step-by-step logic explaining the score and product choice.",
+    "hook": "A 'product-led' hook (e.g., 'Since you manage inventory, our Predictive Logistics can...')"'''
+
+BATCH_ANALYSIS_FIELDS = ANALYSIS_FIELDS.replace("\n    ", "\n            ")
+
+# The system message is the same byte for byte on every single and batched
+# scoring call and is longer than OpenAI's 1024-token prompt-cache minimum, so
+# calls after the first are served from the prompt cache. Lead data only
+# appears in the user message after it.
+SYSTEM_PROMPT = f"""You are a sales intelligence analyst. Always respond with valid JSON.
+
+{PLATFORM_DESCRIPTION}
+
+{EVALUATION_INSTRUCTIONS}
+
+{SCORING_RUBRIC}
+
+**Required JSON Output for one lead** (the message starts with "Lead Analysis"):
+{{
+{ANALYSIS_FIELDS}
+}}
+
+**Required JSON Output for several leads** (the message starts with "Leads to Analyze"):
+{{
+    "results": [
+        {{
+            "id": "<lead id>",
+        {BATCH_ANALYSIS_FIELDS}
+        }}
+    ]
+}}
+Evaluate every lead independently, using only its own Industry Context.
+Return exactly one entry in "results" per lead.
+"""
+
+REQUIRED_ANALYSIS_FIELDS = ("fit_score", "category", "recommended_product", "reasoning", "hook")
 
-# In-memory cache for DuckDuckGo search results
-search_cache = {}
+# Changes with any edit to the scoring prompts, so analyses from older prompts are not reused
+PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode()).hexdigest()[:12]
+
+# Concurrent enrichments of the same company share one set of searches
+enrich_flight = SingleFlight("enrich_company")
+
+# DDGS sessions are not shared between worker threads
+_thread_local = threading.local()
+
+def get_thread_ddgs():
+    """Return a DDGS session owned by the calling thread."""
+    if not hasattr(_thread_local, "ddgs"):
+        _thread_local.ddgs = search_client()
+    return _thread_local.ddgs
+
+def normalize_company_key(company_name):
+    """Case- and whitespace-insensitive cache key for a company name."""
+    return " ".join(str(company_name).lower().split())
+
+def analysis_fingerprint(company_name, context):
+    """
+    Hash of everything a fit score depends on: normalized company name,
+    enrichment context, prompt version and model.
+    """
+    context_hash = hashlib.sha256(str(context).encode()).hexdigest()
+    parts = [normalize_company_key(company_name), context_hash, PROMPT_VERSION, ANALYSIS_MODEL]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+def is_valid_analysis(record):
+    """True if record has every required field and a fit score between 1 and 10."""
+    if not isinstance(record, dict):
+        return False
+    if any(record.get(field) in (None, "") for field in REQUIRED_ANALYSIS_FIELDS):
+        return False
+    try:
+        fit_score = float(record["fit_score"])
+    except (TypeError, ValueError):
+        return False
+    return 1 <= fit_score <= 10
+
+class KeyPool:
+    """
+    Hands out async OpenAI clients, capping concurrent requests per API key.
+    Must be created inside the event loop that uses it.
+    """
+    def __init__(self, keys, per_key_limit=PER_KEY_CONCURRENCY):
+        self.clients = [async_chat_client(key) for key in keys]
+        self.semaphores = [asyncio.Semaphore(per_key_limit) for _ in keys]
+        self.in_use = [0] * len(keys)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrow the client of the least busy key."""
+        index = min(range(len(self.clients)), key=lambda i: self.in_use[i])
+        self.in_use[index] += 1
+        try:
+            async with self.semaphores[index]:
+                yield self.clients[index]
+        finally:
+            self.in_use[index] -= 1
+
+    async def close(self):
+        for client in self.clients:
+            await client.close()
+
+class ScoringBatcher(MicroBatcher):
+    """
+    Collects enriched leads from concurrent tasks into multi-company scoring
+    requests. A batch is sent when it is full or BATCH_WAIT seconds after its
+    first lead arrived. Must be used from a single event loop.
+    """
+    span_name = "scoring_batch"
+
+    def __init__(self, validator, key_pool, batch_size=BATCH_SIZE, max_wait=BATCH_WAIT):
+        # KeyPool already caps requests per key; this only bounds open batches
+        concurrency = PER_KEY_CONCURRENCY * max(1, len(key_pool.clients))
+        super().__init__(self._score_batch, batch_size, max_wait, concurrency)
+        self.validator = validator
+        self.key_pool = key_pool
+
+    async def score(self, company, context):
+        """analysis_json for one lead, scored as part of a batch."""
+        return await self.submit((company, context))
+
+    async def _score_batch(self, leads):
+        annotate(companies=[company for company, _ in leads])
+        return await self.validator.score_leads_async(self.key_pool, leads)
 
 class ICPValidator:
-    def __init__(self):
-        self.ddgs = DDGS()
+    def __init__(self, incremental=INCREMENTAL):
         self.clients = clients
         self.current_client_index = 0
+        # incremental reuses analysis_store entries; new analyses are stored either way
+        self.incremental = incremental
+        self.revalidation = {"reused": 0, "recomputed": 0}
+        self.lock = threading.Lock()
         
     def get_next_client(self):
         """Round-robin through OpenAI clients for load balancing."""
@@ -38,42 +260,93 @@ class ICPValidator:
         self.current_client_index += 1
         return client
         
+    def search_with_cache(self, company_name, template, max_results=2):
+        """
+        Runs one enrichment query, served from search_cache when possible.
+        """
+        cache_key = f"{template}|{normalize_company_key(company_name)}"
+        with span("search", agent="agent2") as search_span:
+            cached = search_cache.get(cache_key)
+            search_span.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+            
+            outcome = "error"
+            try:
+                with search_request_duration.time(agent="agent2"):
+                    results = get_thread_ddgs().text(template.format(company=company_name), max_results=max_results)
+                outcome = "ok"
+            finally:
+                search_requests.inc(agent="agent2", outcome=outcome)
+            bodies = [r['body'] for r in results] if results else []
+            
+            # Only successful searches are cached; failures raise before this point
+            search_cache.set(cache_key, bodies)
+            return bodies
+    
     def enrich_company(self, company_name):
         """
         Dual-source enrichment with caching: searches for technical complexity and product support signals.
+        Concurrent calls for the same company wait for the first one instead of searching again.
         """
-        # Check cache first
-        cache_key = f"enrich_{company_name}"
-        if cache_key in search_cache:
-            print(f"Using cached search for {company_name}")
-            return search_cache[cache_key]
-        
-        print(f"Searching for {company_name}...")
+        with span("enrich_company"):
+            return enrich_flight.do(normalize_company_key(company_name), self._enrich_company, company_name)
+    
+    def _enrich_company(self, company_name):
+        print(f"Enriching {company_name}...")
         context_parts = []
         
         try:
-            # Query 1: Focus on complexity and services
-            query1 = f"{company_name} technical field service maintenance operations"
-            results1 = self.ddgs.text(query1, max_results=2)
-            if results1:
-                context_parts.extend([r['body'] for r in results1])
-            
-            # Query 2: Look for specific product lines
-            query2 = f"{company_name} complex equipment manufacturing product support"
-            results2 = self.ddgs.text(query2, max_results=2)
-            if results2:
-                context_parts.extend([r['body'] for r in results2])
-                
+            for template in ENRICHMENT_QUERIES:
+                context_parts.extend(self.search_with_cache(company_name, template))
         except Exception as e:
             print(f"Search failed for {company_name}: {e}")
         
-        result = " ".join(context_parts) if context_parts else f"{company_name} company information not found."
-        
-        # Cache the result
-        search_cache[cache_key] = result
-        
-        return result
+        return " ".join(context_parts) if context_parts else f"{company_name} company information not found."
+    
+    def stored_analysis(self, company, context):
+        """
+        analysis_json from an earlier run with identical inputs, or None. Counts
+        the lead as reused or recomputed.
+        """
+        analysis_json = analysis_store.get(analysis_fingerprint(company, context)) if self.incremental else None
+        with self.lock:
+            self.revalidation["reused" if analysis_json is not None else "recomputed"] += 1
+        return analysis_json
+    
+    def store_analysis(self, company, context, analysis_json):
+        """Keeps a complete analysis for later runs."""
+        try:
+            if not is_valid_analysis(json.loads(analysis_json or "null")):
+                return
+        except ValueError:
+            return
+        analysis_store.set(analysis_fingerprint(company, context), analysis_json)
     
+    def build_analysis_messages(self, company, context):
+        """
+        Chat messages scoring a single company: the shared system prompt, then
+        the lead.
+        """
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"**Lead Analysis:**\nCompany: {company}\nIndustry Context: {context}\n"},
+        ]
+
+    def build_batch_analysis_messages(self, leads):
+        """
+        Chat messages scoring several companies at once. leads is a list of
+        (lead_id, company, context); each company keeps its own context.
+        """
+        lead_blocks = "\n\n".join(
+            f"[Lead {lead_id}]\nCompany: {company}\nIndustry Context: {context}"
+            for lead_id, company, context in leads
+        )
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"**Leads to Analyze:**\n{lead_blocks}\n"},
+        ]
+
     def analyze_company(self, company, source, context, index):
         """
         Uses OpenAI GPT-4 to analyze company fit.
@@ -81,43 +354,13 @@ class ICPValidator:
         # Get the next available client (round-robin)
         client = self.get_next_client()
         
-        prompt = f"""
-You are the Lead Solutions Engineer at Ascendo AI. 
-
-**Our Platform Value:** We focus on moving from reactive to predictive service with "Agentic Intelligence."
-We specialize in:
-- **Predictive Spare Parts & Logistics Planning**: Optimizing inventory across depots to meet SLAs and reduce "firefighting."
-- **Agentic AI for Service Engineers**: An "AI coworker" that automates workflows and guides field engineers through complex troubleshooting.
-- **Autonomous Self-Service AI Agents**: No-code agents for websites/apps that let customers resolve issues independently.
-- **Predictive Churn & Escalation Analytics**: Identifying patterns to flag at-risk accounts early and improve retention.
-- **Enterprise Knowledge Intelligence**: Synthesizing unstructured data (Slack, logs) into "Governed Knowledge" for faster resolution.
-
-**Lead Analysis:**
-Company: {company}
-Industry Context: {context}
-
-**Evaluation Instructions:**
-1. **Analyze Technical Depth:** Does this company manage complex, high-stakes hardware?
-2. **Identify Pain Points:** Do they struggle with parts, tribal knowledge, or high ticket volume?
-3. **Product Fit:** Which of the 5 Ascendo products solves their #1 problem?
-
-**Required JSON Output:**
-{{
-    "fit_score": 1-10,
-    "category": "High Fit / Moderate Fit / Competitor / Out of Profile",
-    "recommended_product": "Predictive Spare Parts | Agentic AI for Engineers | Autonomous Self-Service | Predictive Churn Analytics | Enterprise Knowledge Intelligence",
-    "reasoning": "Step-by-step logic explaining the score and product choice.",
-    "hook": "A 'product-led' hook (e.g., 'Since you manage inventory, our Predictive Logistics can...')"
-}}
-"""
-        
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a sales intelligence analyst. Always respond with valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
+            response = openai_chat_completion(
+                client,
+                label=company,
+                agent="agent2",
+                model=ANALYSIS_MODEL,
+                messages=self.build_analysis_messages(company, context),
                 response_format={"type": "json_object"},
                 temperature=0.7
             )
@@ -128,18 +371,92 @@ Industry Context: {context}
             print(f"OpenAI failed for {company}: {e}")
             return None
     
-    def process_single_lead(self, row_dict, index):
+    async def analyze_company_async(self, client, company, context):
         """
-        Process a single lead with enrichment and analysis.
+        Async variant of analyze_company using a borrowed AsyncOpenAI client.
         """
-        company = row_dict.get('Company', 'Unknown')
-        source = row_dict.get('Source', 'Unknown')
+        try:
+            response = await openai_chat_completion_async(
+                client,
+                label=company,
+                agent="agent2",
+                model=ANALYSIS_MODEL,
+                messages=self.build_analysis_messages(company, context),
+                response_format={"type": "json_object"},
+                temperature=0.7
+            )
+            
+            return response.choices[0].message.content
+            
+        except Exception as e:
+            print(f"OpenAI failed for {company}: {e}")
+            return None
+    
+    async def analyze_companies_batch_async(self, client, leads):
+        """
+        Scores several companies in one request. leads is a list of
+        (lead_id, company, context). Returns {lead_id: analysis_json} holding
+        only the entries that came back complete; the rest are left out.
+        """
+        label = f"batch of {len(leads)} ({leads[0][1]}...)"
+        
+        try:
+            response = await openai_chat_completion_async(
+                client,
+                label=label,
+                agent="agent2",
+                model=ANALYSIS_MODEL,
+                messages=self.build_batch_analysis_messages(leads),
+                response_format={"type": "json_object"},
+                temperature=0.7
+            )
+            results = json.loads(response.choices[0].message.content).get("results", [])
+        except Exception as e:
+            print(f"OpenAI batch failed for {label}: {e}")
+            return {}
+        
+        lead_ids = {lead_id for lead_id, _, _ in leads}
+        analyses = {}
+        for record in results if isinstance(results, list) else []:
+            if not isinstance(record, dict):
+                continue
+            lead_id = str(record.get("id", "")).strip()
+            # First complete answer per lead wins; unknown ids are ignored
+            if lead_id in lead_ids and lead_id not in analyses and is_valid_analysis(record):
+                analyses[lead_id] = json.dumps({field: record[field] for field in REQUIRED_ANALYSIS_FIELDS})
+        return analyses
+    
+    async def score_leads_async(self, key_pool, leads):
+        """
+        Scores a list of (company, context) pairs with one batched request and
+        re-runs any missing or malformed entries one company at a time.
+        Returns analysis_json (or None) per lead, in order.
+        """
+        numbered = [(str(i + 1), company, context) for i, (company, context) in enumerate(leads)]
+        analyses = {}
+        if len(numbered) > 1:
+            async with key_pool.acquire() as client:
+                analyses = await self.analyze_companies_batch_async(client, numbered)
+            missing = len(numbered) - len(analyses)
+            if missing:
+                print(f"Batch scoring returned {len(analyses)}/{len(numbered)} valid entries; retrying {missing} individually")
         
-        # Enrich (with caching)
-        context = self.enrich_company(company)
+        async def score_alone(company, context):
+            async with key_pool.acquire() as client:
+                return await self.analyze_company_async(client, company, context)
         
-        # Analyze
-        analysis_json = self.analyze_company(company, source, context, index)
+        retried = await asyncio.gather(*[
+            score_alone(company, context)
+            for lead_id, company, context in numbered if lead_id not in analyses
+        ])
+        retried = iter(retried)
+        return [analyses[lead_id] if lead_id in analyses else next(retried) for lead_id, _, _ in numbered]
+    
+    def build_result_row(self, row_dict, analysis_json):
+        """
+        Merges the parsed analysis into the lead row.
+        """
+        company = row_dict.get('Company', 'Unknown')
         
         # Parse results
         fit_score = 0
@@ -170,9 +487,100 @@ Industry Context: {context}
             "Hook": hook
         }
     
-    def process_leads(self, input_csv, output_csv):
+    def process_single_lead(self, row_dict, index):
         """
-        Process all leads from input CSV using parallel processing with multiple API keys.
+        Process a single lead with enrichment and analysis.
+        """
+        company = row_dict.get('Company', 'Unknown')
+        source = row_dict.get('Source', 'Unknown')
+        
+        with lead_duration.time(agent="agent2"), span("process_single_lead", company=company) as lead_span:
+            # Enrich (with caching)
+            context = self.enrich_company(company)
+            
+            # Analyze, unless an earlier run scored identical inputs
+            analysis_json = self.stored_analysis(company, context)
+            reused = analysis_json is not None
+            if not reused:
+                with span("analyze_company", batched=False):
+                    analysis_json = self.analyze_company(company, source, context, index)
+                self.store_analysis(company, context, analysis_json)
+            
+            result = self.build_result_row(row_dict, analysis_json)
+            lead_span.set(fit_score=result.get('Fit_Score'), scored=analysis_json is not None, reused=reused)
+        
+        return result
+    
+    async def process_single_lead_async(self, row_dict, key_pool, in_flight, search_limit, batcher=None):
+        """
+        Async variant of process_single_lead. Search runs in a worker thread,
+        scoring runs on whichever API key has spare capacity, batched with
+        other leads when a ScoringBatcher is given.
+        """
+        company = row_dict.get('Company', 'Unknown')
+        
+        async with in_flight:
+            with lead_duration.time(agent="agent2"), span("process_single_lead", company=company) as lead_span:
+                # Enrich (with caching)
+                async with search_limit:
+                    context = await asyncio.to_thread(self.enrich_company, company)
+                
+                # Analyze, unless an earlier run scored identical inputs
+                analysis_json = await asyncio.to_thread(self.stored_analysis, company, context)
+                reused = analysis_json is not None
+                if not reused:
+                    # A batched lead's time includes waiting for its batch to fill
+                    with span("analyze_company", batched=batcher is not None):
+                        if batcher is not None:
+                            analysis_json = await batcher.score(company, context)
+                        else:
+                            async with key_pool.acquire() as client:
+                                analysis_json = await self.analyze_company_async(client, company, context)
+                    await asyncio.to_thread(self.store_analysis, company, context, analysis_json)
+                
+                result = self.build_result_row(row_dict, analysis_json)
+                lead_span.set(fit_score=result.get('Fit_Score'), scored=analysis_json is not None, reused=reused)
+        
+        return result
+    
+    async def validate_dataframe_async(self, df, max_in_flight=MAX_IN_FLIGHT, progress=None, batch_size=BATCH_SIZE):
+        """
+        Validates every lead in df concurrently and returns the enriched DataFrame.
+        Total in-flight leads are capped by max_in_flight and each API key by
+        PER_KEY_CONCURRENCY; up to batch_size companies share one scoring
+        request. Name variants of one company are collapsed to a single lead first.
+        If given, progress.start(total) and progress.add_result(row) report progress.
+        """
+        rows = df.to_dict(orient='records')
+        collapsed = collapse_records(rows)
+        if len(collapsed) < len(rows):
+            print(f"Collapsed {len(rows)} leads to {len(collapsed)} companies")
+        rows = collapsed
+        if progress:
+            progress.start(len(rows))
+        
+        key_pool = KeyPool(openai_keys)
+        in_flight = asyncio.Semaphore(max_in_flight)
+        search_limit = asyncio.Semaphore(SEARCH_CONCURRENCY)
+        batcher = ScoringBatcher(self, key_pool, batch_size) if batch_size > 1 else None
+        
+        async def run_one(row_dict):
+            result = await self.process_single_lead_async(row_dict, key_pool, in_flight, search_limit, batcher)
+            if progress:
+                progress.add_result(result)
+            return result
+        
+        try:
+            # gather keeps results in input order
+            results = await asyncio.gather(*[run_one(row_dict) for row_dict in rows])
+        finally:
+            await key_pool.close()
+        
+        return pd.DataFrame(results)
+    
+    async def process_leads_async(self, input_csv, output_csv, max_in_flight=MAX_IN_FLIGHT, progress=None):
+        """
+        Process all leads from input CSV concurrently and save them to output_csv.
         """
         if not os.path.exists(input_csv):
             print("No raw file found for validation.")
@@ -181,26 +589,19 @@ Industry Context: {context}
         print(f"Validating leads from {input_csv}...")
         df = pd.read_excel(input_csv) if input_csv.endswith('.xlsx') else pd.read_csv(input_csv)
         
-        # Process in parallel using ThreadPoolExecutor
-        with ThreadPoolExecutor(max_workers=len(self.clients)) as executor:
-            # Submit all tasks
-            futures = []
-            for index, row in df.iterrows():
-                row_dict = row.to_dict()
-                future = executor.submit(self.process_single_lead, row_dict, index)
-                futures.append(future)
-                # Small delay to avoid overwhelming the API
-                time.sleep(0.1)
-            
-            # Collect results
-            results = [future.result() for future in futures]
+        new_df = await self.validate_dataframe_async(df, max_in_flight, progress)
         
         # Save results
-        new_df = pd.DataFrame(results)
         new_df.to_excel(output_csv, index=False)
         print(f"Saved enriched leads to {output_csv}")
         
         return output_csv
+    
+    def process_leads(self, input_csv, output_csv):
+        """
+        Process all leads from input CSV. Blocking wrapper around process_leads_async.
+        """
+        return asyncio.run(self.process_leads_async(input_csv, output_csv))
 
 if __name__ == "__main__":
     validator = ICPValidator()
@@ -1,80 +1,63 @@
 import os
 import pandas as pd
-import google.generativeai as genai
 from dotenv import load_dotenv
-from duckduckgo_search import DDGS
-import time
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from rate_limiter import gemini_generate_content
+from token_usage import bind_usage
+from tracing import span, bind_trace
+from single_flight import SingleFlight
+from strategy_store import strategy_key
+from providers import api_keys, gemini_model, search_client
+from metrics import search_requests, search_request_duration, lead_duration
 
 load_dotenv()
 
-# Configure Gemini with Pro model for better reasoning
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel('gemini-flash-latest')  # Using flash-latest as 1.5-pro doesn't exist
+GEMINI_MODEL_NAME = 'gemini-flash-latest'  # Using flash-latest as 1.5-pro doesn't exist
 
-class StrategyGenerator:
-    def __init__(self):
-        self.ddgs = DDGS()
-    
-    def find_contacts(self, company):
-        """
-        Search for key decision makers at the company.
-        """
-        print(f"Searching for contacts at {company}...")
-        try:
-            # Search for decision makers
-            query = f"{company} VP Field Service OR CTO OR Head of Operations OR Director Service linkedin"
-            results = self.ddgs.text(query, max_results=5)
-            
-            if results:
-                context = " ".join([r['body'] for r in results])
-                return context
-        except Exception as e:
-            print(f"Contact search failed for {company}: {e}")
-        
-        return "No contact information found."
-    
-    def generate_strategy(self, row_data):
-        """
-        Generates comprehensive sales strategy with contacts, analysis, and email.
-        """
-        company = row_data.get('Company', 'Unknown')
-        fit_score = row_data.get('Fit_Score', 0)
-        category = row_data.get('Category', 'N/A')
-        recommended_product = row_data.get('Recommended_Product', 'N/A')
-        reasoning = row_data.get('Reasoning', '')
-        hook = row_data.get('Hook', '')
-        
-        # Don't waste tokens on bad leads
-        if fit_score < 4:
-            return None
-        
-        # Find contacts
-        contact_context = self.find_contacts(company)
-        
-        prompt = f"""
-You are Agent 3, the "Revenue Strategist" for Ascendo AI.
+# Configure multiple Gemini API keys for parallel processing
+gemini_keys = api_keys("GEMINI_API_KEY", "GEMINI_API_KEY_2", "GEMINI_API_KEY_3", "GEMINI_API_KEY_4")
+GEMINI_API_KEY = gemini_keys[0] if gemini_keys else None
 
-**Company Analysis:**
-Company: {company}
-Fit Score: {fit_score}/10
-Category: {category}
-Agent 2 Recommendation: {recommended_product}
-Agent 2 Reasoning: {reasoning}
-Agent 2 Hook: {hook}
+# One (api_key, model) pair per key
+models = [(key, gemini_model(key, GEMINI_MODEL_NAME)) for key in gemini_keys]
+model = models[0][1] if models else None
 
-**Contact Research:**
-{contact_context}
+# Strategies generated at the same time (background and batch modes)
+AGENT3_CONCURRENCY = int(os.getenv("AGENT3_CONCURRENCY", str(max(2, 2 * len(gemini_keys)))))
+
+# Minimum Agent 2 fit score worth a strategy
+MIN_STRATEGY_FIT_SCORE = 4
+
+# Static instructions come first and are byte-identical across calls; at well
+# over Gemini's 1024-token minimum they are served from its implicit prompt
+# cache after the first call. Company data is appended after.
+STRATEGY_PROMPT_PREFIX = """
+You are Agent 3, the "Revenue Strategist" for Ascendo AI.
 
 **Ascendo AI Products:**
 - **ResolveGPT**: Turns manuals/logs into instant troubleshooting game plans. Reduces MTTR by 30%.
 - **SparesGPT**: Predicts part failures to protect SLAs and reduce inventory risk. Saves 20% on inventory costs.
 - **PreventGPT**: Uses sentiment and patterns to predict escalations before they happen. Reduces escalations by 40%.
 
-**Your Tasks:**
+**How Agent 2 Recommendations Map to Products:**
+- Predictive Spare Parts -> SparesGPT. Buyers: VP Service Operations, Director of Service Logistics, Supply Chain.
+  Talk about depot stock, parts availability, SLA penalties and emergency shipments.
+- Agentic AI for Engineers -> ResolveGPT. Buyers: VP Field Service, Head of Technical Support, Service Engineering.
+  Talk about first-time fix rate, repeat visits, onboarding time and expertise held by a few senior engineers.
+- Autonomous Self-Service -> ResolveGPT on customer-facing channels. Buyers: VP Customer Support, Digital Service.
+  Talk about ticket deflection, portal and in-app answers, and support cost per customer.
+- Predictive Churn Analytics -> PreventGPT. Buyers: VP Customer Success, Chief Customer Officer, Service Sales.
+  Talk about renewals, escalations, at-risk accounts and service contract attach rates.
+- Enterprise Knowledge Intelligence -> ResolveGPT with governed knowledge. Buyers: CTO, Head of Service Knowledge.
+  Talk about scattered manuals, tickets and chat threads turned into consistent, reviewed answers.
+Use the Ascendo product name in the email and the Agent 2 product name in "product".
+
+**Your Tasks** (for the company in the Company Analysis at the end):
 
 1. **Find Decision Makers** (UP TO 10 people, ONLY if you can find BOTH LinkedIn AND email):
-   Based on the contact research above, identify key decision makers at {company}.
+   Based on the Contact Research at the end, identify key decision makers at the company.
    Focus on: VP Field Service, CTO, Head of Operations, Director of Service, VP Customer Success
    CRITICAL: Only include contacts where you found BOTH a LinkedIn profile AND can determine their email.
    For each contact provide:
@@ -85,14 +68,24 @@ Agent 2 Hook: {hook}
    
    If you cannot find both LinkedIn AND email for a person, DO NOT include them.
    Return UP TO 10 contacts maximum, prioritizing senior decision makers.
+   Email rules:
+   - Use an address that appears in the research when there is one.
+   - Otherwise only use a pattern (first.last@, flast@, first@) that the research shows for the same domain.
+   - Never use a personal mailbox (gmail, outlook, yahoo) or a role address (info@, sales@, support@).
+   - The domain must belong to this company, not to a parent, distributor or similarly named business.
+   Order contacts by seniority and by closeness to service operations; the first contact receives the email.
+   An empty "contacts" list is a valid answer when the research does not support anyone.
 
 2. **Detailed Product Analysis**:
-   Build on Agent 2's recommendation of {recommended_product}.
+   Build on the Agent 2 Recommendation.
    Provide:
-   - Why this product is perfect for {company} (2-3 paragraphs)
+   - Why this product is perfect for the company (2-3 paragraphs)
    - 3 specific use cases based on their industry
    - Expected ROI and impact metrics
    - How it compares to alternatives
+   Ground every claim in the Agent 2 Reasoning, the Agent 2 Hook or the Contact Research. Use cases must
+   name the equipment, customers or service process of this company, not generic industry examples. ROI
+   figures come from the product metrics above, applied to the company's situation, with a timeframe.
 
 3. **Draft Personalized Email**:
    Create a compelling email to the primary contact.
@@ -100,23 +93,34 @@ Agent 2 Hook: {hook}
    - Subject line (specific, compelling, under 60 chars)
    - Email body (3-4 paragraphs):
      * Hook: Reference their specific industry challenge
-     * Value: How {recommended_product} solves it with specific metrics
+     * Value: How the recommended product solves it with specific metrics
      * Proof: Brief use case or customer success story
      * CTA: Clear next step (e.g., "15-minute demo")
    - Tone: Professional but conversational, not salesy
+   Keep the body under 200 words. Address the first contact by first name; with no contacts, use
+   "Hi there," and leave "to_name" and "to_email" empty. Mention the company by name at least once,
+   never invent customer names, awards or funding news, and do not add a signature block or placeholders
+   such as [Your Name]. One call to action only.
+
+**Quality Checks Before Answering:**
+- The JSON is valid, uses exactly the keys below and contains no comments or trailing commas.
+- "product" repeats the Agent 2 Recommendation word for word.
+- Every contact has all four fields filled in; remove any contact that does not.
+- "use_cases" has exactly three entries.
+- Nothing in the answer describes a different company from the one in the Company Analysis.
 
 **Output Format (JSON):**
-{{
+{
     "contacts": [
-        {{
+        {
             "name": "John Doe",
             "title": "VP of Field Service",
             "linkedin": "https://linkedin.com/in/johndoe",
-            "email": "john.doe@{company.lower().replace(' ', '')}.com"
-        }}
+            "email": "john.doe@companydomain.com"
+        }
     ],
-    "product_analysis": {{
-        "product": "{recommended_product}",
+    "product_analysis": {
+        "product": "<recommended product from Agent 2>",
         "why_perfect": "Multi-paragraph explanation...",
         "use_cases": [
             "Use case 1 with specific details",
@@ -125,19 +129,115 @@ Agent 2 Hook: {hook}
         ],
         "expected_roi": "Specific metrics and timeframe...",
         "competitive_edge": "How Ascendo stands out..."
-    }},
-    "email_draft": {{
+    },
+    "email_draft": {
         "subject": "Subject line here",
         "body": "Email body here...",
         "to_name": "John Doe",
         "to_email": "john.doe@company.com"
-    }}
-}}
+    }
+}
+"""
+
+# Concurrent contact searches and strategies for the same inputs run once
+contacts_flight = SingleFlight("find_contacts")
+strategy_flight = SingleFlight("generate_strategy")
+
+# DDGS sessions are not shared between worker threads
+_thread_local = threading.local()
+
+def fit_score_value(row_data):
+    """Numeric Fit_Score (LLM output may be a string); 0 if missing or invalid."""
+    try:
+        return float(row_data.get('Fit_Score', 0) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+class StrategyGenerator:
+    def __init__(self):
+        self.current_model_index = 0
+        self.lock = threading.Lock()
+    
+    @property
+    def ddgs(self):
+        if not hasattr(_thread_local, "ddgs"):
+            _thread_local.ddgs = search_client()
+        return _thread_local.ddgs
+    
+    def get_next_model(self):
+        """Round-robin through Gemini keys for load balancing."""
+        with self.lock:
+            api_key, keyed_model = models[self.current_model_index % len(models)]
+            self.current_model_index += 1
+        return api_key, keyed_model
+    
+    def find_contacts(self, company):
+        """
+        Search for key decision makers at the company. Concurrent searches for
+        the same company are shared.
+        """
+        key = " ".join(str(company).lower().split())
+        with span("find_contacts"):
+            return contacts_flight.do(key, self._find_contacts, company)
+    
+    def _find_contacts(self, company):
+        print(f"Searching for contacts at {company}...")
+        try:
+            # Search for decision makers
+            query = f"{company} VP Field Service OR CTO OR Head of Operations OR Director Service linkedin"
+            outcome = "error"
+            try:
+                with search_request_duration.time(agent="agent3"), span("search", agent="agent3", cache_hit=False):
+                    results = self.ddgs.text(query, max_results=5)
+                outcome = "ok"
+            finally:
+                search_requests.inc(agent="agent3", outcome=outcome)
+            
+            if results:
+                context = " ".join([r['body'] for r in results])
+                return context
+        except Exception as e:
+            print(f"Contact search failed for {company}: {e}")
+        
+        return "No contact information found."
+    
+    def build_strategy_prompt(self, row_data, contact_context):
+        """The static STRATEGY_PROMPT_PREFIX followed by this company's data."""
+        return f"""{STRATEGY_PROMPT_PREFIX}
+**Company Analysis:**
+Company: {row_data.get('Company', 'Unknown')}
+Fit Score: {row_data.get('Fit_Score', 0)}/10
+Category: {row_data.get('Category', 'N/A')}
+Agent 2 Recommendation: {row_data.get('Recommended_Product', 'N/A')}
+Agent 2 Reasoning: {row_data.get('Reasoning', '')}
+Agent 2 Hook: {row_data.get('Hook', '')}
+
+**Contact Research:**
+{contact_context}
 """
+    
+    def generate_strategy(self, row_data):
+        """
+        Generates comprehensive sales strategy with contacts, analysis, and email.
+        """
+        company = row_data.get('Company', 'Unknown')
+        
+        # Don't waste tokens on bad leads
+        if fit_score_value(row_data) < MIN_STRATEGY_FIT_SCORE:
+            return None
+        
+        # Find contacts
+        contact_context = self.find_contacts(company)
+        prompt = self.build_strategy_prompt(row_data, contact_context)
         
         try:
-            response = model.generate_content(
-                prompt, 
+            api_key, keyed_model = self.get_next_model()
+            response = gemini_generate_content(
+                keyed_model,
+                api_key,
+                prompt,
+                label=company,
+                agent="agent3",
                 generation_config={"response_mime_type": "application/json"}
             )
             return response.text
@@ -147,9 +247,18 @@ Agent 2 Hook: {hook}
     
     def generate_single_strategy(self, company_data):
         """
-        Generate strategy for a single company (for API endpoint).
+        Generate strategy for a single company (for API endpoint). Callers asking
+        for the same inputs at the same time (e.g. the background Agent 3 job and
+        /strategize-single) share one generation.
         """
-        strategy_json = self.generate_strategy(company_data)
+        with span("generate_single_strategy", company=company_data.get('Company'), fit_score=company_data.get('Fit_Score')) as strategy_span:
+            strategy = strategy_flight.do(strategy_key(company_data), self._generate_single_strategy, company_data)
+            strategy_span.set(generated=strategy is not None)
+            return strategy
+    
+    def _generate_single_strategy(self, company_data):
+        with lead_duration.time(agent="agent3"):
+            strategy_json = self.generate_strategy(company_data)
         
         if not strategy_json:
             return None
@@ -161,6 +270,77 @@ Agent 2 Hook: {hook}
             print(f"Failed to parse Agent 3 response: {e}")
             return None
     
+    def generate_strategies(self, companies, concurrency=AGENT3_CONCURRENCY, progress=None, is_cached=None, on_result=None):
+        """
+        Generates strategies for eligible companies on a worker pool spread over all
+        Gemini keys, highest fit score first. is_cached(company_data) lets callers skip
+        companies they already have; on_result(company_data, strategy) receives each
+        strategy. If given, progress.start(total) and progress.add_result(row) report progress.
+        """
+        eligible = [c for c in companies if fit_score_value(c) >= MIN_STRATEGY_FIT_SCORE]
+        # The pool's queue is FIFO, so submission order is processing order
+        eligible.sort(key=fit_score_value, reverse=True)
+        if progress:
+            progress.start(len(eligible))
+        
+        def run_one(company_data):
+            company_name = company_data.get('Company')
+            status = "cached"
+            if not (is_cached and is_cached(company_data)):
+                strategy = self.generate_single_strategy(company_data)
+                status = "generated" if strategy else "failed"
+                if strategy and on_result:
+                    on_result(company_data, strategy)
+            if progress:
+                progress.add_result({"Company": company_name, "Fit_Score": company_data.get('Fit_Score'), "status": status})
+            return status
+        
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="agent3") as executor:
+            statuses = list(executor.map(bind_trace(bind_usage(run_one)), eligible))
+        
+        return {status: statuses.count(status) for status in ("generated", "cached", "failed")}
+    
+    def strategize_dataframe(self, df, concurrency=AGENT3_CONCURRENCY, store=None):
+        """
+        Generates strategies for every eligible company in df concurrently and returns
+        the battle plan DataFrame. Rows below the fit cutoff are never scheduled;
+        strategies already in store (a StrategyStore) are reused, new ones are added to it.
+        """
+        scores = pd.to_numeric(df['Fit_Score'], errors='coerce').fillna(0) if 'Fit_Score' in df else pd.Series(0, index=df.index)
+        eligible = df[scores >= MIN_STRATEGY_FIT_SCORE]
+        # Best leads first
+        eligible_rows = eligible.loc[scores[eligible.index].sort_values(ascending=False).index].to_dict(orient='index')
+        print(f"Strategizing {len(eligible_rows)} of {len(df)} companies...")
+        
+        def run_one(item):
+            index, row_dict = item
+            strategy_data = store.get(row_dict) if store else None
+            if strategy_data is None:
+                # Throttling is handled by rate_limiter
+                strategy_data = self.generate_single_strategy(row_dict)
+                if strategy_data and store:
+                    store.put(row_dict, strategy_data)
+            print(f"Strategy generated for {row_dict.get('Company')}")
+            return index, strategy_data
+        
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="agent3") as executor:
+            strategies = {index: data for index, data in executor.map(bind_trace(bind_usage(run_one)), eligible_rows.items()) if data}
+        
+        # Flatten the data for Excel in one pass
+        plan_columns = ['Contacts', 'Product_Analysis', 'Email_Subject', 'Email_Body', 'Email_To']
+        flat = pd.DataFrame.from_dict({
+            index: {
+                'Contacts': json.dumps(data.get('contacts', [])),
+                'Product_Analysis': json.dumps(data.get('product_analysis', {})),
+                'Email_Subject': data.get('email_draft', {}).get('subject', 'N/A'),
+                'Email_Body': data.get('email_draft', {}).get('body', 'N/A'),
+                'Email_To': data.get('email_draft', {}).get('to_email', 'N/A'),
+            }
+            for index, data in strategies.items()
+        }, orient='index', columns=plan_columns)
+        
+        return df.drop(columns=[c for c in plan_columns if c in df.columns]).join(flat)
+    
     def process_strategy(self, input_csv, output_csv):
         """
         Process strategies for all companies in a file (batch mode).
@@ -172,29 +352,9 @@ Agent 2 Hook: {hook}
         print(f"Strategizing for {input_csv}...")
         df = pd.read_excel(input_csv) if input_csv.endswith('.xlsx') else pd.read_csv(input_csv)
         
-        results = []
-        
-        for index, row in df.iterrows():
-            row_dict = row.to_dict()
-            
-            # Rate limit handling
-            time.sleep(2)  # Slower for Pro model
-            
-            strategy_data = self.generate_single_strategy(row_dict)
-            
-            if strategy_data:
-                # Flatten the data for Excel
-                row_dict['Contacts'] = json.dumps(strategy_data.get('contacts', []))
-                row_dict['Product_Analysis'] = json.dumps(strategy_data.get('product_analysis', {}))
-                row_dict['Email_Subject'] = strategy_data.get('email_draft', {}).get('subject', 'N/A')
-                row_dict['Email_Body'] = strategy_data.get('email_draft', {}).get('body', 'N/A')
-                row_dict['Email_To'] = strategy_data.get('email_draft', {}).get('to_email', 'N/A')
-            
-            results.append(row_dict)
-            print(f"Strategy generated for {row_dict.get('Company')}")
+        new_df = self.strategize_dataframe(df)
 
         # Save Result
-        new_df = pd.DataFrame(results)
         new_df.to_excel(output_csv, index=False)
         print(f"Saved battle plan to {output_csv}")
         return output_csv
@@ -0,0 +1,153 @@
+import os
+import time
+import asyncio
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+from agent1 import ConferenceScraper
+from company_names import CompanyIndex
+from tracing import span
+
+load_dotenv()
+
+# Pages of one batch scraped at the same time, and at most this many per site
+BATCH_SCRAPE_CONCURRENCY = int(os.getenv("BATCH_SCRAPE_CONCURRENCY", "4"))
+BATCH_SCRAPE_PER_DOMAIN = int(os.getenv("BATCH_SCRAPE_PER_DOMAIN", "2"))
+# Largest batch accepted by /scrape/batch
+BATCH_SCRAPE_MAX_URLS = int(os.getenv("BATCH_SCRAPE_MAX_URLS", "50"))
+
+
+def page_domain(url):
+    """Site of a page, used for the per-domain limit ('www.' ignored)."""
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _join(existing, values):
+    """'; '-separated list with values appended once each, in first-seen order."""
+    items = [item for item in existing.split("; ") if item] if existing else []
+    for value in values:
+        if value and value not in items:
+            items.append(value)
+    return "; ".join(items)
+
+
+class BatchScrape:
+    """
+    Agent 1 over many sponsor/exhibitor pages at once, at most concurrency
+    pages in flight and per_domain per site. Companies are merged across pages
+    with the same fuzzy matching as within a page, and every merged record
+    keeps which conferences and pages it was found on.
+    """
+    def __init__(self, urls, owner=None, conferences=None, concurrency=BATCH_SCRAPE_CONCURRENCY,
+                 per_domain=BATCH_SCRAPE_PER_DOMAIN):
+        # Repeated URLs are scraped once
+        self.urls = list(dict.fromkeys(url.strip() for url in urls if url and url.strip()))
+        # Browser pool owner; the whole batch waits in one queue so other users keep their turn
+        self.owner = owner
+        # Conference label per URL; defaults to the page's site
+        self.conferences = conferences or {}
+        self.concurrency = concurrency
+        self.per_domain = per_domain
+        self.index = CompanyIndex()
+        # Merged records in first-seen order, keyed by entity
+        self.merged = {}
+        self.pages = []
+        self.counts = {"pages": len(self.urls), "scraped": 0, "failed": 0, "found": 0, "companies": 0}
+
+    def conference(self, url):
+        return self.conferences.get(url) or page_domain(url)
+
+    def records(self):
+        """One record per company across all pages finished so far."""
+        return list(self.merged.values())
+
+    def _merge(self, url, records):
+        """Adds one page's records; returns (new, updated) merged records."""
+        new, updated = [], []
+        conference = self.conference(url)
+        for record in records:
+            entity, created = self.index.add(record.get("Company"))
+            if entity is None:
+                continue
+            if created:
+                merged = dict(record, Company=entity.name, Alternate_Names="", Conferences="", Source_Urls="")
+                self.merged[id(entity)] = merged
+                new.append(merged)
+            else:
+                merged = self.merged[id(entity)]
+                if merged not in new and merged not in updated:
+                    updated.append(merged)
+            # Names this page knew the company by, besides the merged name
+            names = entity.alternate_names() + [name.strip() for name in str(record.get("Alternate_Names") or "").split(";")]
+            merged["Alternate_Names"] = _join(
+                merged["Alternate_Names"], [name for name in names if name.lower() != entity.name.lower()]
+            )
+            merged["Conferences"] = _join(merged["Conferences"], [conference])
+            merged["Source_Urls"] = _join(merged["Source_Urls"], [url])
+        return new, updated
+
+    async def _scrape_page(self, url, global_limit, domain_limits):
+        """(url, records, error, seconds) for one page; never raises."""
+        try:
+            # The site's slot is taken first so a busy site never holds a global slot idle
+            async with domain_limits.setdefault(page_domain(url), asyncio.Semaphore(self.per_domain)), global_limit:
+                started = time.perf_counter()
+                scraper = ConferenceScraper(self.owner)
+                with span("scrape_page", url=url) as page_span:
+                    records = await scraper.extract_sponsors(url)
+                    page_span.set(companies=len(records), error=scraper.error)
+                return url, records, scraper.error, time.perf_counter() - started
+        except Exception as e:
+            print(f"Batch scrape of {url} failed: {e}")
+            return url, [], str(e), None
+
+    async def stream(self):
+        """
+        Yields one summary per page as soon as it finishes, in completion order:
+        {"url", "conference", "status", "error", "seconds", "found", "new", "updated"}.
+        new and updated are merged records first seen on, or also found on, that page.
+        """
+        global_limit = asyncio.Semaphore(self.concurrency)
+        domain_limits = {}
+        tasks = [asyncio.create_task(self._scrape_page(url, global_limit, domain_limits)) for url in self.urls]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                url, records, error, seconds = await finished
+                new, updated = self._merge(url, records)
+                status = "failed" if error and not records else "ok"
+                self.counts["scraped" if status == "ok" else "failed"] += 1
+                self.counts["found"] += len(records)
+                self.counts["companies"] = len(self.merged)
+                page = {
+                    "url": url,
+                    "conference": self.conference(url),
+                    "status": status,
+                    "error": error,
+                    "seconds": round(seconds, 3) if seconds is not None else None,
+                    "found": len(records),
+                    "new": new,
+                    "updated": updated,
+                }
+                self.pages.append({key: value for key, value in page.items() if key not in ("new", "updated")})
+                yield page
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self.index.learn()
+        print(f"Batch scrape of {len(self.urls)} pages finished: {self.counts}")
+
+
+async def run_scrape_batch(urls, owner=None, conferences=None):
+    """Merged company records from every page, with Conferences and Source_Urls provenance."""
+    batch = BatchScrape(urls, owner, conferences)
+    async for _ in batch.stream():
+        pass
+    return batch.records()
+
+
+async def run_scrape_batch_stream(urls, owner=None, conferences=None):
+    """Async generator over page summaries as each page finishes."""
+    batch = BatchScrape(urls, owner, conferences)
+    async for page in batch.stream():
+        yield page
@@ -0,0 +1,63 @@
+import asyncio
+from tracing import span, use_span, current_span
+
+
+class MicroBatcher:
+    """
+    Collects items submitted by concurrent tasks into batches for handler, an
+    async function taking a list of items and returning a list of results in the
+    same order (a batch whose result count differs fails every item). A batch
+    is sent when it is full or max_wait seconds after its first item arrived.
+    Must be used from a single event loop.
+    """
+    # Trace span around each batch
+    span_name = "batch"
+
+    def __init__(self, handler, batch_size, max_wait, concurrency):
+        self.handler = handler
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.pending = []
+        self.timer = None
+        self.running = set()
+        # A batch mixes items from many callers, so its span hangs off the
+        # span that created the batcher rather than whichever caller flushed it
+        self.parent_span = current_span()
+
+    async def submit(self, item):
+        """Result for one item, computed as part of a batch."""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((item, future))
+        if len(self.pending) >= self.batch_size:
+            self._flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def _run(self, batch):
+        async with self.semaphore:
+            try:
+                with use_span(self.parent_span), span(self.span_name, size=len(batch)):
+                    results = list(await self.handler([item for item, _ in batch]))
+                # Results are matched by position, so a short or long list matches nothing reliably
+                if len(results) != len(batch):
+                    raise ValueError(f"{self.span_name} handler returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
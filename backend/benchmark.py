@@ -0,0 +1,341 @@
+"""
+End-to-end pipeline benchmark against synthetic conferences.
+
+Serves generated sponsor pages from a local HTTP server and runs Agent 1
+(run_scrape_stream), Agent 2 (validate_dataframe_async, as used by /validate)
+and Agent 3 (strategize_dataframe) with PROVIDER_MODE=local, so no keys or
+network are needed. Each size runs in its own process so peak RSS is per run.
+
+    python benchmark.py                       # N = 10, 100, 1000
+    python benchmark.py --sizes 10 100 --latency-scale 0.1
+
+Results are written to benchmarks/bench_<timestamp>.json.
+"""
+import os
+import sys
+import json
+import time
+import math
+import zlib
+import struct
+import random
+import asyncio
+import argparse
+import tempfile
+import platform
+import resource
+import threading
+import subprocess
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = [10, 100, 1000]
+DEFAULT_OUT_DIR = os.path.join(BACKEND_DIR, "benchmarks")
+
+# 1x1 transparent GIF used as the src of JS-lazy-loaded images until they scroll into view
+PLACEHOLDER_SRC = "data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7"
+
+
+def png_logo(company, seed, width=160, height=64):
+    """
+    Grayscale noise PNG carrying 'company:<name>' in a tEXt chunk, which the
+    local vision stand-in reads back. Noise keeps dHashes of different logos apart.
+    """
+    rng = random.Random(seed)
+    raw = b"".join(b"\x00" + rng.randbytes(width) for _ in range(height))
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+        + chunk(b"tEXt", b"Comment\x00company:" + company.encode())
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+class SyntheticConference:
+    """
+    A sponsor page with n logos. alt_ratio of them carry the company name as alt
+    text, lazy_ratio are lazy-loaded (half natively, half by a scroll-triggered
+    script) and junk_ratio extra images are icons and tracking pixels.
+    """
+    def __init__(self, n, alt_ratio=0.3, lazy_ratio=0.5, junk_ratio=0.1, seed=0):
+        rng = random.Random(seed)
+        self.companies = [f"Synthetic Sponsor {i:04d}" for i in range(n)]
+        self.files = {}
+        tags = []
+        for i, company in enumerate(self.companies):
+            path = f"/logos/sponsor-{i:04d}.png"
+            self.files[path] = ("image/png", png_logo(company, seed * 100003 + i))
+            alt = company if rng.random() < alt_ratio else ""
+            lazy = rng.random() < lazy_ratio
+            if lazy and i % 2:
+                tags.append(f'<img class="lazy" src="{PLACEHOLDER_SRC}" data-src="{path}" alt="{alt}" width="200" height="80">')
+            else:
+                loading = ' loading="lazy"' if lazy else ""
+                tags.append(f'<img src="{path}" alt="{alt}" width="200" height="80"{loading}>')
+        for i in range(int(n * junk_ratio)):
+            if i % 2:
+                path = f"/static/icons/icon-{i}.png"
+                self.files[path] = ("image/png", png_logo("Icon", -i - 1, width=24, height=24))
+                tags.append(f'<img src="{path}" alt="" width="24" height="24">')
+            else:
+                path = f"/static/pixel-{i}.gif"
+                self.files[path] = ("image/gif", b"GIF89a\x01\x00\x01\x00\x80\x00\x00\xff\xff\xff\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;")
+                tags.append(f'<img src="{path}" alt="" width="1" height="1">')
+        rng.shuffle(tags)
+        cells = "\n".join(f'<div class="sponsor">{tag}</div>' for tag in tags)
+        self.files["/sponsors"] = ("text/html; charset=utf-8", f"""<!DOCTYPE html>
+<html><head><title>Synthetic Conference Sponsors</title>
+<style>.grid {{ display: flex; flex-wrap: wrap; }} .sponsor {{ width: 25%; height: 120px; }}</style>
+</head><body>
+<h1>Our Sponsors</h1>
+<div class="grid">
+{cells}
+</div>
+<script>
+const observer = new IntersectionObserver(entries => entries.forEach(entry => {{
+    if (entry.isIntersecting) {{ entry.target.src = entry.target.dataset.src; observer.unobserve(entry.target); }}
+}}));
+document.querySelectorAll('img.lazy').forEach(img => observer.observe(img));
+</script>
+</body></html>""".encode())
+
+
+def serve(site):
+    """Starts a threaded HTTP server for site on a free port; returns (server, base_url)."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            entry = site.files.get(self.path.split("?")[0])
+            if entry is None:
+                self.send_error(404)
+                return
+            content_type, body = entry
+            status, total = 200, len(body)
+            # Range support, so image probing behaves as against a real CDN
+            byte_range = self.headers.get("Range", "")
+            if byte_range.startswith("bytes="):
+                start, _, end = byte_range[6:].partition("-")
+                start, end = int(start or 0), min(int(end) if end else total - 1, total - 1)
+                body, status = body[start:end + 1], 206
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{total}")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of values (0 if empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def stage_report(wall, latencies, leads, calls, usage):
+    return {
+        "wall_s": round(wall, 3),
+        "leads": leads,
+        "throughput_leads_per_s": round(leads / wall, 3) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+        },
+        "api_calls": calls["calls"],
+        "api_errors": calls["errors"],
+        "token_usage": usage,
+    }
+
+
+def peak_rss_mb(who):
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_single(n, args):
+    """Runs the three stages on one synthetic conference in this process."""
+    import pandas as pd
+    import local_provider
+    from agent1 import run_scrape_stream
+    from agent2 import ICPValidator
+    from agent3 import StrategyGenerator
+    from rate_limiter import get_limiter_stats
+    from token_usage import track_usage
+
+    site = SyntheticConference(n, args.alt_ratio, args.lazy_ratio, args.junk_ratio, args.seed)
+    server, base_url = serve(site)
+    stages = {}
+
+    # Agent 1: latency is time from stage start until each company is yielded
+    local_provider.reset_stats()
+    records, latencies = [], []
+
+    async def scrape():
+        started = time.perf_counter()
+        async for kind, record in run_scrape_stream(f"{base_url}/sponsors"):
+            if kind == "company":
+                records.append(record)
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with track_usage() as usage:
+        asyncio.run(scrape())
+    stages["scrape"] = stage_report(time.perf_counter() - started, latencies, len(records), local_provider.stats(), usage.snapshot())
+    stages["scrape"]["recall"] = round(len({r["Company"] for r in records} & set(site.companies)) / n, 3) if n else 0.0
+    server.shutdown()
+
+    # Agent 2: latency is enrichment + scoring per lead, including queueing
+    lead_latencies = []
+
+    class TimedValidator(ICPValidator):
+        async def process_single_lead_async(self, *a, **kw):
+            lead_started = time.perf_counter()
+            try:
+                return await super().process_single_lead_async(*a, **kw)
+            finally:
+                lead_latencies.append(time.perf_counter() - lead_started)
+
+    local_provider.reset_stats()
+    raw_df = pd.DataFrame(records or [{"Company": c, "Source": "Sponsor Page"} for c in site.companies])
+    started = time.perf_counter()
+    with track_usage() as usage:
+        enriched_df = asyncio.run(TimedValidator().validate_dataframe_async(raw_df))
+    stages["validate"] = stage_report(time.perf_counter() - started, lead_latencies, len(enriched_df), local_provider.stats(), usage.snapshot())
+
+    # Agent 3: latency is contact search + strategy per eligible lead
+    strategy_latencies = []
+    latencies_lock = threading.Lock()
+
+    class TimedStrategist(StrategyGenerator):
+        def generate_single_strategy(self, company_data):
+            lead_started = time.perf_counter()
+            try:
+                return super().generate_single_strategy(company_data)
+            finally:
+                with latencies_lock:
+                    strategy_latencies.append(time.perf_counter() - lead_started)
+
+    local_provider.reset_stats()
+    started = time.perf_counter()
+    with track_usage() as usage:
+        TimedStrategist().strategize_dataframe(enriched_df)
+    stages["strategize"] = stage_report(time.perf_counter() - started, strategy_latencies, len(strategy_latencies), local_provider.stats(), usage.snapshot())
+
+    retries = sum(stats.get("retries", 0) for stats in get_limiter_stats().values())
+    return {
+        "n": n,
+        "stages": stages,
+        "total_wall_s": round(sum(stage["wall_s"] for stage in stages.values()), 3),
+        "rate_limit_retries": retries,
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF),
+        "peak_child_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="sponsor counts to benchmark")
+    parser.add_argument("--alt-ratio", type=float, default=0.3, help="share of logos with alt text")
+    parser.add_argument("--lazy-ratio", type=float, default=0.5, help="share of lazy-loaded logos")
+    parser.add_argument("--junk-ratio", type=float, default=0.1, help="icons and pixels added per logo")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplies simulated API latencies")
+    parser.add_argument("--out", help="result file (default: benchmarks/bench_<timestamp>.json)")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        result = run_single(args.single, args)
+        with open(args.result_file, "w") as f:
+            json.dump(result, f)
+        return
+
+    settings = {
+        "provider_mode": "local",
+        "alt_ratio": args.alt_ratio,
+        "lazy_ratio": args.lazy_ratio,
+        "junk_ratio": args.junk_ratio,
+        "seed": args.seed,
+        "latency_scale": args.latency_scale,
+    }
+    runs = []
+    for n in args.sizes:
+        print(f"Benchmarking N={n}...")
+        with tempfile.TemporaryDirectory() as workdir:
+            # Cold caches and a private run store for every size
+            env = {
+                **os.environ,
+                "PROVIDER_MODE": "local",
+                "CACHE_DIR": os.path.join(workdir, "cache"),
+                "RUN_STORE_DIR": os.path.join(workdir, "runs"),
+                "LOCAL_LATENCY_SCALE": str(args.latency_scale),
+                "LOCAL_SEED": str(args.seed),
+            }
+            # Measure the pipeline, not the free-tier Gemini quota (override by exporting GEMINI_RPM)
+            env.setdefault("GEMINI_RPM", "1000")
+            result_file = os.path.join(workdir, "result.json")
+            command = [
+                sys.executable, os.path.abspath(__file__), "--single", str(n), "--result-file", result_file,
+                "--alt-ratio", str(args.alt_ratio), "--lazy-ratio", str(args.lazy_ratio),
+                "--junk-ratio", str(args.junk_ratio), "--seed", str(args.seed),
+            ]
+            completed = subprocess.run(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL)
+            if completed.returncode != 0 or not os.path.exists(result_file):
+                print(f"N={n} failed (exit code {completed.returncode})")
+                runs.append({"n": n, "error": f"exit code {completed.returncode}"})
+                continue
+            with open(result_file) as f:
+                run = json.load(f)
+        runs.append(run)
+        stages = run["stages"]
+        print(
+            f"N={n}: total {run['total_wall_s']}s | "
+            + " | ".join(
+                f"{name} {stage['wall_s']}s {stage['throughput_leads_per_s']} leads/s p95 {stage['latency_ms']['p95']}ms"
+                for name, stage in stages.items()
+            )
+            + f" | recall {stages['scrape']['recall']} | peak RSS {run['peak_rss_mb']} MB"
+        )
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": settings,
+        "runs": runs,
+    }
+    out = args.out or os.path.join(DEFAULT_OUT_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved benchmark results to {out}")
+
+
+if __name__ == "__main__":
+    main()
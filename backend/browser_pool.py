@@ -0,0 +1,317 @@
+import os
+import time
+import asyncio
+from collections import deque, OrderedDict
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from crawl4ai import AsyncWebCrawler
+
+load_dotenv()
+
+# Warm browsers kept by the app (0 starts a browser per scrape, as before the pool)
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+# A browser is restarted after serving this many pages
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "50"))
+# Combined RSS of all browser processes above which a returned browser is restarted (0 disables)
+BROWSER_MAX_RSS_MB = float(os.getenv("BROWSER_MAX_RSS_MB", "2048"))
+# Seconds between health checks of idle browsers, and how long a check may take
+BROWSER_HEALTH_INTERVAL = float(os.getenv("BROWSER_HEALTH_INTERVAL", "60"))
+BROWSER_HEALTH_TIMEOUT = float(os.getenv("BROWSER_HEALTH_TIMEOUT", "15"))
+# Longest a scrape waits for a free browser before failing
+BROWSER_ACQUIRE_TIMEOUT = float(os.getenv("BROWSER_ACQUIRE_TIMEOUT", "300"))
+# Pause before retrying a browser that failed to launch
+BROWSER_RELAUNCH_DELAY = 5.0
+
+# Smallest page crawl4ai can load; succeeds only if the browser still works
+HEALTH_CHECK_URL = "raw:<html><body>ok</body></html>"
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def browser_rss_bytes():
+    """
+    Combined RSS of every process started by this one (Playwright drivers and
+    Chromium), read from /proc. None where /proc is unavailable.
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        stat = _read(f"/proc/{entry}/stat")
+        if stat:
+            # The command name may contain spaces, so fields are counted after its ')'
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+            children.setdefault(ppid, []).append(entry)
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    pending = list(children.get(os.getpid(), []))
+    while pending:
+        pid = pending.pop()
+        statm = _read(f"/proc/{pid}/statm")
+        if statm:
+            total += int(statm.split()[1]) * page_size
+        pending.extend(children.get(int(pid), []))
+    return total
+
+
+class PooledBrowser:
+    """One warm AsyncWebCrawler and how much it has been used."""
+    def __init__(self, browser_id, crawler):
+        self.id = browser_id
+        self.crawler = crawler
+        self.pages = 0
+        self.started = time.time()
+        # Set when a crawl raised, so the browser is restarted instead of reused
+        self.broken = False
+
+
+class BrowserPool:
+    """
+    Warm headless browsers shared by all scrapes of the app. A scrape leases a
+    browser for its page load only; waiting scrapes are served round-robin per
+    owner (client or batch), so one user queueing many pages cannot starve
+    another. Browsers are restarted after max_pages pages, when the browser
+    processes together exceed max_rss_mb, or when a crawl or health check fails.
+    Must be used from the event loop that started it.
+    """
+    def __init__(self, size=BROWSER_POOL_SIZE, max_pages=BROWSER_MAX_PAGES, max_rss_mb=BROWSER_MAX_RSS_MB,
+                 health_interval=BROWSER_HEALTH_INTERVAL, acquire_timeout=BROWSER_ACQUIRE_TIMEOUT, factory=None):
+        self.size = size
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.health_interval = health_interval
+        self.acquire_timeout = acquire_timeout
+        self.factory = factory or (lambda: AsyncWebCrawler(verbose=True))
+        self.loop = None
+        self.closed = False
+        self.idle = deque()
+        self.leased = set()
+        # Owner -> its waiting futures; the front owner is served next, then moves to the back
+        self.waiters = OrderedDict()
+        self.tasks = set()
+        self.next_id = 0
+        self.launching = 0
+        self.counts = {"leases": 0, "waited": 0, "pages": 0, "launches": 0, "launch_failures": 0, "health_checks": 0}
+        self.recycles = {}
+        self.wait_seconds = 0.0
+        self.rss_bytes = None
+
+    @property
+    def started(self):
+        return self.loop is not None and not self.closed
+
+    async def start(self):
+        """
+        Launches the warm browsers in the background (scrapes arriving first wait
+        for them, launch failures are retried) and starts the health checker.
+        """
+        if self.size <= 0 or self.started:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.closed = False
+        for _ in range(self.size):
+            self._spawn(self._launch())
+        self._spawn(self._health_loop())
+        print(f"Browser pool starting {self.size} browsers")
+
+    async def stop(self):
+        """Closes every browser; scrapes still waiting for one fail."""
+        if self.loop is None:
+            return
+        self.closed = True
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        for queue in self.waiters.values():
+            for future in queue:
+                if not future.done():
+                    future.set_exception(RuntimeError("Browser pool stopped"))
+        self.waiters.clear()
+        browsers = list(self.idle) + list(self.leased)
+        self.idle.clear()
+        self.leased.clear()
+        await asyncio.gather(*(self._close(browser) for browser in browsers))
+        self.loop = None
+        print("Browser pool stopped")
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def _launch(self):
+        """Starts one browser and hands it out; retried until it works or the pool stops."""
+        self.launching += 1
+        try:
+            while not self.closed:
+                crawler = self.factory()
+                try:
+                    # Same start-up as `async with AsyncWebCrawler()`, kept open across scrapes
+                    await crawler.__aenter__()
+                except Exception as e:
+                    self.counts["launch_failures"] += 1
+                    print(f"Failed to launch browser: {e}")
+                    await asyncio.sleep(BROWSER_RELAUNCH_DELAY)
+                    continue
+                self.next_id += 1
+                self.counts["launches"] += 1
+                self._hand_off(PooledBrowser(self.next_id, crawler))
+                return
+        finally:
+            self.launching -= 1
+
+    async def _close(self, browser):
+        try:
+            await browser.crawler.__aexit__(None, None, None)
+        except Exception as e:
+            print(f"Failed to close browser {browser.id}: {e}")
+
+    async def _replace(self, browser, reason):
+        self.recycles[reason] = self.recycles.get(reason, 0) + 1
+        print(f"Restarting browser {browser.id} after {browser.pages} pages ({reason})")
+        self.launching += 1
+        try:
+            await self._close(browser)
+        finally:
+            self.launching -= 1
+        await self._launch()
+
+    def _hand_off(self, browser):
+        """Gives browser to the next waiter, round-robin over owners, else returns it to idle."""
+        if self.closed:
+            self._spawn(self._close(browser))
+            return
+        while self.waiters:
+            owner, queue = next(iter(self.waiters.items()))
+            future = queue.popleft()
+            if queue:
+                self.waiters.move_to_end(owner)
+            else:
+                del self.waiters[owner]
+            if not future.done():
+                self.leased.add(browser)
+                future.set_result(browser)
+                return
+        self.idle.append(browser)
+
+    async def _acquire(self, owner):
+        if self.idle and not self.waiters:
+            browser = self.idle.popleft()
+            self.leased.add(browser)
+            return browser
+        self.counts["waited"] += 1
+        future = self.loop.create_future()
+        self.waiters.setdefault(owner, deque()).append(future)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.acquire_timeout)
+        except BaseException:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # Handed a browser just as the wait was given up
+                self._release(future.result())
+            else:
+                future.cancel()
+                queue = self.waiters.get(owner)
+                if queue is not None and future in queue:
+                    queue.remove(future)
+                    if not queue:
+                        del self.waiters[owner]
+            raise
+
+    def _release(self, browser):
+        self.leased.discard(browser)
+        if self.closed:
+            self._spawn(self._close(browser))
+        elif browser.broken:
+            self._spawn(self._replace(browser, "error"))
+        elif self.max_pages and browser.pages >= self.max_pages:
+            self._spawn(self._replace(browser, "pages"))
+        elif self.max_rss_mb and self.rss_bytes and self.rss_bytes > self.max_rss_mb * 1024 * 1024:
+            # Per-browser RSS is not attributable, so whichever browser returns next goes
+            self._spawn(self._replace(browser, "rss"))
+        else:
+            self._hand_off(browser)
+
+    @asynccontextmanager
+    async def crawler(self, owner=None):
+        """
+        AsyncWebCrawler leased for the block. Outside a started pool (CLI runs,
+        benchmarks, other event loops) a browser is started for the block alone.
+        """
+        if not self.started or asyncio.get_running_loop() is not self.loop:
+            async with self.factory() as crawler:
+                yield crawler
+            return
+
+        requested = time.perf_counter()
+        browser = await self._acquire(owner)
+        self.counts["leases"] += 1
+        self.wait_seconds += time.perf_counter() - requested
+        try:
+            yield browser.crawler
+        except BaseException:
+            browser.broken = True
+            raise
+        finally:
+            browser.pages += 1
+            self.counts["pages"] += 1
+            self._release(browser)
+            if self.max_rss_mb:
+                # Read in the background; the next browser returned is judged on it
+                self._spawn(self._measure_rss())
+
+    async def _measure_rss(self):
+        self.rss_bytes = await asyncio.to_thread(browser_rss_bytes)
+
+    async def _check(self, browser):
+        self.counts["health_checks"] += 1
+        try:
+            result = await asyncio.wait_for(
+                browser.crawler.arun(url=HEALTH_CHECK_URL, bypass_cache=True),
+                BROWSER_HEALTH_TIMEOUT,
+            )
+            healthy = bool(result.success)
+        except Exception as e:
+            print(f"Health check of browser {browser.id} failed: {e}")
+            healthy = False
+        if healthy:
+            self._hand_off(browser)
+        else:
+            await self._replace(browser, "health")
+
+    async def _health_loop(self):
+        """Checks idle browsers every health_interval seconds; leased ones are checked by their scrape."""
+        while not self.closed:
+            await asyncio.sleep(self.health_interval)
+            browsers = list(self.idle)
+            self.idle.clear()
+            await asyncio.gather(*(self._check(browser) for browser in browsers))
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "started": self.started,
+            "idle": len(self.idle),
+            "in_use": len(self.leased),
+            "launching": self.launching,
+            "waiting": sum(len(queue) for queue in self.waiters.values()),
+            "waiting_owners": len(self.waiters),
+            **self.counts,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "recycles": dict(self.recycles),
+            "rss_mb": round(self.rss_bytes / (1024 * 1024), 1) if self.rss_bytes else None,
+            "max_pages": self.max_pages,
+            "max_rss_mb": self.max_rss_mb,
+        }
+
+
+# Owned by the FastAPI app lifespan (main.py)
+browser_pool = BrowserPool()
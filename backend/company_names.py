@@ -0,0 +1,276 @@
+import os
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from dotenv import load_dotenv
+from disk_cache import DiskCache, cache_path
+
+load_dotenv()
+
+# Minimum name_similarity for two names to count as the same company
+MATCH_THRESHOLD = float(os.getenv("COMPANY_MATCH_THRESHOLD", "0.92"))
+# Blocks shared by more companies than this are too generic to narrow the search
+MAX_BLOCK_SIZE = int(os.getenv("COMPANY_MAX_BLOCK_SIZE", "200"))
+# Remember merged variants so later runs map them straight to the same company
+ALIAS_LEARNING = os.getenv("COMPANY_ALIAS_LEARNING", "1") != "0"
+
+# Words that alt text and vision answers add around a name
+NOISE_WORDS = {"logo", "logos", "image", "icon", "banner", "photo", "picture"}
+# Legal forms and domains, dropped from the end of a normalized name
+TRAILING_WORDS = {
+    "inc", "incorporated", "ltd", "limited", "llc", "llp", "lp", "corp", "corporation", "co",
+    "plc", "gmbh", "ag", "sa", "nv", "bv", "pty", "srl", "spa", "com", "io", "net", "org",
+}
+# Words too common to identify a company on their own ("Service" is not ServiceMax)
+GENERIC_WORDS = {
+    "the", "and", "of", "field", "service", "services", "solutions", "systems", "group", "global",
+    "international", "technologies", "technology", "software", "digital", "data", "cloud",
+    "energy", "industries", "partners", "consulting", "management", "american", "national",
+    "general", "united", "first",
+}
+# Joined names shorter than this are only merged on exact tokens
+MIN_FUZZY_LENGTH = 6
+
+_NOISE_PATTERN = re.compile(r"\b(?:%s)\b" % "|".join(sorted(NOISE_WORDS)), re.IGNORECASE)
+
+# Canonical display name for every merged variant seen so far, keyed by normalized name
+company_aliases = DiskCache(
+    os.getenv("COMPANY_ALIAS_PATH", cache_path("company_aliases.sqlite3")),
+    max_entries=int(os.getenv("COMPANY_ALIAS_MAX_ENTRIES", "100000")),
+)
+
+
+def _text(name):
+    # NaN and None from DataFrames count as no name
+    if name is None or name != name:
+        return ""
+    return str(name).strip()
+
+
+def normalize_name(name):
+    """
+    Comparison key of a company name as a tuple of tokens: case, accents,
+    punctuation, noise words ('logo') and trailing legal forms ('Inc', 'Ltd') removed.
+    """
+    text = unicodedata.normalize("NFKD", _text(name).lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"['’]", "", text).replace("&", " and ")
+    tokens = [token for token in re.sub(r"[\W_]+", " ", text).split() if token not in NOISE_WORDS]
+    while tokens and tokens[-1] in TRAILING_WORDS:
+        tokens.pop()
+    if len(tokens) > 1 and tokens[0] == "the":
+        tokens = tokens[1:]
+    return tuple(tokens)
+
+
+def clean_display_name(name):
+    """name without noise words or stray separators ('Logo - ServiceMax' -> 'ServiceMax')."""
+    text = _NOISE_PATTERN.sub(" ", _text(name))
+    return re.sub(r"\s+", " ", text).strip(" -|:,_–—")
+
+
+def _numbers(key):
+    # Tokens are split on everything but letters and digits
+    return {token for token in key if not token.isalpha()}
+
+
+def is_prefix_match(a, b):
+    """
+    True if one normalized name is the other followed only by generic words
+    ('acme' / 'acme solutions group'). A distinctive leftover token means a
+    different company ('johnson' / 'johnson controls', 'blue' / 'blue prism').
+    """
+    shorter, longer = (a, b) if len(a) <= len(b) else (b, a)
+    return (
+        len(shorter) < len(longer)
+        and longer[:len(shorter)] == shorter
+        and any(token not in GENERIC_WORDS for token in shorter)
+        and all(token in GENERIC_WORDS for token in longer[len(shorter):])
+    )
+
+
+def name_similarity(a, b, cutoff=0.0):
+    """
+    Similarity of two normalized names between 0 and 1: 1.0 for a name followed
+    only by generic words (is_prefix_match), else the better of token-set overlap
+    and character similarity of the joined tokens. Character similarity is
+    skipped when it cannot reach cutoff.
+    """
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    # Numbers tell editions and divisions apart ('Sponsor 3' / 'Sponsor 30')
+    if _numbers(a) != _numbers(b):
+        return 0.0
+    if is_prefix_match(a, b):
+        return 1.0
+    overlap = len(set(a) & set(b)) / len(set(a) | set(b))
+    joined_a, joined_b = "".join(a), "".join(b)
+    if min(len(joined_a), len(joined_b)) < MIN_FUZZY_LENGTH:
+        return overlap
+    # Upper bounds of ratio(), from cheapest to dearest
+    floor = max(overlap, cutoff)
+    if floor > 2 * min(len(joined_a), len(joined_b)) / (len(joined_a) + len(joined_b)):
+        return overlap
+    matcher = SequenceMatcher(None, joined_a, joined_b)
+    if floor > matcher.quick_ratio():
+        return overlap
+    return max(overlap, matcher.ratio())
+
+
+def _block_keys(key):
+    """Blocks a normalized name is filed under: its tokens, their prefixes and its joined prefix."""
+    keys = {f"t:{token}" for token in key if token not in GENERIC_WORDS}
+    keys |= {f"p:{token[:4]}" for token in key if len(token) >= 4 and token not in GENERIC_WORDS}
+    keys.add(f"j:{''.join(key)[:5]}")
+    return keys
+
+
+class CompanyEntity:
+    """One company and every name it was seen under."""
+    def __init__(self, name, key, learned=False):
+        self.name = name
+        # Normalized name new names are compared with; aliases only match exactly
+        self.key = key
+        # True if name came from company_aliases rather than this run
+        self.learned = learned
+        self.keys = []
+        # Aliases merged by is_prefix_match only, which are not worth remembering
+        self.prefix_keys = set()
+        self.variants = []
+
+    def preferred_name(self):
+        """Learned canonical name, else the variant with the fewest words (the brand), first seen on ties."""
+        if self.learned or not self.variants:
+            return self.name
+        cleaned = [clean_display_name(variant) or variant for variant in self.variants]
+        return min(cleaned, key=lambda variant: len(normalize_name(variant)))
+
+    def alternate_names(self):
+        """Other names seen for this company, cleaned, without case duplicates."""
+        seen = {self.name.lower()}
+        names = []
+        for variant in self.variants:
+            cleaned = clean_display_name(variant) or variant
+            if cleaned.lower() not in seen:
+                seen.add(cleaned.lower())
+                names.append(cleaned)
+        return names
+
+
+class CompanyIndex:
+    """
+    Collapses name variants ('Salesforce logo', 'salesforce', 'Salesforce Field
+    Service') to one entity. A new name is compared only with the canonical name
+    of companies sharing a block (token, token prefix or joined prefix), never
+    with every name, so merges cannot chain from alias to alias. Names merged in
+    earlier runs are looked up in company_aliases first.
+    """
+    def __init__(self, aliases=company_aliases, threshold=MATCH_THRESHOLD):
+        self.aliases = aliases
+        self.threshold = threshold
+        self.entities = []
+        self.by_key = {}
+        self.blocks = {}
+
+    def _register(self, key, entity):
+        if key in self.by_key:
+            return
+        self.by_key[key] = entity
+        entity.keys.append(key)
+        if key == entity.key:
+            for block in _block_keys(key):
+                self.blocks.setdefault(block, []).append(entity)
+
+    def _best_match(self, key):
+        # Names with numbers only match names with the same numbers
+        numbers = _numbers(key)
+        blocks = {f"t:{token}" for token in numbers} if numbers else _block_keys(key)
+        candidates = {}
+        for block in blocks:
+            members = self.blocks.get(block, ())
+            if len(members) <= MAX_BLOCK_SIZE:
+                for entity in members:
+                    candidates[id(entity)] = entity
+        best, best_score = None, self.threshold
+        for entity in candidates.values():
+            score = name_similarity(key, entity.key, best_score)
+            if score >= best_score:
+                best, best_score = entity, score
+        return best
+
+    def _learned_name(self, key):
+        """Canonical name stored for key, if it would still match under the current rules."""
+        canonical = self.aliases.get(" ".join(key)) if self.aliases is not None else None
+        if canonical and name_similarity(key, normalize_name(canonical)) >= self.threshold:
+            return canonical
+        return None
+
+    def add(self, name):
+        """
+        (entity, created) for name; created is True the first time a company is
+        seen. (None, False) if nothing is left of name after normalization.
+        """
+        key = normalize_name(name)
+        if not key:
+            return None, False
+        entity = self.by_key.get(key)
+        created = False
+        if entity is None:
+            canonical = self._learned_name(key)
+            if canonical:
+                entity = self.by_key.get(normalize_name(canonical))
+            if entity is None:
+                entity = self._best_match(key)
+                if entity is not None and is_prefix_match(key, entity.key):
+                    entity.prefix_keys.add(key)
+            if entity is None:
+                display = canonical or clean_display_name(name) or _text(name)
+                entity = CompanyEntity(display, normalize_name(canonical) if canonical else key, learned=bool(canonical))
+                self.entities.append(entity)
+                created = True
+                self._register(entity.key, entity)
+            self._register(key, entity)
+        entity.variants.append(_text(name))
+        return entity, created
+
+    def learn(self):
+        """
+        Stores the canonical name of every company seen under more than one name,
+        except names merged only because they extend another by generic words.
+        """
+        if not ALIAS_LEARNING or self.aliases is None:
+            return
+        for entity in self.entities:
+            keys = [key for key in entity.keys if key not in entity.prefix_keys]
+            if len(keys) > 1:
+                for key in keys:
+                    self.aliases.set(" ".join(key), entity.name)
+
+
+def collapse_records(records, field="Company"):
+    """
+    One record per company: the first record naming it, renamed to its preferred
+    name, with the other names in Alternate_Names ('; '-separated, merged with
+    any already there). Records without a usable name are dropped.
+    """
+    index = CompanyIndex()
+    firsts = []
+    for record in records:
+        entity, created = index.add(record.get(field))
+        if created:
+            firsts.append((entity, record))
+    for entity in index.entities:
+        entity.name = entity.preferred_name()
+    index.learn()
+
+    collapsed = []
+    for entity, record in firsts:
+        alternates = entity.alternate_names()
+        for existing in _text(record.get("Alternate_Names")).split(";"):
+            existing = existing.strip()
+            if existing and existing.lower() != entity.name.lower() and existing not in alternates:
+                alternates.append(existing)
+        collapsed.append({**record, field: entity.name, "Alternate_Names": "; ".join(alternates)})
+    return collapsed
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Where persistent caches live (survives uvicorn/PM2 restarts)
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache"))
+
+
+def cache_path(filename):
+    """Path of a cache database inside CACHE_DIR."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, filename)
+
+
+class DiskCache:
+    """
+    SQLite-backed key/value cache with LRU eviction and an optional TTL.
+    Values are stored as JSON. Safe to share between threads. max_entries=None
+    keeps every entry.
+    """
+    def __init__(self, path, max_entries=10000, ttl_seconds=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self._sets_since_evict = 0
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self.conn.commit()
+
+    def _is_expired(self, created, now):
+        return self.ttl_seconds is not None and now - created > self.ttl_seconds
+
+    def get(self, key, default=None):
+        """Returns the cached value, or default on a miss or expired entry."""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            value, created = row
+            if self._is_expired(created, now):
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.conn.commit()
+                self.expired += 1
+                self.misses += 1
+                return default
+            self.conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            self._sets_since_evict += 1
+            # Counting rows on every write is wasteful; check periodically
+            if self._sets_since_evict >= max(1, (self.max_entries or 0) // 100):
+                self._evict()
+            self.conn.commit()
+
+    def delete(self, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.conn.commit()
+
+    def _evict(self):
+        """Drops expired entries, then the least recently used ones above max_entries."""
+        self._sets_since_evict = 0
+        if self.ttl_seconds is not None:
+            cursor = self.conn.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl_seconds,))
+            self.expired += cursor.rowcount
+        if self.max_entries is None:
+            return
+        count = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self.conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed ASC LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def items(self, prefix=""):
+        """All unexpired (key, value) pairs whose key starts with prefix."""
+        cutoff = time.time() - self.ttl_seconds if self.ttl_seconds is not None else 0
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key, value FROM entries WHERE key >= ? AND key < ? AND created >= ?",
+                (prefix, prefix + "\uffff", cutoff),
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self):
+        """Hit/miss counters plus current size."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
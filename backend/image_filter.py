@@ -0,0 +1,239 @@
+import os
+import re
+import struct
+import threading
+from collections import Counter
+from urllib.parse import urlsplit
+import aiohttp
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Bytes fetched to probe size and dimensions before downloading a whole image
+PROBE_BYTES = int(os.getenv("IMAGE_PROBE_BYTES", "4096"))
+# crawl4ai image score below which an image is not worth a vision call
+IMAGE_MIN_SCORE = float(os.getenv("IMAGE_MIN_SCORE", "1"))
+MIN_IMAGE_BYTES = int(os.getenv("IMAGE_MIN_BYTES", "300"))
+MAX_IMAGE_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(2 * 1024 * 1024)))
+
+# Rendered size limits (CSS px); the 50x20 minimum is the old DOM visibility check
+MIN_RENDERED_WIDTH, MIN_RENDERED_HEIGHT = 50, 20
+# Intrinsic size limits (image px)
+MIN_NATURAL_WIDTH, MIN_NATURAL_HEIGHT = 32, 16
+BANNER_MIN_WIDTH, BANNER_MIN_HEIGHT = 1600, 500
+# Logos are wide but not strips, and rarely much taller than wide
+MAX_ASPECT_RATIO, MIN_ASPECT_RATIO = 12.0, 1 / 3
+
+# Never logos: known tracker hosts and paths, favicons. Anchored to hosts and
+# whole path segments so names like 'pixelworks_logo.png' are not caught.
+URL_RULES = [
+    ("url_icon", re.compile(r"(/favicon[^/]*$|/apple-touch-icon[^/]*$|\.ico(\?|$))", re.I)),
+    ("url_tracking", re.compile(
+        r"(//([^/?#]*\.)?(doubleclick\.net|google-analytics\.com|googletagmanager\.com|bat\.bing\.com|px\.ads\.linkedin\.com)([:/?#]|$)"
+        r"|//([^/?#]*\.)?facebook\.com/tr([/?#]|$)"
+        r"|/(1x1|spacer|pixel|beacon|tracking)(\.(gif|png)|[/?#]|$))",
+        re.I,
+    )),
+]
+
+
+def _path_words(*words):
+    """
+    Any of words as a whole word of a URL path, between '/', '-', '_', '.' or
+    '@' (plural or numbered too), so 'avatar' matches '/avatars/jane.png' but
+    not '/avatarsoft.png'.
+    """
+    return re.compile(r"(^|[/_.@\-])(%s)(s|\d+)?(?=[/_.@\-]|$)" % "|".join(words), re.I)
+
+
+# Heuristics, only applied to the URL path and only when neither the URL nor
+# the page places the image among sponsors, so sponsor logos with unlucky
+# file names are not dropped
+WEAK_URL_RULES = [
+    ("url_social", re.compile(
+        r"/(facebook|twitter|linkedin|instagram|youtube|tiktok|x|social)[-_]?(icon|badge|share|button)s?\.(png|svg|gif|jpe?g|webp)"
+        r"|/social(-icons?|-media)?/",
+        re.I,
+    )),
+    ("url_icon", _path_words("icon", "sprite")),
+    ("url_banner", _path_words("hero", "banner", "background", "bg", r"header[-_]image", "slider")),
+    ("url_ui", _path_words("chevron", "hamburger", "loader", "spinner", "placeholder", "avatar", "headshot", "speaker")),
+]
+LOGO_HINT = re.compile(r"(logo|sponsor|partner|exhibitor|brand)", re.I)
+
+# Cumulative rejections across all crawls
+total_rejections = Counter()
+_totals_lock = threading.Lock()
+
+
+def image_dimensions(head):
+    """
+    (width, height) from the first bytes of a PNG, GIF, WebP or JPEG file, or
+    None if the format is not recognised or the header is incomplete.
+    """
+    if len(head) >= 24 and head[:8] == b"\x89PNG\r\n\x1a\n":
+        return struct.unpack(">II", head[16:24])
+    if len(head) >= 10 and head[:6] in (b"GIF87a", b"GIF89a"):
+        return struct.unpack("<HH", head[6:10])
+    if len(head) >= 30 and head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        chunk = head[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", head[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(head[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            return int.from_bytes(head[24:27], "little") + 1, int.from_bytes(head[27:30], "little") + 1
+        return None
+    if len(head) >= 4 and head[:2] == b"\xff\xd8":
+        # Walk JPEG segments to the first start-of-frame marker
+        offset = 2
+        while offset + 9 < len(head):
+            if head[offset] != 0xFF:
+                return None
+            marker = head[offset + 1]
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                offset += 2
+                continue
+            length = struct.unpack(">H", head[offset + 2:offset + 4])[0]
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", head[offset + 5:offset + 9])
+                return width, height
+            offset += 2 + length
+        return None
+    return None
+
+
+class ImageFilter:
+    """
+    Rejects images that cannot be logos before any download or vision call.
+    One instance per crawl; summary() gives the counts per rule.
+    """
+    def __init__(self, geometry_by_src=None):
+        self.geometry_by_src = geometry_by_src or {}
+        self.rejections = Counter()
+        self.passed = 0
+        self.lock = threading.Lock()
+
+    def reject(self, rule):
+        with self.lock:
+            self.rejections[rule] += 1
+        with _totals_lock:
+            total_rejections[rule] += 1
+        return rule
+
+    def accept(self):
+        with self.lock:
+            self.passed += 1
+        return None
+
+    def check_metadata(self, img_data):
+        """
+        Rules that need no network: URL patterns, crawl4ai score and DOM geometry.
+        Returns the rejecting rule name, or None.
+        """
+        src = img_data.get("src") or ""
+        geometry = self.geometry_by_src.get(src)
+
+        for rule, pattern in URL_RULES:
+            if pattern.search(src):
+                return self.reject(rule)
+        # extract_images_js flags images inside a sponsor/partner/exhibitor container
+        if not LOGO_HINT.search(src) and not (geometry and geometry.get("sponsor")):
+            path = urlsplit(src).path
+            for rule, pattern in WEAK_URL_RULES:
+                if pattern.search(path):
+                    return self.reject(rule)
+
+        score = img_data.get("score")
+        if score is not None and score < IMAGE_MIN_SCORE:
+            return self.reject("low_score")
+
+        if geometry:
+            width, height = geometry.get("width") or 0, geometry.get("height") or 0
+            if width < MIN_RENDERED_WIDTH or height < MIN_RENDERED_HEIGHT:
+                return self.reject("dom_too_small")
+            if width >= BANNER_MIN_WIDTH and height >= BANNER_MIN_HEIGHT:
+                return self.reject("dom_banner")
+        return None
+
+    def check_content(self, total_bytes, head):
+        """
+        Rules on the probe: content length and header dimensions.
+        Returns the rejecting rule name, or None (which counts as a pass).
+        """
+        if total_bytes is not None:
+            if total_bytes < MIN_IMAGE_BYTES:
+                return self.reject("too_few_bytes")
+            if total_bytes > MAX_IMAGE_BYTES:
+                return self.reject("too_many_bytes")
+
+        dimensions = image_dimensions(head)
+        if dimensions:
+            width, height = dimensions
+            if width < MIN_NATURAL_WIDTH or height < MIN_NATURAL_HEIGHT:
+                return self.reject("header_too_small")
+            if width >= BANNER_MIN_WIDTH and height >= BANNER_MIN_HEIGHT:
+                return self.reject("header_banner")
+            ratio = width / height if height else 0
+            if ratio > MAX_ASPECT_RATIO or ratio < MIN_ASPECT_RATIO:
+                return self.reject("header_aspect_ratio")
+        return self.accept()
+
+    def summary(self):
+        with self.lock:
+            return {"passed": self.passed, "rejected": dict(self.rejections)}
+
+
+def _total_from_content_range(value):
+    # "bytes 0-4095/123456"
+    if value and "/" in value:
+        total = value.rsplit("/", 1)[1]
+        if total.isdigit():
+            return int(total)
+    return None
+
+
+async def fetch_image(session, src, image_filter, timeout=10):
+    """
+    Downloads an image only if its probe passes the filter. A range request
+    fetches the first PROBE_BYTES; small images are complete after it.
+    Returns the image bytes, or None if rejected or unavailable.
+    """
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    headers = {"Range": f"bytes=0-{PROBE_BYTES - 1}"}
+    async with session.get(src, headers=headers, timeout=client_timeout) as resp:
+        if resp.status == 206:
+            head = await resp.read()
+            total = _total_from_content_range(resp.headers.get("Content-Range"))
+            if image_filter.check_content(total, head):
+                return None
+            complete = len(head) < PROBE_BYTES if total is None else total <= len(head)
+            if complete:
+                return head
+        elif resp.status == 200:
+            # Range ignored: decide from Content-Length and the first bytes, then read the rest
+            total = resp.content_length
+            if total is not None and total > MAX_IMAGE_BYTES:
+                image_filter.reject("too_many_bytes")
+                return None
+            head = b""
+            while len(head) < PROBE_BYTES:
+                chunk = await resp.content.read(PROBE_BYTES - len(head))
+                if not chunk:
+                    # Whole image already read
+                    total = len(head)
+                    break
+                head += chunk
+            if image_filter.check_content(total, head):
+                return None
+            return head + await resp.content.read()
+        else:
+            return None
+
+    # Probe passed but the image is larger than the probe
+    async with session.get(src, timeout=client_timeout) as resp:
+        if resp.status == 200:
+            return await resp.read()
+    return None
@@ -0,0 +1,141 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Number of jobs that may run at the same time
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Finished jobs kept in memory for status lookups
+MAX_JOBS_KEPT = int(os.getenv("MAX_JOBS_KEPT", "200"))
+
+
+class Job:
+    """
+    State of one background job. Workers report progress through start()
+    and add_result(); readers use snapshot() and results_since().
+    """
+    def __init__(self, kind):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.status = "queued"
+        self.total = 0
+        self.completed = 0
+        self.results = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        # Bumped on every change so streams know when to send an update
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def _touch(self):
+        self.updated_at = time.time()
+        self.version += 1
+
+    def start(self, total):
+        with self.lock:
+            self.status = "running"
+            self.total = total
+            self._touch()
+
+    def add_result(self, row):
+        with self.lock:
+            self.results.append(row)
+            self.completed += 1
+            self._touch()
+
+    def finish(self, result):
+        with self.lock:
+            self.status = "completed"
+            self.result = result
+            self._touch()
+
+    def fail(self, error):
+        with self.lock:
+            self.status = "failed"
+            self.error = str(error)
+            self._touch()
+
+    @property
+    def done(self):
+        return self.status in ("completed", "failed")
+
+    def results_since(self, offset):
+        """Partial results added after the first offset rows."""
+        with self.lock:
+            return list(self.results[offset:])
+
+    def snapshot(self, include_results=True):
+        with self.lock:
+            data = {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "completed": self.completed,
+                "total": self.total,
+                "error": self.error,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
+            }
+            if include_results:
+                data["partial_results"] = list(self.results)
+            if self.result is not None:
+                data["result"] = self.result
+            return data
+
+
+class JobManager:
+    """
+    Runs jobs on a bounded worker pool so request handlers return immediately.
+    """
+    def __init__(self, workers=JOB_WORKERS, max_jobs=MAX_JOBS_KEPT):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.jobs = OrderedDict()
+        self.max_jobs = max_jobs
+        self.lock = threading.Lock()
+
+    def submit(self, kind, fn, *args):
+        """
+        Queues fn(job, *args). Its return value becomes the job result; an
+        exception marks the job failed.
+        """
+        job = Job(kind)
+        with self.lock:
+            self.jobs[job.id] = job
+            self._prune()
+        self.executor.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job, fn, args):
+        try:
+            if job.status == "queued":
+                job.start(0)
+            job.finish(fn(job, *args))
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind}) failed: {e}")
+            job.fail(e)
+
+    def _prune(self):
+        """Forgets the oldest finished jobs beyond max_jobs."""
+        overflow = len(self.jobs) - self.max_jobs
+        for job_id in list(self.jobs):
+            if overflow <= 0:
+                break
+            if self.jobs[job_id].done:
+                del self.jobs[job_id]
+                overflow -= 1
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def queue_depth(self):
+        """Jobs waiting for a worker plus jobs running."""
+        with self.lock:
+            return sum(1 for job in self.jobs.values() if not job.done)
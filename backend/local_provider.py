@@ -0,0 +1,373 @@
+# Offline stand-ins for OpenAI, Gemini and DuckDuckGo, selected with
+# PROVIDER_MODE=local. They expose the same surface the agents use, wait for a
+# simulated latency, fail at configurable rates and return canned outputs that
+# depend only on the request, so runs are repeatable without keys or network.
+import os
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import base64
+import hashlib
+import threading
+from collections import Counter
+from types import SimpleNamespace
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def parse_latency(spec):
+    """
+    'median_ms[:sigma]' -> (median seconds, sigma) of a lognormal delay.
+    sigma 0 gives a fixed delay.
+    """
+    median, _, sigma = str(spec).partition(":")
+    return float(median) / 1000, float(sigma or 0)
+
+
+# Multiplies every simulated latency (e.g. 0.1 for quick load tests)
+LATENCY_SCALE = float(os.getenv("LOCAL_LATENCY_SCALE", "1"))
+
+# Simulated response times per kind of call
+LATENCY = {
+    "chat": parse_latency(os.getenv("LOCAL_CHAT_LATENCY_MS", "800:0.4")),
+    "vision": parse_latency(os.getenv("LOCAL_VISION_LATENCY_MS", "1200:0.4")),
+    "gemini": parse_latency(os.getenv("LOCAL_GEMINI_LATENCY_MS", "2000:0.4")),
+    "search": parse_latency(os.getenv("LOCAL_SEARCH_LATENCY_MS", "300:0.5")),
+}
+# Share of calls failing with a 429 or with a server error
+RATE_LIMIT_RATE = float(os.getenv("LOCAL_429_RATE", "0"))
+ERROR_RATE = float(os.getenv("LOCAL_ERROR_RATE", "0"))
+LOCAL_SEED = int(os.getenv("LOCAL_SEED", "0"))
+# Limits advertised in OpenAI-style x-ratelimit headers
+LOCAL_RPM = int(os.getenv("LOCAL_RPM", "10000"))
+LOCAL_TPM = int(os.getenv("LOCAL_TPM", "10000000"))
+
+PRODUCTS = [
+    "Predictive Spare Parts",
+    "Agentic AI for Engineers",
+    "Autonomous Self-Service",
+    "Predictive Churn Analytics",
+    "Enterprise Knowledge Intelligence",
+]
+FIRST_NAMES = ["Alex", "Jordan", "Sam", "Taylor", "Morgan", "Casey", "Riley", "Jamie"]
+LAST_NAMES = ["Chen", "Patel", "Garcia", "Novak", "Okafor", "Larsen", "Silva", "Kim"]
+TITLES = ["VP Field Service", "CTO", "Head of Operations", "Director of Service", "VP Customer Success"]
+SNIPPETS = [
+    "manufactures complex industrial equipment serviced by a global field engineering team.",
+    "provides maintenance contracts and spare parts logistics for installed systems.",
+    "operates a 24/7 technical support center handling high ticket volumes.",
+    "builds medical devices that require certified field service engineers.",
+    "sells enterprise software for customer service and support teams.",
+    "offers consulting services to service organisations.",
+]
+
+# Synthetic logos can name their company, e.g. a PNG text chunk "company:Acme Corp"
+LOGO_MARKER = re.compile(rb"company[:=]([A-Za-z0-9 &.,'\-]{1,60})")
+
+_rng = random.Random(LOCAL_SEED)
+_rng_lock = threading.Lock()
+call_counts = Counter()
+error_counts = Counter()
+
+
+class LocalProviderError(Exception):
+    """Simulated provider failure, shaped like the SDK errors rate_limiter inspects."""
+    def __init__(self, message, status_code=500, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        headers = {"retry-after": str(retry_after)} if retry_after else {}
+        self.response = SimpleNamespace(headers=headers)
+
+
+def stats():
+    """Simulated calls and failures per kind since startup (or the last reset)."""
+    with _rng_lock:
+        return {"calls": dict(call_counts), "errors": dict(error_counts)}
+
+
+def reset_stats():
+    with _rng_lock:
+        call_counts.clear()
+        error_counts.clear()
+
+
+def _draw(kind):
+    """(delay seconds, error or None) for one simulated call."""
+    median, sigma = LATENCY[kind]
+    median *= LATENCY_SCALE
+    with _rng_lock:
+        delay = median * math.exp(_rng.gauss(0, sigma)) if sigma else median
+        roll = _rng.random()
+        call_counts[kind] += 1
+        if roll < RATE_LIMIT_RATE:
+            error_counts[f"{kind}_429"] += 1
+            # Rejections come back quickly
+            return delay / 10, LocalProviderError("429 Too Many Requests (simulated)", 429, retry_after=1)
+        if roll < RATE_LIMIT_RATE + ERROR_RATE:
+            error_counts[f"{kind}_error"] += 1
+            return delay, LocalProviderError("500 Internal Server Error (simulated)")
+    return delay, None
+
+
+def _digest(text):
+    return int(hashlib.sha256(str(text).encode()).hexdigest(), 16)
+
+
+def _tokens(text):
+    return max(1, len(text) // 4)
+
+
+class _PromptCache:
+    """
+    Mimics provider prefix caching: after the first 1024 tokens, prefixes seen
+    before are reported as cached in 128-token blocks.
+    """
+    MIN_CHARS, BLOCK_CHARS, MAX_PREFIXES = 4096, 512, 200000
+
+    def __init__(self):
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def cached_tokens(self, text):
+        lengths = range(self.MIN_CHARS, len(text) + 1, self.BLOCK_CHARS)
+        digests = [(length, hashlib.sha1(text[:length].encode()).digest()) for length in lengths]
+        cached = 0
+        with self.lock:
+            for length, digest in digests:
+                if digest in self.seen:
+                    cached = length
+            if len(self.seen) > self.MAX_PREFIXES:
+                self.seen.clear()
+            self.seen.update(digest for _, digest in digests)
+        return cached // 4
+
+
+_prompt_cache = _PromptCache()
+
+
+def icp_analysis(company):
+    """Canned Agent 2 analysis; the same company always gets the same answer."""
+    digest = _digest(company.strip().lower())
+    fit_score = 1 + digest % 10
+    category = "High Fit" if fit_score >= 8 else "Moderate Fit" if fit_score >= 5 else "Out of Profile"
+    product = PRODUCTS[(digest // 10) % len(PRODUCTS)]
+    return {
+        "fit_score": fit_score,
+        "category": category,
+        "recommended_product": product,
+        "reasoning": f"{company} runs service operations where {product} addresses the main bottleneck (simulated).",
+        "hook": f"Since {company} supports installed equipment in the field, {product} can cut resolution times.",
+    }
+
+
+def logo_company(image_bytes):
+    """Company named in a synthetic logo, else a stable made-up name."""
+    match = LOGO_MARKER.search(image_bytes)
+    if match:
+        return match.group(1).decode().strip()
+    return f"Sponsor {hashlib.sha256(image_bytes).hexdigest()[:6].upper()}"
+
+
+def strategy_for(company, product):
+    """Canned Agent 3 strategy."""
+    digest = _digest(company.strip().lower())
+    domain = re.sub(r"[^a-z0-9]", "", company.lower()) or "company"
+    contacts = []
+    for i in range(1 + digest % 3):
+        first = FIRST_NAMES[(digest >> (4 * i)) % len(FIRST_NAMES)]
+        last = LAST_NAMES[(digest >> (4 * i + 2)) % len(LAST_NAMES)]
+        contacts.append({
+            "name": f"{first} {last}",
+            "title": TITLES[(digest >> i) % len(TITLES)],
+            "linkedin": f"https://linkedin.com/in/{first.lower()}{last.lower()}",
+            "email": f"{first.lower()}.{last.lower()}@{domain}.com",
+        })
+    return {
+        "contacts": contacts,
+        "product_analysis": {
+            "product": product,
+            "why_perfect": f"{company} fits {product} (simulated).",
+            "use_cases": [f"{product} use case {i} for {company}" for i in (1, 2, 3)],
+            "expected_roi": "20% lower cost to serve within 12 months (simulated).",
+            "competitive_edge": "Agentic workflows on top of existing service data.",
+        },
+        "email_draft": {
+            "subject": f"{product} for {company}"[:60],
+            "body": f"Hi {contacts[0]['name'].split()[0]},\n\nSimulated outreach for {company}.",
+            "to_name": contacts[0]["name"],
+            "to_email": contacts[0]["email"],
+        },
+    }
+
+
+def _message_parts(messages):
+    """(text, images) of a chat request; images are the decoded data URLs."""
+    texts, images = [], []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                texts.append(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                url = part.get("image_url", {}).get("url", "")
+                images.append(base64.b64decode(url.split(",", 1)[1]) if "," in url else url.encode())
+    return "\n".join(texts), images
+
+
+def _chat_content(text, images, json_mode):
+    if images:
+        names = [logo_company(image) for image in images]
+        if json_mode:
+            return json.dumps({"logos": [{"id": i, "company": name} for i, name in enumerate(names, start=1)]})
+        return names[0]
+    leads = re.findall(r"\[Lead ([^\]]+)\]\nCompany: (.*)\n", text)
+    if leads:
+        return json.dumps({"results": [{"id": lead_id, **icp_analysis(company)} for lead_id, company in leads]})
+    match = re.search(r"\*\*Lead Analysis:\*\*\nCompany: (.*)\n", text)
+    if match:
+        return json.dumps(icp_analysis(match.group(1)))
+    return json.dumps({"result": "ok"}) if json_mode else "OK"
+
+
+def _completion(kwargs):
+    text, images = _message_parts(kwargs.get("messages", []))
+    json_mode = (kwargs.get("response_format") or {}).get("type") == "json_object"
+    content = _chat_content(text, images, json_mode)
+    prompt_tokens = _tokens(text) + 85 * len(images)
+    completion_tokens = _tokens(content)
+    return SimpleNamespace(
+        model=kwargs.get("model"),
+        choices=[SimpleNamespace(index=0, finish_reason="stop", message=SimpleNamespace(role="assistant", content=content))],
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=_prompt_cache.cached_tokens(text)),
+        ),
+    )
+
+
+class _RawResponse:
+    def __init__(self, completion):
+        self.completion = completion
+        self.headers = {
+            "x-ratelimit-limit-requests": str(LOCAL_RPM),
+            "x-ratelimit-remaining-requests": str(LOCAL_RPM - 1),
+            "x-ratelimit-limit-tokens": str(LOCAL_TPM),
+            "x-ratelimit-remaining-tokens": str(max(0, LOCAL_TPM - completion.usage.total_tokens)),
+        }
+
+    def parse(self):
+        return self.completion
+
+
+def _kind(kwargs):
+    _, images = _message_parts(kwargs.get("messages", []))
+    return "vision" if images else "chat"
+
+
+class _Completions:
+    def __init__(self, is_async):
+        self.is_async = is_async
+        self.with_raw_response = SimpleNamespace(create=self._create_raw_async if is_async else self._create_raw)
+
+    def _create_raw(self, **kwargs):
+        delay, error = _draw(_kind(kwargs))
+        time.sleep(delay)
+        if error:
+            raise error
+        return _RawResponse(_completion(kwargs))
+
+    async def _create_raw_async(self, **kwargs):
+        delay, error = _draw(_kind(kwargs))
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return _RawResponse(_completion(kwargs))
+
+    def create(self, **kwargs):
+        if self.is_async:
+            return self._create_async(**kwargs)
+        return self._create_raw(**kwargs).parse()
+
+    async def _create_async(self, **kwargs):
+        return (await self._create_raw_async(**kwargs)).parse()
+
+
+class LocalOpenAI:
+    """Stand-in for openai.OpenAI (chat.completions, with or without raw responses)."""
+    def __init__(self, api_key=None, **kwargs):
+        self.api_key = api_key or "local"
+        self.chat = SimpleNamespace(completions=_Completions(is_async=False))
+
+    def close(self):
+        pass
+
+
+class AsyncLocalOpenAI:
+    """Stand-in for openai.AsyncOpenAI."""
+    def __init__(self, api_key=None, **kwargs):
+        self.api_key = api_key or "local"
+        self.chat = SimpleNamespace(completions=_Completions(is_async=True))
+
+    async def close(self):
+        pass
+
+
+class LocalGeminiModel:
+    """Stand-in for genai.GenerativeModel.generate_content."""
+    def __init__(self, api_key=None, model_name="local"):
+        self.api_key = api_key or "local"
+        self.model_name = model_name
+
+    def generate_content(self, prompt, **kwargs):
+        delay, error = _draw("gemini")
+        time.sleep(delay)
+        if error:
+            raise error
+        company = re.search(r"\nCompany: (.*)\n", prompt)
+        product = re.search(r"\nAgent 2 Recommendation: (.*)\n", prompt)
+        text = json.dumps(strategy_for(
+            company.group(1) if company else "Unknown",
+            product.group(1) if product else PRODUCTS[0],
+        ))
+        prompt_tokens, completion_tokens = _tokens(prompt), _tokens(text)
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=prompt_tokens,
+                cached_content_token_count=_prompt_cache.cached_tokens(prompt),
+                candidates_token_count=completion_tokens,
+                total_token_count=prompt_tokens + completion_tokens,
+            ),
+        )
+
+
+class LocalSearch:
+    """Stand-in for duckduckgo_search.DDGS.text."""
+    def text(self, keywords, max_results=5, **kwargs):
+        delay, error = _draw("search")
+        time.sleep(delay)
+        if error:
+            raise error
+        digest = _digest(keywords)
+        results = []
+        for i in range(max_results or 5):
+            if "linkedin" in keywords.lower():
+                first = FIRST_NAMES[(digest + i) % len(FIRST_NAMES)]
+                last = LAST_NAMES[(digest // 7 + i) % len(LAST_NAMES)]
+                title = TITLES[(digest + i) % len(TITLES)]
+                body = f"{first} {last} - {title} | LinkedIn. {first.lower()}.{last.lower()}@ email on file."
+                href = f"https://linkedin.com/in/{first.lower()}{last.lower()}"
+            else:
+                body = f"{keywords.split(' ')[0]} {SNIPPETS[(digest + i) % len(SNIPPETS)]}"
+                href = f"https://example.com/{digest % 100000}/{i}"
+            results.append({"title": f"Result {i + 1}", "href": href, "body": body})
+        return results
@@ -0,0 +1,178 @@
+import io
+import os
+import math
+import hashlib
+import threading
+from dotenv import load_dotenv
+from disk_cache import DiskCache, cache_path
+
+try:
+    from PIL import Image
+except ImportError:  # Perceptual matching is skipped without Pillow
+    Image = None
+
+load_dotenv()
+
+# Max Hamming distance between 64-bit dHashes that counts as the same logo
+LOGO_HASH_THRESHOLD = int(os.getenv("LOGO_HASH_THRESHOLD", "6"))
+# Max relative difference in aspect ratio (of the drawn content) between two copies of a logo
+LOGO_ASPECT_TOLERANCE = float(os.getenv("LOGO_ASPECT_TOLERANCE", "0.15"))
+
+# Vision answers that mean "no company here"
+NOT_A_COMPANY = ("Unknown",)
+
+# Grey levels this far below white count as drawn content when cropping
+INK_THRESHOLD = 96
+
+
+def content_hash(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def _difference_bits(pixels, size, row_width, step):
+    """size*size bits, one per pixel compared with its neighbour step pixels on."""
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            index = row * row_width + col
+            bits = (bits << 1) | (1 if pixels[index] > pixels[index + step] else 0)
+    return bits
+
+
+def fingerprint(image_bytes, size=8):
+    """
+    {"dhash", "vhash", "aspect"} of the decoded image: horizontal and vertical
+    64-bit difference hashes and the width/height ratio, all taken after cropping
+    to the drawn content so mostly-white wordmarks hash their lettering rather
+    than the padding. None if the image cannot be decoded (SVG, corrupt data,
+    Pillow missing) or carries no information (solid colour).
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            img = img.convert("RGBA")
+            # Transparent logos are drawn on white so the background does not read as black
+            background = Image.new("RGBA", img.size, (255, 255, 255, 255))
+            background.alpha_composite(img)
+            gray = background.convert("L")
+            box = gray.point(lambda p: 255 if p < 255 - INK_THRESHOLD else 0).getbbox()
+            if box:
+                gray = gray.crop(box)
+            width, height = gray.size
+            wide = list(gray.resize((size + 1, size), Image.LANCZOS).tobytes())
+            tall = list(gray.resize((size, size + 1), Image.LANCZOS).tobytes())
+    except Exception:
+        return None
+
+    horizontal = _difference_bits(wide, size, size + 1, 1)
+    vertical = _difference_bits(tall, size, size, size)
+    if not horizontal and not vertical:
+        return None
+    return {"dhash": horizontal, "vhash": vertical, "aspect": width / height}
+
+
+def _distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class LogoCache:
+    """
+    Remembers which company each logo image resolved to. Lookups try the exact
+    content hash first, then the closest perceptual match: both hashes within
+    the threshold and the aspect ratio within aspect_tolerance.
+    """
+    def __init__(self, disk_cache, threshold=LOGO_HASH_THRESHOLD, aspect_tolerance=LOGO_ASPECT_TOLERANCE):
+        self.disk = disk_cache
+        self.threshold = threshold
+        self.aspect_tolerance = aspect_tolerance
+        self.bucket_width = math.log(1 + aspect_tolerance)
+        self.lock = threading.Lock()
+        # Aspect-ratio bucket -> tuple of (fingerprint, company). Tuples are replaced,
+        # never changed, so lookups scan them without holding the lock.
+        self.perceptual_index = {}
+        for _, value in self.disk.items("sha:"):
+            # Entries from before fingerprints (a lone "dhash") still serve exact hits
+            if value.get("fingerprint") and value.get("company") not in NOT_A_COMPANY:
+                self._index(value["fingerprint"], value["company"])
+        self.exact_hits = 0
+        self.perceptual_hits = 0
+        self.misses = 0
+
+    def _bucket(self, aspect):
+        return round(math.log(aspect) / self.bucket_width)
+
+    def _index(self, image_fingerprint, company):
+        bucket = self._bucket(image_fingerprint["aspect"])
+        with self.lock:
+            self.perceptual_index[bucket] = self.perceptual_index.get(bucket, ()) + ((image_fingerprint, company),)
+
+    def _nearest(self, image_fingerprint):
+        aspect = image_fingerprint["aspect"]
+        bucket = self._bucket(aspect)
+        best_company, best_distance = None, None
+        for neighbour in (bucket - 1, bucket, bucket + 1):
+            for known, company in self.perceptual_index.get(neighbour, ()):
+                if abs(known["aspect"] / aspect - 1) > self.aspect_tolerance:
+                    continue
+                horizontal = _distance(known["dhash"], image_fingerprint["dhash"])
+                vertical = _distance(known["vhash"], image_fingerprint["vhash"])
+                if horizontal > self.threshold or vertical > self.threshold:
+                    continue
+                if best_distance is None or horizontal + vertical < best_distance:
+                    best_company, best_distance = company, horizontal + vertical
+        return best_company
+
+    def lookup(self, image_bytes):
+        """
+        Returns (company, sha, fingerprint). company is None on a miss; sha and
+        fingerprint can be passed back to store() to avoid hashing twice.
+        """
+        sha = content_hash(image_bytes)
+        cached = self.disk.get(f"sha:{sha}")
+        if cached is not None:
+            with self.lock:
+                self.exact_hits += 1
+            return cached["company"], sha, cached.get("fingerprint")
+
+        image_fingerprint = fingerprint(image_bytes)
+        if image_fingerprint is not None:
+            company = self._nearest(image_fingerprint)
+            if company is not None:
+                with self.lock:
+                    self.perceptual_hits += 1
+                # Remember the exact bytes too so the next lookup is a cheap hit
+                self.disk.set(f"sha:{sha}", {"company": company, "fingerprint": image_fingerprint})
+                return company, sha, image_fingerprint
+
+        with self.lock:
+            self.misses += 1
+        return None, sha, image_fingerprint
+
+    def store(self, sha, image_fingerprint, company):
+        """Records a vision result. 'Unknown' is only cached for the exact bytes."""
+        self.disk.set(f"sha:{sha}", {"company": company, "fingerprint": image_fingerprint})
+        if image_fingerprint and company not in NOT_A_COMPANY:
+            self._index(image_fingerprint, company)
+
+    def stats(self):
+        with self.lock:
+            saved = self.exact_hits + self.perceptual_hits
+            lookups = saved + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "perceptual_hits": self.perceptual_hits,
+                "misses": self.misses,
+                "vision_calls_saved": saved,
+                "hit_rate": round(saved / lookups, 3) if lookups else 0.0,
+                "indexed_logos": sum(len(entries) for entries in self.perceptual_index.values()),
+                "perceptual_matching": Image is not None,
+            }
+
+
+logo_cache = LogoCache(
+    DiskCache(
+        os.getenv("LOGO_CACHE_PATH", cache_path("logo_cache.sqlite3")),
+        max_entries=int(os.getenv("LOGO_CACHE_MAX_ENTRIES", "50000")),
+    )
+)
@@ -1,17 +1,40 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from contextlib import asynccontextmanager
+from fastapi.responses import FileResponse, StreamingResponse, Response, PlainTextResponse
 from pydantic import BaseModel
+from typing import Optional, List, Dict
 import pandas as pd
 import os
 import uuid
-from agent1 import run_scrape
-from agent2 import ICPValidator
+import json
+import asyncio
+import time
+from agent1 import run_scrape, run_scrape_stream
+from browser_pool import browser_pool
+from batch_scrape import BatchScrape, BATCH_SCRAPE_MAX_URLS
+from agent2 import ICPValidator, search_cache, analysis_store, INCREMENTAL
 from agent3 import StrategyGenerator
+from pipeline import LeadPipeline
+from strategy_store import strategy_store
+from logo_cache import logo_cache
+from image_filter import total_rejections
+from run_store import run_store, run_id_from_filename, to_excel_bytes
+from jobs import JobManager
+from token_usage import track_usage, total_usage
+from single_flight import single_flight_stats
+from rate_limiter import get_limiter_stats
+from metrics import registry, http_request_duration
+from tracing import start_trace, new_trace_id, is_valid_trace_id, summarize_trace
 import math
 
-# In-memory cache for Agent 3 strategies
-strategy_cache = {}
+# Background workers for long-running endpoints
+job_manager = JobManager()
+# Background Agent 3 runs (each one fans out over its own worker pool)
+strategy_job_manager = JobManager(workers=int(os.getenv("AGENT3_BACKGROUND_JOBS", "2")))
+
+# How often SSE streams check their job for changes (seconds)
+SSE_POLL_INTERVAL = 0.5
 
 def sanitize_data(data):
     """Remove NaN and Infinity values from data to make it JSON compliant"""
@@ -25,8 +48,60 @@ def sanitize_data(data):
         return data
     return data
 
+def cache_counts():
+    """(hits, misses) per persistent cache, read from the caches' own counters."""
+    search = search_cache.stats()
+    analysis = analysis_store.stats()
+    strategy = strategy_store.stats()
+    logo = logo_cache.stats()
+    return {
+        "search_cache": (search["hits"], search["misses"]),
+        "analysis_store": (analysis["hits"], analysis["misses"]),
+        "strategy_cache": (strategy["memory_hits"] + strategy["disk"]["hits"], strategy["disk"]["misses"]),
+        "logo_cache": (logo["vision_calls_saved"], logo["misses"]),
+    }
+
+def limiter_totals(field):
+    """Sum of a rate limiter stat per provider and key."""
+    return {tuple(name.split(":", 1)): stats[field] for name, stats in get_limiter_stats().items()}
+
+# Read at scrape time from state the app already keeps
+registry.callback("cache_hits_total", "counter", "Cache hits per cache.",
+                  lambda: {(name,): hits for name, (hits, _) in cache_counts().items()}, ("cache",))
+registry.callback("cache_misses_total", "counter", "Cache misses per cache.",
+                  lambda: {(name,): misses for name, (_, misses) in cache_counts().items()}, ("cache",))
+registry.callback("background_queue_depth", "gauge", "Background jobs queued or running.",
+                  lambda: {("validate",): job_manager.queue_depth(), ("strategize",): strategy_job_manager.queue_depth()}, ("queue",))
+registry.callback("rate_limit_throttled_total", "counter", "Calls that had to wait for the client-side rate limiter.",
+                  lambda: limiter_totals("throttled"), ("provider", "key"))
+registry.callback("rate_limit_wait_seconds_total", "counter", "Time spent waiting for the client-side rate limiter.",
+                  lambda: limiter_totals("wait_seconds"), ("provider", "key"))
+registry.callback("browser_pool_browsers", "gauge", "Agent 1 browsers by state.",
+                  lambda: {(state,): browser_pool.stats()[state] for state in ("idle", "in_use", "launching")}, ("state",))
+registry.callback("browser_pool_waiting", "gauge", "Scrapes waiting for a pooled browser.",
+                  lambda: browser_pool.stats()["waiting"])
+registry.callback("browser_pool_recycles_total", "counter", "Pooled browsers restarted, by reason (pages, rss, error, health).",
+                  lambda: {(reason,): count for reason, count in browser_pool.recycles.items()}, ("reason",))
+registry.callback("browser_pool_wait_seconds_total", "counter", "Time scrapes spent waiting for a pooled browser.",
+                  lambda: browser_pool.wait_seconds)
+registry.callback("single_flight_shared_total", "counter", "Calls answered by an identical call already in flight.",
+                  lambda: {(name,): stats["shared"] for name, stats in single_flight_stats().items()}, ("call",))
+
+def sse_event(event, data):
+    """Formats one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Warm browsers live as long as the app, so scrapes skip Chromium start-up
+    await browser_pool.start()
+    try:
+        yield
+    finally:
+        await browser_pool.stop()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -36,111 +111,406 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route templates, not raw paths, keep label cardinality bounded
+        route = request.scope.get("route")
+        http_request_duration.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        )
+
 class ValidateRequest(BaseModel):
     filename: str
+    # Adds this run to an earlier trace (defaults to the scrape the file came from)
+    trace_id: Optional[str] = None
+    # Reuse fit scores of companies whose inputs have not changed (default: AGENT2_INCREMENTAL)
+    incremental: Optional[bool] = None
 
 class ExtractRequest(BaseModel):
     url: str
 
+class BatchScrapeRequest(BaseModel):
+    urls: List[str]
+    # Conference name per URL (defaults to the page's site)
+    conferences: Optional[Dict[str, str]] = None
+
 class StrategyRequest(BaseModel):
     company_data: dict
 
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def save_raw_leads(scraped_data, trace_id=None):
+    """
+    Stores Agent 1 output as a new run and returns its download name
+    (leads_raw_<id>.xlsx), which later stages accept as the run reference.
+    The id is the scrape's trace ID, so validating the file continues its trace.
+    """
+    run_id = run_store.save(f"leads_raw_{trace_id or uuid.uuid4()}", scraped_data)
+    return f"{run_id}.xlsx"
+
+def client_key(http_request):
+    """Browser pool owner of a request: its client address."""
+    return http_request.client.host if http_request.client else None
+
+def trace_id_for(filename):
+    """Trace ID of the scrape that produced a raw leads file, if it has one."""
+    run_id = run_id_from_filename(filename) or ""
+    return run_id[len("leads_raw_"):] if run_id.startswith("leads_raw_") else None
+
+def load_run(filename):
+    """
+    DataFrame for a run reference, falling back to an .xlsx file of that name
+    in the working directory (outputs from before the run store). None if neither exists.
+    """
+    df = run_store.load(run_id_from_filename(filename))
+    if df is None:
+        filepath = os.path.join(os.getcwd(), os.path.basename(filename))
+        if filepath.endswith('.xlsx') and os.path.exists(filepath):
+            df = pd.read_excel(filepath)
+    return df
+
+def xlsx_response(df, filename):
+    """Renders df as an Excel download."""
+    return Response(
+        content=to_excel_bytes(df),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @app.post("/scrape")
-async def scrape_leads(request: ExtractRequest):
+async def scrape_leads(request: ExtractRequest, http_request: Request):
     try:
         # Run Agent 1: Scraper
-        scraped_data = await run_scrape(request.url)
+        trace_id = new_trace_id()
+        with start_trace("scrape", trace_id, url=request.url) as trace, track_usage() as usage:
+            scraped_data = await run_scrape(request.url, client_key(http_request))
+            trace.set(companies=len(scraped_data))
         
         if not scraped_data:
-            return {"message": "No data found", "data": []}
+            return {"message": "No data found", "data": [], "token_usage": usage.snapshot(), "trace_id": trace_id}
 
-        # Create DataFrame from Agent 1
-        df = pd.DataFrame(scraped_data)
-        
         # Save Agent 1 raw output
-        raw_filename = f"leads_raw_{uuid.uuid4()}.xlsx"
-        raw_filepath = os.path.join(os.getcwd(), raw_filename)
-        df.to_excel(raw_filepath, index=False)
+        raw_filename = await asyncio.to_thread(save_raw_leads, scraped_data, trace_id)
         
         return {
             "message": "Agent 1 Scraping Successful", 
             "filename": raw_filename,
-            "data": scraped_data
+            "run_id": run_id_from_filename(raw_filename),
+            "data": scraped_data,
+            "token_usage": usage.snapshot(),
+            "trace_id": trace_id
         }
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def cache_strategy(company_data, strategy):
+    """Persist for instant retrieval."""
+    strategy_store.put(company_data, strategy)
+    print(f"Cached strategy for {company_data.get('Company')}")
+
+def run_strategy_job(job, enriched_data_list, trace_id=None):
+    """
+    Worker body for background Agent 3: strategies for all decent fits, highest
+    fit score first, spread over every Gemini key.
+    """
+    print("Starting background Agent 3 processing...")
+    strategist = StrategyGenerator()
+    with start_trace("strategize", trace_id, job_id=job.id, background=True) as trace, track_usage() as usage:
+        counts = strategist.generate_strategies(
+            enriched_data_list,
+            progress=job,
+            # Skip companies whose inputs have not changed since the last run
+            is_cached=lambda company_data: strategy_store.get(company_data) is not None,
+            on_result=cache_strategy
+        )
+        trace.set(**counts)
+    print(f"Background Agent 3 processing complete! {counts}, token usage {usage.snapshot()}")
+    return {**counts, "token_usage": usage.snapshot()}
+
+def run_validation_job(job, raw_df, trace_id=None, incremental=INCREMENTAL):
+    """
+    Worker body for a /validate job: runs Agent 2, then starts Agent 3 in the background.
+    """
+    # Run Agent 2: Trigger Validation
+    validator = ICPValidator(incremental=incremental)
+    
+    # Each worker thread runs its own event loop
+    with start_trace("validate", trace_id, job_id=job.id, leads=len(raw_df)) as trace, track_usage() as usage:
+        enriched_df = asyncio.run(validator.validate_dataframe_async(raw_df, progress=job))
+        trace.set(**validator.revalidation)
+    print(f"Re-validation for {len(raw_df)} leads: {validator.revalidation}")
+    enriched_id = run_store.save(f"leads_enriched_{uuid.uuid4()}", enriched_df)
+    print(f"Token usage for {enriched_id}: {usage.snapshot()}")
+    
+    enriched_data = enriched_df.to_dict(orient='records')
+    enriched_data = sanitize_data(enriched_data)  # Clean NaN/Infinity values
+    
+    # Start Agent 3 in background (sorted by fit score, best first)
+    # Raw rows, like /strategize passes to Agent 3
+    strategy_job = strategy_job_manager.submit("strategize", run_strategy_job, enriched_df.to_dict(orient='records'), trace_id)
+    
+    return {
+        "message": "Agent 2 Validation Successful",
+        "data": enriched_data,
+        "run_id": enriched_id,
+        "download_url": f"/download/{enriched_id}.xlsx",
+        "strategy_job_id": strategy_job.id,
+        "strategy_status_url": f"/jobs/{strategy_job.id}",
+        "token_usage": usage.snapshot(),
+        "revalidation": validator.revalidation,
+        "trace_id": trace_id,
+        "trace_url": f"/traces/{trace_id}"
+    }
+
+@app.post("/scrape/stream")
+async def scrape_leads_stream(request: ExtractRequest, http_request: Request):
+    """
+    Agent 1 as NDJSON: one {"type": "company", "data": {...}} line per company as
+    soon as it is identified, an {"type": "alias", "data": {"Company", "Alternate_Names"}}
+    line when a later name variant is merged into one, then {"type": "done",
+    "filename": ...} once the run is stored (or {"type": "error", ...}).
+    """
+    owner = client_key(http_request)
+    
+    async def record_stream():
+        scraped_data = []
+        trace_id = new_trace_id()
+        try:
+            with start_trace("scrape", trace_id, url=request.url, streamed=True) as trace:
+                async for kind, data in run_scrape_stream(request.url, owner):
+                    if kind == "company":
+                        scraped_data.append(data)
+                    yield json.dumps({"type": kind, "data": data}) + "\n"
+                trace.set(companies=len(scraped_data))
+            
+            raw_filename = None
+            if scraped_data:
+                raw_filename = await asyncio.to_thread(save_raw_leads, scraped_data, trace_id)
+            yield json.dumps({"type": "done", "count": len(scraped_data), "filename": raw_filename, "trace_id": trace_id}) + "\n"
+        except Exception as e:
+            print(f"Error: {e}")
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+    
+    return StreamingResponse(record_stream(), media_type="application/x-ndjson")
+
+@app.post("/scrape/batch")
+async def scrape_batch(request: BatchScrapeRequest, http_request: Request):
+    """
+    Agent 1 over many pages as NDJSON: one {"type": "page", "data": {...}} line per
+    page as soon as it finishes, with the companies it added ("new") or was also
+    found on ("updated"), then {"type": "done", "filename": ...} with every company
+    merged across pages (or {"type": "error", ...}).
+    """
+    batch = BatchScrape(request.urls, client_key(http_request), request.conferences)
+    if not batch.urls:
+        raise HTTPException(status_code=400, detail="No URLs to scrape")
+    if len(batch.urls) > BATCH_SCRAPE_MAX_URLS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_SCRAPE_MAX_URLS} URLs per batch")
+    
+    async def page_stream():
+        trace_id = new_trace_id()
+        try:
+            with start_trace("scrape_batch", trace_id, pages=len(batch.urls), streamed=True) as trace, track_usage() as usage:
+                async for page in batch.stream():
+                    yield json.dumps({"type": "page", "data": sanitize_data(page)}, default=str) + "\n"
+                trace.set(**batch.counts)
+            
+            scraped_data = batch.records()
+            raw_filename = None
+            if scraped_data:
+                raw_filename = await asyncio.to_thread(save_raw_leads, scraped_data, trace_id)
+            yield json.dumps({
+                "type": "done",
+                "count": len(scraped_data),
+                "filename": raw_filename,
+                "run_id": run_id_from_filename(raw_filename) if raw_filename else None,
+                "counts": batch.counts,
+                "pages": batch.pages,
+                "token_usage": usage.snapshot(),
+                "trace_id": trace_id
+            }) + "\n"
+        except Exception as e:
+            print(f"Error: {e}")
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+    
+    return StreamingResponse(page_stream(), media_type="application/x-ndjson")
+
+@app.post("/pipeline/stream")
+async def pipeline_stream(request: ExtractRequest, http_request: Request):
+    """
+    Agents 1, 2 and 3 overlapped, as NDJSON: a {"type": "company"} line when Agent 1
+    identifies a company, {"type": "alias"} when it merges a later name variant
+    into one, {"type": "scored"} when Agent 2 has scored it and {"type": "strategy"}
+    when Agent 3 is done with it (fits of 4 or more), then {"type": "done", ...}
+    with the stored runs (or {"type": "error", ...}).
+    """
+    owner = client_key(http_request)
+    
+    async def event_stream():
+        pipeline = LeadPipeline(owner=owner)
+        trace_id = new_trace_id()
+        try:
+            with start_trace("pipeline", trace_id, url=request.url) as trace, track_usage() as usage:
+                async for kind, data in pipeline.stream(request.url):
+                    yield json.dumps({"type": kind, "data": sanitize_data(data)}, default=str) + "\n"
+                trace.set(**pipeline.counts)
+            
+            raw_filename = enriched_id = None
+            if pipeline.leads:
+                raw_filename = await asyncio.to_thread(save_raw_leads, pipeline.leads, trace_id)
+            if pipeline.enriched:
+                enriched_id = await asyncio.to_thread(run_store.save, f"leads_enriched_{uuid.uuid4()}", pipeline.enriched_rows())
+            yield json.dumps({
+                "type": "done",
+                "filename": raw_filename,
+                "run_id": enriched_id,
+                "download_url": f"/download/{enriched_id}.xlsx" if enriched_id else None,
+                "counts": pipeline.counts,
+                "revalidation": pipeline.validator.revalidation,
+                "timeline": pipeline.timeline,
+                "token_usage": usage.snapshot(),
+                "trace_id": trace_id
+            }) + "\n"
+        except Exception as e:
+            print(f"Error: {e}")
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+    
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+@app.get("/scrape/filter-stats")
+async def scrape_filter_stats():
+    """Images rejected by the Agent 1 pre-filter since startup, per rule."""
+    return {"rejected": dict(total_rejections)}
+
+@app.get("/scrape/browser-stats")
+async def scrape_browser_stats():
+    """Agent 1 browser pool: warm, busy and waiting counts, restarts and browser memory."""
+    return browser_pool.stats()
+
 @app.post("/validate")
 async def validate_leads(request: ValidateRequest):
-    try:
-        raw_filepath = os.path.join(os.getcwd(), request.filename)
-        
-        if not os.path.exists(raw_filepath):
-             raise HTTPException(status_code=404, detail="Raw leads file not found for validation")
+    """
+    Queues Agent 2 validation and returns a job ID immediately.
+    Poll /validate/{job_id} or stream /validate/{job_id}/events for progress.
+    """
+    raw_df = await asyncio.to_thread(load_run, request.filename)
+    
+    if raw_df is None:
+         raise HTTPException(status_code=404, detail="Raw leads file not found for validation")
+    
+    if request.trace_id and not is_valid_trace_id(request.trace_id):
+        raise HTTPException(status_code=400, detail="Invalid trace_id")
+    trace_id = request.trace_id or trace_id_for(request.filename) or new_trace_id()
+    incremental = INCREMENTAL if request.incremental is None else request.incremental
+    job = job_manager.submit("validate", run_validation_job, raw_df, trace_id, incremental)
+    
+    return {
+        "message": "Agent 2 Validation Queued",
+        "job_id": job.id,
+        "status_url": f"/validate/{job.id}",
+        "events_url": f"/validate/{job.id}/events",
+        "trace_id": trace_id
+    }
 
-        # Run Agent 2: Trigger Validation
-        validator = ICPValidator()
-        enriched_filename = f"leads_enriched_{uuid.uuid4()}.xlsx"
-        enriched_filepath = os.path.join(os.getcwd(), enriched_filename)
-        
-        # We need to process from the file we just saved
-        final_filepath = validator.process_leads(raw_filepath, enriched_filepath)
-        final_filename = os.path.basename(final_filepath)
-        
-        # Read back the enriched data to send to frontend
-        enriched_df = pd.read_excel(final_filepath)
-        enriched_data = enriched_df.to_dict(orient='records')
-        enriched_data = sanitize_data(enriched_data)  # Clean NaN/Infinity values
-        
-        # Start Agent 3 in background (sorted by fit score, best first)
-        import threading
-        from agent3 import StrategyGenerator
-        
-        def run_agent3_background(enriched_data_list):
-            """Run Agent 3 in background for all companies, sorted by fit score."""
-            try:
-                print("Starting background Agent 3 processing...")
-                strategist = StrategyGenerator()
-                
-                # Sort by fit score (highest first)
-                sorted_companies = sorted(
-                    enriched_data_list, 
-                    key=lambda x: x.get('Fit_Score', 0), 
-                    reverse=True
-                )
-                
-                # Process each company and cache results
-                for company_data in sorted_companies:
-                    if company_data.get('Fit_Score', 0) >= 4:  # Only process decent fits
-                        strategy = strategist.generate_single_strategy(company_data)
-                        if strategy:
-                            # Cache in memory for instant retrieval
-                            company_name = company_data.get('Company')
-                            strategy_cache[company_name] = strategy
-                            print(f"Cached strategy for {company_name}")
-                
-                print("Background Agent 3 processing complete!")
-            except Exception as e:
-                print(f"Background Agent 3 error: {e}")
-        
-        # Start background thread
-        bg_thread = threading.Thread(target=run_agent3_background, args=(enriched_data,))
-        bg_thread.daemon = True
-        bg_thread.start()
-        
-        return {
-            "message": "Agent 2 Validation Successful",
-            "data": enriched_data,
-            "download_url": f"/download/{final_filename}"
-        }
-    except Exception as e:
-        print(f"Error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/validate/{job_id}")
+async def validation_status(job_id: str):
+    """Progress, partial results and (once finished) the full result of a validation job."""
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return sanitize_data(job.snapshot())
+
+@app.get("/validate/{job_id}/events")
+async def validation_events(job_id: str):
+    """
+    Server-Sent Events stream: a 'progress' event with new rows whenever
+    companies complete, then a final 'completed' or 'failed' event.
+    """
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def event_stream():
+        sent_rows = 0
+        seen_version = -1
+        while True:
+            if job.version != seen_version:
+                seen_version = job.version
+                # Rows are read after the snapshot, so a finished snapshot comes with all of them
+                snapshot = job.snapshot(include_results=False)
+                new_rows = job.results_since(sent_rows)
+                sent_rows += len(new_rows)
+                finished = snapshot["status"] in ("completed", "failed")
+                if new_rows or not finished:
+                    yield sse_event("progress", sanitize_data({**snapshot, "new_results": new_rows}))
+                if finished:
+                    yield sse_event(snapshot["status"], sanitize_data(snapshot))
+                    return
+            await asyncio.sleep(SSE_POLL_INTERVAL)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Status of any background job (validation or Agent 3 strategy)."""
+    job = job_manager.get(job_id) or strategy_job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return sanitize_data(job.snapshot())
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit/miss counters for the persistent caches, provider prompt-cache token usage
+    and calls shared by single-flight deduplication.
+    """
+    return {
+        "search_cache": search_cache.stats(),
+        "analysis_store": analysis_store.stats(),
+        "strategy_cache": strategy_store.stats(),
+        "logo_cache": logo_cache.stats(),
+        "llm_token_usage": total_usage.snapshot(),
+        "single_flight": single_flight_stats()
+    }
+
+@app.get("/traces/{trace_id}")
+async def trace_summary(trace_id: str):
+    """
+    Where the time of a run went: per-stage totals and percentiles, LLM tokens
+    and retries per model, and the slowest companies in each stage.
+    """
+    summary = await asyncio.to_thread(summarize_trace, trace_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return summary
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of request, agent, cache and queue metrics."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/download/{filename}")
 async def download_file(filename: str):
-    filepath = os.path.join(os.getcwd(), filename)
+    """Excel download of a run, rendered on demand (or a legacy file from the working directory)."""
+    df = await asyncio.to_thread(run_store.load, run_id_from_filename(filename))
+    if df is not None:
+        return await asyncio.to_thread(xlsx_response, df, filename)
+    filepath = os.path.join(os.getcwd(), os.path.basename(filename))
     if os.path.exists(filepath):
         return FileResponse(filepath, filename=filename)
     raise HTTPException(status_code=404, detail="File not found")
@@ -154,22 +524,19 @@ async def download_comprehensive(filename: str):
     Product Analysis, Email Draft
     """
     try:
-        filepath = os.path.join(os.getcwd(), filename)
-        if not os.path.exists(filepath):
+        # Load the enriched data
+        df = await asyncio.to_thread(load_run, filename)
+        if df is None:
             raise HTTPException(status_code=404, detail="File not found")
         
-        # Read the enriched data
-        df = pd.read_excel(filepath)
-        
         # Add Agent 3 data from cache
         comprehensive_data = []
         for _, row in df.iterrows():
-            company_name = row.get('Company')
             row_dict = row.to_dict()
             
             # Check if we have Agent 3 data for this company
-            if company_name in strategy_cache:
-                strategy = strategy_cache[company_name]
+            strategy = strategy_store.get(row_dict)
+            if strategy is not None:
                 
                 # Add contacts as comma-separated strings
                 if 'contacts' in strategy and strategy['contacts']:
@@ -223,12 +590,9 @@ async def download_comprehensive(filename: str):
         # Create comprehensive DataFrame
         comprehensive_df = pd.DataFrame(comprehensive_data)
         
-        # Save to a new file
+        # Render the download in memory
         comprehensive_filename = filename.replace('.xlsx', '_comprehensive.xlsx')
-        comprehensive_filepath = os.path.join(os.getcwd(), comprehensive_filename)
-        comprehensive_df.to_excel(comprehensive_filepath, index=False)
-        
-        return FileResponse(comprehensive_filepath, filename=comprehensive_filename)
+        return await asyncio.to_thread(xlsx_response, comprehensive_df, comprehensive_filename)
     
     except Exception as e:
         print(f"Error creating comprehensive download: {e}")
@@ -246,57 +610,66 @@ async def strategize_single_company(request: StrategyRequest):
         company_name = request.company_data.get('Company')
         
         # Check cache first
-        if company_name in strategy_cache:
+        cached_strategy = strategy_store.get(request.company_data)
+        if cached_strategy is not None:
             print(f"Returning cached strategy for {company_name}")
             return {
                 "message": "Agent 3 Strategy Retrieved (cached)",
-                "data": strategy_cache[company_name]
+                "data": cached_strategy
             }
         
         # If not cached, generate now
         print(f"Generating new strategy for {company_name}")
+        # Shares the work if background Agent 3 is generating the same strategy right now
         strategist = StrategyGenerator()
-        strategy_data = strategist.generate_single_strategy(request.company_data)
+        with start_trace("strategize_single", company=company_name) as trace:
+            strategy_data = await asyncio.to_thread(strategist.generate_single_strategy, request.company_data)
         
         if not strategy_data:
             raise HTTPException(status_code=500, detail="Failed to generate strategy")
         
         # Cache for future requests
-        strategy_cache[company_name] = strategy_data
+        strategy_store.put(request.company_data, strategy_data)
         
         return {
             "message": "Agent 3 Strategy Generated",
-            "data": strategy_data
+            "data": strategy_data,
+            "trace_id": trace.trace_id
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/strategize")
 async def strategize_leads(request: ValidateRequest):
+    if request.trace_id and not is_valid_trace_id(request.trace_id):
+        raise HTTPException(status_code=400, detail="Invalid trace_id")
     try:
-        enriched_filepath = os.path.join(os.getcwd(), request.filename)
+        enriched_df = await asyncio.to_thread(load_run, request.filename)
         
-        if not os.path.exists(enriched_filepath):
+        if enriched_df is None:
              raise HTTPException(status_code=404, detail="Enriched leads file not found for strategy")
 
         # Run Agent 3: Trigger Strategy
         strategist = StrategyGenerator()
-        plan_filename = f"battle_plan_{uuid.uuid4()}.xlsx"
-        plan_filepath = os.path.join(os.getcwd(), plan_filename)
-        
-        final_filepath = strategist.process_strategy(enriched_filepath, plan_filepath)
-        final_filename = os.path.basename(final_filepath)
+        with start_trace("strategize", request.trace_id, leads=len(enriched_df)) as trace, track_usage() as usage:
+            plan_df = await asyncio.to_thread(strategist.strategize_dataframe, enriched_df, store=strategy_store)
+        plan_id = await asyncio.to_thread(run_store.save, f"battle_plan_{uuid.uuid4()}", plan_df)
         
-        # Read back data
-        plan_df = pd.read_excel(final_filepath)
-        plan_data = plan_df.to_dict(orient='records')
+        plan_data = sanitize_data(plan_df.to_dict(orient='records'))
         
         return {
             "message": "Agent 3 Strategy Generated",
             "data": plan_data,
-            "download_url": f"/download/{final_filename}"
+            "run_id": plan_id,
+            "download_url": f"/download/{plan_id}.xlsx",
+            "token_usage": usage.snapshot(),
+            "trace_id": trace.trace_id
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,209 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Seconds; covers cache hits through multi-minute scrapes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        name + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label set."""
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, (), value) for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    """Value that goes up and down per label set."""
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = value
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, +Inf last, then sum
+                series = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self.lock:
+            snapshot = {key: list(series) for key, series in self.values.items()}
+        samples = []
+        for key, series in snapshot.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", key, (("le", _format_value(bound)),), cumulative))
+            samples.append((f"{self.name}_sum", key, (), series[-1]))
+            samples.append((f"{self.name}_count", key, (), cumulative))
+        return samples
+
+
+class CallbackMetric:
+    """
+    Counter or gauge read from existing state at scrape time, so hot paths pay
+    nothing. fn returns {label tuple: value} (or a single value without labels).
+    """
+    def __init__(self, name, kind, documentation, fn, labelnames=()):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception as e:
+            print(f"Metric {self.name} failed: {e}")
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [(self.name, tuple(str(v) for v in key), (), value) for key, value in values.items()]
+
+
+class Registry:
+    """Named metrics rendered in the Prometheus text exposition format."""
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, metric):
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, kind, documentation, fn, labelnames=()):
+        return self._register(CallbackMetric(name, kind, documentation, fn, labelnames))
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, key, extra, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(metric.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Shared by the agents; cache and queue metrics are read from their owners in main.py
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "API request latency by route (until response headers for streams).",
+    ("method", "route", "status"),
+)
+llm_requests = registry.counter(
+    "llm_requests_total", "LLM API calls by provider, agent and outcome (ok or error).",
+    ("provider", "agent", "outcome"),
+)
+llm_request_duration = registry.histogram(
+    "llm_request_duration_seconds", "LLM call latency including rate-limit waits and retries.",
+    ("provider", "agent"),
+)
+llm_in_flight = registry.gauge("llm_requests_in_flight", "LLM calls currently running.", ("provider",))
+llm_retries = registry.counter("llm_retries_total", "LLM calls retried after a 429.", ("provider",))
+llm_tokens = registry.counter(
+    "llm_tokens_total", "Tokens reported by LLM responses; type is prompt, cached or completion.",
+    ("provider", "agent", "type"),
+)
+vision_images = registry.counter("vision_images_total", "Logo images sent to the vision model.")
+search_requests = registry.counter(
+    "search_requests_total", "Web searches actually sent (cache misses) by agent and outcome.",
+    ("agent", "outcome"),
+)
+search_request_duration = registry.histogram("search_request_duration_seconds", "Web search latency.", ("agent",))
+lead_duration = registry.histogram(
+    "lead_duration_seconds", "Time per item in each agent: a logo in agent1, a lead in agent2 and agent3.",
+    ("agent",),
+)
@@ -0,0 +1,184 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from agent1 import run_scrape_stream
+from agent2 import ICPValidator, KeyPool, ScoringBatcher, openai_keys, MAX_IN_FLIGHT, SEARCH_CONCURRENCY, BATCH_SIZE, INCREMENTAL
+from agent3 import StrategyGenerator, fit_score_value, MIN_STRATEGY_FIT_SCORE, AGENT3_CONCURRENCY
+from strategy_store import strategy_store
+from token_usage import bind_usage
+from tracing import bind_trace
+
+load_dotenv()
+
+# Companies waiting between two stages, and events waiting for the client; a full
+# queue pauses the stage feeding it
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "32"))
+
+# Marks the end of the event stream
+_DONE = object()
+
+
+class LeadPipeline:
+    """
+    Agents 1 -> 2 -> 3 as overlapping stages joined by bounded queues. Each company
+    goes to Agent 2 as soon as Agent 1 identifies it, and each lead scoring at
+    least MIN_STRATEGY_FIT_SCORE goes to Agent 3 as soon as it is scored, so a
+    conference takes about as long as its slowest stage instead of the sum.
+    """
+    def __init__(self, queue_size=PIPELINE_QUEUE_SIZE, score_workers=MAX_IN_FLIGHT,
+                 strategy_workers=AGENT3_CONCURRENCY, batch_size=BATCH_SIZE, store=strategy_store,
+                 incremental=INCREMENTAL, owner=None):
+        self.validator = ICPValidator(incremental=incremental)
+        self.queue_size = queue_size
+        self.score_workers = score_workers
+        self.strategy_workers = strategy_workers
+        self.batch_size = batch_size
+        self.store = store
+        # Agent 1 browser pool owner (client address)
+        self.owner = owner
+        # Agent 1 records in page order; Agent 2 rows and Agent 3 strategies by lead index
+        self.leads = []
+        self.enriched = {}
+        self.strategies = {}
+        self.counts = {"companies": 0, "scored": 0, "eligible": 0, "generated": 0, "cached": 0, "failed": 0}
+        # Seconds from the start to the first and last item finished by each stage
+        self.timeline = {}
+        self.started = None
+
+    def enriched_rows(self):
+        """Agent 2 rows in Agent 1 order."""
+        return [self.enriched[index] for index in sorted(self.enriched)]
+
+    def _mark(self, stage):
+        elapsed = round(time.perf_counter() - self.started, 3)
+        first, _ = self.timeline.get(stage, (elapsed, elapsed))
+        self.timeline[stage] = (first, elapsed)
+
+    def _strategize_one(self, strategist, row):
+        """Runs on the Agent 3 pool: stored strategy if the inputs are unchanged, else a new one."""
+        strategy = self.store.get(row) if self.store else None
+        if strategy is not None:
+            return strategy, "cached"
+        strategy = strategist.generate_single_strategy(row)
+        if strategy and self.store:
+            self.store.put(row, strategy)
+        return strategy, "generated" if strategy else "failed"
+
+    async def stream(self, url):
+        """
+        Yields (kind, data) events as each stage finishes a company: "company"
+        (Agent 1 record), "alias" (a later name variant, {"Company",
+        "Alternate_Names"}), "scored" (Agent 2 row) and "strategy"
+        ({"Company", "Fit_Score", "status", "strategy"}).
+        """
+        self.started = time.perf_counter()
+        # Bounded too, so a slow client holds the stages back instead of buffering every event
+        events = asyncio.Queue(self.queue_size)
+        to_score = asyncio.Queue(self.queue_size)
+        to_strategize = asyncio.Queue(self.queue_size)
+
+        validator = self.validator
+        strategist = StrategyGenerator()
+        key_pool = KeyPool(openai_keys)
+        in_flight = asyncio.Semaphore(self.score_workers)
+        search_limit = asyncio.Semaphore(SEARCH_CONCURRENCY)
+        batcher = ScoringBatcher(validator, key_pool, self.batch_size) if self.batch_size > 1 else None
+        # Agent 3 is synchronous (Gemini SDK); its own pool keeps it off the default executor
+        executor = ThreadPoolExecutor(max_workers=self.strategy_workers, thread_name_prefix="pipeline-agent3")
+        loop = asyncio.get_running_loop()
+
+        async def scrape():
+            lead_index = {}
+            async for kind, record in run_scrape_stream(url, self.owner):
+                if kind == "alias":
+                    # The Agent 1 record is updated in place; a row already scored is a copy
+                    row = self.enriched.get(lead_index.get(record["Company"]))
+                    if row is not None:
+                        row["Alternate_Names"] = record["Alternate_Names"]
+                    await events.put(("alias", record))
+                    continue
+                index = len(self.leads)
+                lead_index[record["Company"]] = index
+                self.leads.append(record)
+                self.counts["companies"] += 1
+                self._mark("scrape")
+                await events.put(("company", record))
+                # Blocks while Agent 2 is queue_size companies behind
+                await to_score.put((index, record))
+
+        async def score():
+            while True:
+                index, record = await to_score.get()
+                try:
+                    row = await validator.process_single_lead_async(record, key_pool, in_flight, search_limit, batcher)
+                    self.enriched[index] = row
+                    self.counts["scored"] += 1
+                    self._mark("validate")
+                    await events.put(("scored", row))
+                    if fit_score_value(row) >= MIN_STRATEGY_FIT_SCORE:
+                        self.counts["eligible"] += 1
+                        await to_strategize.put((index, row))
+                except Exception as e:
+                    print(f"Pipeline scoring failed for {record.get('Company')}: {e}")
+                finally:
+                    to_score.task_done()
+
+        async def strategize():
+            while True:
+                index, row = await to_strategize.get()
+                try:
+                    run_one = bind_trace(bind_usage(self._strategize_one))
+                    strategy, status = await loop.run_in_executor(executor, run_one, strategist, row)
+                    self.counts[status] += 1
+                    if strategy:
+                        self.strategies[index] = strategy
+                    self._mark("strategize")
+                    await events.put(("strategy", {
+                        "Company": row.get('Company'),
+                        "Fit_Score": row.get('Fit_Score'),
+                        "status": status,
+                        "strategy": strategy,
+                    }))
+                except Exception as e:
+                    print(f"Pipeline strategy failed for {row.get('Company')}: {e}")
+                finally:
+                    to_strategize.task_done()
+
+        async def run():
+            workers = [asyncio.create_task(score()) for _ in range(self.score_workers)]
+            workers += [asyncio.create_task(strategize()) for _ in range(self.strategy_workers)]
+            cancelled = False
+            try:
+                await scrape()
+                # Scoring finishes before the last strategies can be queued
+                await to_score.join()
+                await to_strategize.join()
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                await key_pool.close()
+                executor.shutdown(wait=False)
+                # Cancelled only once the reader has gone, so nobody would take the marker
+                if not cancelled:
+                    await events.put(_DONE)
+
+        runner = asyncio.create_task(run())
+        try:
+            while True:
+                event = await events.get()
+                if event is _DONE:
+                    break
+                yield event
+            # Raises whatever stopped the pipeline early
+            await runner
+        finally:
+            if not runner.done():
+                runner.cancel()
+                await asyncio.gather(runner, return_exceptions=True)
+        print(f"Pipeline for {url} finished: {self.counts}, timeline {self.timeline}")
@@ -0,0 +1,75 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "live" talks to OpenAI, Gemini and DuckDuckGo; "local" uses the offline
+# stand-ins in local_provider (no keys or network needed)
+PROVIDER_MODE = os.getenv("PROVIDER_MODE", "live").strip().lower()
+
+
+def is_local():
+    return PROVIDER_MODE == "local"
+
+
+def api_keys(*env_names):
+    """
+    Keys set in env_names, in order. The local provider needs none, so it gets
+    one placeholder key when nothing is configured.
+    """
+    keys = [os.getenv(name) for name in env_names]
+    keys = [key for key in keys if key]
+    if not keys and is_local():
+        keys = ["local"]
+    return keys
+
+
+def chat_client(api_key):
+    """Sync OpenAI-compatible client for chat, JSON and vision completions."""
+    if is_local():
+        from local_provider import LocalOpenAI
+        return LocalOpenAI(api_key=api_key)
+    from openai import OpenAI
+    # 429 retries are handled by rate_limiter
+    return OpenAI(api_key=api_key, max_retries=0)
+
+
+def async_chat_client(api_key):
+    """Async counterpart of chat_client. Must be created inside the event loop that uses it."""
+    if is_local():
+        from local_provider import AsyncLocalOpenAI
+        return AsyncLocalOpenAI(api_key=api_key)
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=api_key, max_retries=0)
+
+
+def gemini_model(api_key, model_name):
+    """
+    Gemini GenerativeModel bound to its own API key. genai.configure is
+    process-wide, so each model gets a dedicated service client instead.
+    This sets GenerativeModel._client, which is private; requirements.txt pins
+    google-generativeai to the 0.8 series where it exists.
+    """
+    if is_local():
+        from local_provider import LocalGeminiModel
+        return LocalGeminiModel(api_key=api_key, model_name=model_name)
+    import google.generativeai as genai
+    import google.ai.generativelanguage as glm
+    keyed_model = genai.GenerativeModel(model_name)
+    # Fail at startup rather than silently sending every call through the global key
+    if "_client" not in vars(keyed_model):
+        raise RuntimeError(
+            f"google-generativeai {getattr(genai, '__version__', '?')} has no GenerativeModel._client; "
+            "per-key Gemini routing needs the 0.8 series"
+        )
+    keyed_model._client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+    return keyed_model
+
+
+def search_client():
+    """Web search session with a DDGS-style text(query, max_results) method."""
+    if is_local():
+        from local_provider import LocalSearch
+        return LocalSearch()
+    from duckduckgo_search import DDGS
+    return DDGS()
@@ -0,0 +1,399 @@
+import os
+import re
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from token_usage import record_usage as record_token_usage
+from metrics import llm_requests, llm_request_duration, llm_in_flight, llm_retries, llm_tokens
+from tracing import span, current_span
+
+load_dotenv()
+
+# Starting limits per provider (requests per minute, tokens per minute).
+# OpenAI limits are corrected from response headers after the first call.
+DEFAULT_LIMITS = {
+    "openai": (int(os.getenv("OPENAI_RPM", "500")), int(os.getenv("OPENAI_TPM", "30000"))),
+    "gemini": (int(os.getenv("GEMINI_RPM", "15")), int(os.getenv("GEMINI_TPM", "1000000"))),
+}
+
+MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "5"))
+BASE_BACKOFF = float(os.getenv("RATE_LIMIT_BASE_BACKOFF", "1.0"))
+MAX_BACKOFF = float(os.getenv("RATE_LIMIT_MAX_BACKOFF", "60.0"))
+
+# Rough prompt size used when the caller does not give an estimate
+DEFAULT_TOKEN_ESTIMATE = 1500
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_reset_duration(value):
+    """
+    Parses OpenAI reset durations such as '1s', '6m0s' or '20ms' into seconds.
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+def estimate_tokens(text, completion_tokens=500):
+    """Cheap token estimate (~4 characters per token) plus the expected completion."""
+    return len(text or "") // 4 + completion_tokens
+
+
+def estimate_message_tokens(messages, completion_tokens=500, image_tokens=800):
+    """Token estimate for a chat message list, counting each image part as image_tokens."""
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            total += len(content) // 4
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    total += len(part.get("text", "")) // 4
+                else:
+                    total += image_tokens
+    return total + completion_tokens
+
+
+class TokenBucket:
+    """
+    A per-minute bucket. Reservations may drive the level negative; the deficit
+    is how long the caller has to wait for the bucket to refill.
+    """
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        rate = self.capacity / 60.0
+        self.level = min(self.capacity, self.level + (now - self.updated) * rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        """Takes amount from the bucket and returns the seconds to wait before using it."""
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+        if self.level >= 0:
+            return 0.0
+        return -self.level / (self.capacity / 60.0)
+
+    def adjust(self, amount, now):
+        """Gives back (positive) or takes more (negative) after the real cost is known."""
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+    def sync(self, limit, remaining, now):
+        """Aligns the bucket with what the provider reports."""
+        self._refill(now)
+        if limit:
+            self.capacity = float(limit)
+        if remaining is not None:
+            self.level = min(self.level, float(remaining))
+
+
+class RateLimiter:
+    """
+    Request and token budgets for one API key of one provider. Shared by every
+    thread and event loop in the process.
+    """
+    def __init__(self, provider, rpm, tpm):
+        self.provider = provider
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "tokens": 0, "throttled": 0, "retries": 0, "wait_seconds": 0.0}
+
+    def reserve(self, estimated_tokens):
+        """Reserves one request and estimated_tokens; returns the seconds to wait."""
+        with self.lock:
+            now = time.monotonic()
+            wait = max(
+                self.requests.reserve(1, now),
+                self.tokens.reserve(estimated_tokens, now),
+                self.blocked_until - now,
+            )
+            self.stats["requests"] += 1
+            if wait > 0:
+                self.stats["throttled"] += 1
+                self.stats["wait_seconds"] += wait
+            return max(wait, 0.0)
+
+    def acquire(self, estimated_tokens=DEFAULT_TOKEN_ESTIMATE):
+        wait = self.reserve(estimated_tokens)
+        if wait > 0:
+            current_span().add(rate_limit_wait=round(wait, 3))
+            time.sleep(wait)
+
+    async def acquire_async(self, estimated_tokens=DEFAULT_TOKEN_ESTIMATE):
+        wait = self.reserve(estimated_tokens)
+        if wait > 0:
+            current_span().add(rate_limit_wait=round(wait, 3))
+            await asyncio.sleep(wait)
+
+    def record_usage(self, actual_tokens, estimated_tokens):
+        """Corrects the token bucket once the response reports real usage."""
+        if actual_tokens is None:
+            return
+        with self.lock:
+            self.tokens.adjust(estimated_tokens - actual_tokens, time.monotonic())
+            self.stats["tokens"] += actual_tokens
+
+    def update_from_headers(self, headers):
+        """Reads x-ratelimit-* headers so the buckets follow the provider's real ceiling."""
+        if not headers:
+            return
+
+        def header_int(name):
+            value = headers.get(name)
+            try:
+                return int(value) if value is not None else None
+            except ValueError:
+                return None
+
+        with self.lock:
+            now = time.monotonic()
+            self.requests.sync(
+                header_int("x-ratelimit-limit-requests"),
+                header_int("x-ratelimit-remaining-requests"),
+                now,
+            )
+            self.tokens.sync(
+                header_int("x-ratelimit-limit-tokens"),
+                header_int("x-ratelimit-remaining-tokens"),
+                now,
+            )
+            # Nothing left: hold new requests until the provider's reset time
+            if header_int("x-ratelimit-remaining-requests") == 0:
+                reset = parse_reset_duration(headers.get("x-ratelimit-reset-requests"))
+                if reset:
+                    self.blocked_until = max(self.blocked_until, now + reset)
+
+    def penalize(self, seconds):
+        """Blocks every caller on this key for seconds after a 429."""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.stats["retries"] += 1
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider, api_key):
+    """Returns the process-wide limiter for this provider and API key."""
+    # Keys are never stored, only a short digest of them
+    key_id = hashlib.sha256((api_key or "").encode()).hexdigest()[:12]
+    with _limiters_lock:
+        limiter = _limiters.get((provider, key_id))
+        if limiter is None:
+            rpm, tpm = DEFAULT_LIMITS.get(provider, (60, 100000))
+            limiter = RateLimiter(provider, rpm, tpm)
+            _limiters[(provider, key_id)] = limiter
+        return limiter
+
+
+def get_limiter_stats():
+    """Per provider/key counters for monitoring."""
+    with _limiters_lock:
+        return {
+            f"{provider}:{key_id}": dict(limiter.stats)
+            for (provider, key_id), limiter in _limiters.items()
+        }
+
+
+def is_rate_limit_error(exc):
+    """
+    True for 429 / quota errors from OpenAI or Gemini. Only the status code and
+    error type count; a "429" in the message may be a company name or a count.
+    """
+    if getattr(exc, "status_code", None) == 429 or getattr(exc, "code", None) == 429:
+        return True
+    return type(exc).__name__ in ("RateLimitError", "ResourceExhausted", "TooManyRequests")
+
+
+def retry_after_seconds(exc):
+    """Reads retry-after hints from the error response, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    if headers.get("retry-after"):
+        try:
+            return float(headers["retry-after"])
+        except ValueError:
+            pass
+    return parse_reset_duration(headers.get("x-ratelimit-reset-requests"))
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Exponential backoff with jitter, honouring the provider's retry-after hint."""
+    if retry_after:
+        return retry_after + random.uniform(0, BASE_BACKOFF)
+    ceiling = min(MAX_BACKOFF, BASE_BACKOFF * (2 ** attempt))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def call_with_retry(limiter, fn, estimated_tokens=DEFAULT_TOKEN_ESTIMATE, label=""):
+    """
+    Runs fn() under the limiter, retrying 429s with backoff. Other errors are raised.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire(estimated_tokens)
+        try:
+            return fn()
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt, retry_after_seconds(e))
+            # The next acquire waits out the penalty
+            limiter.penalize(delay)
+            llm_retries.inc(provider=limiter.provider)
+            current_span().add(retries=1)
+            print(f"Rate limited ({limiter.provider}) {label}, retrying in {delay:.1f}s")
+
+
+async def call_with_retry_async(limiter, fn, estimated_tokens=DEFAULT_TOKEN_ESTIMATE, label=""):
+    """
+    Async variant of call_with_retry; fn returns an awaitable.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        await limiter.acquire_async(estimated_tokens)
+        try:
+            return await fn()
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt, retry_after_seconds(e))
+            limiter.penalize(delay)
+            llm_retries.inc(provider=limiter.provider)
+            current_span().add(retries=1)
+            print(f"Rate limited ({limiter.provider}) {label}, retrying in {delay:.1f}s")
+
+
+@contextmanager
+def _instrumented(provider, agent, model=None, label=""):
+    """
+    Call count, outcome, latency and in-flight metrics around one LLM call,
+    plus an llm trace span that collects model, tokens, retries and waits.
+    """
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with llm_in_flight.track_inprogress(provider=provider):
+            with span("llm", provider=provider, agent=agent, model=model, label=label or None):
+                yield
+        outcome = "ok"
+    finally:
+        llm_requests.inc(provider=provider, agent=agent, outcome=outcome)
+        llm_request_duration.observe(time.perf_counter() - started, provider=provider, agent=agent)
+
+
+def _record_tokens(provider, agent, prompt_tokens, cached_tokens, total_tokens):
+    record_token_usage(provider, prompt_tokens, cached_tokens, total_tokens)
+    if prompt_tokens:
+        llm_tokens.inc(prompt_tokens, provider=provider, agent=agent, type="prompt")
+    if cached_tokens:
+        llm_tokens.inc(cached_tokens, provider=provider, agent=agent, type="cached")
+    if total_tokens and prompt_tokens is not None:
+        llm_tokens.inc(total_tokens - prompt_tokens, provider=provider, agent=agent, type="completion")
+    current_span().set(
+        prompt_tokens=prompt_tokens,
+        cached_tokens=cached_tokens or 0,
+        total_tokens=total_tokens,
+        prompt_cache_hit=bool(cached_tokens),
+    )
+
+
+def _record_openai_usage(limiter, response, estimated_tokens, agent):
+    usage = getattr(response, "usage", None)
+    details = getattr(usage, "prompt_tokens_details", None)
+    limiter.record_usage(getattr(usage, "total_tokens", None), estimated_tokens)
+    _record_tokens(
+        "openai",
+        agent,
+        getattr(usage, "prompt_tokens", None),
+        getattr(details, "cached_tokens", None),
+        getattr(usage, "total_tokens", None),
+    )
+
+
+def openai_chat_completion(client, estimated_tokens=None, label="", agent="", **kwargs):
+    """
+    chat.completions.create through the shared limiter for the client's key.
+    agent labels the call in metrics.
+    """
+    limiter = get_limiter("openai", client.api_key)
+    if estimated_tokens is None:
+        estimated_tokens = estimate_message_tokens(kwargs.get("messages", []), kwargs.get("max_tokens") or 500)
+
+    def call():
+        raw = client.chat.completions.with_raw_response.create(**kwargs)
+        limiter.update_from_headers(raw.headers)
+        return raw.parse()
+
+    with _instrumented("openai", agent, kwargs.get("model"), label):
+        response = call_with_retry(limiter, call, estimated_tokens, label)
+        _record_openai_usage(limiter, response, estimated_tokens, agent)
+    return response
+
+
+async def openai_chat_completion_async(client, estimated_tokens=None, label="", agent="", **kwargs):
+    """
+    Async variant of openai_chat_completion for AsyncOpenAI clients.
+    """
+    limiter = get_limiter("openai", client.api_key)
+    if estimated_tokens is None:
+        estimated_tokens = estimate_message_tokens(kwargs.get("messages", []), kwargs.get("max_tokens") or 500)
+
+    async def call():
+        raw = await client.chat.completions.with_raw_response.create(**kwargs)
+        limiter.update_from_headers(raw.headers)
+        return raw.parse()
+
+    with _instrumented("openai", agent, kwargs.get("model"), label):
+        response = await call_with_retry_async(limiter, call, estimated_tokens, label)
+        _record_openai_usage(limiter, response, estimated_tokens, agent)
+    return response
+
+
+def gemini_generate_content(model, api_key, prompt, estimated_tokens=None, label="", agent="", **kwargs):
+    """
+    model.generate_content through the shared limiter for api_key. Gemini sends
+    no rate-limit headers, so only 429 backoff and usage metadata are used.
+    """
+    limiter = get_limiter("gemini", api_key)
+    if estimated_tokens is None:
+        estimated_tokens = estimate_tokens(prompt, 2000)
+
+    with _instrumented("gemini", agent, getattr(model, "model_name", None), label):
+        response = call_with_retry(limiter, lambda: model.generate_content(prompt, **kwargs), estimated_tokens, label)
+        usage = getattr(response, "usage_metadata", None)
+        limiter.record_usage(getattr(usage, "total_token_count", None), estimated_tokens)
+        _record_tokens(
+            "gemini",
+            agent,
+            getattr(usage, "prompt_token_count", None),
+            getattr(usage, "cached_content_token_count", None),
+            getattr(usage, "total_token_count", None),
+        )
+    return response
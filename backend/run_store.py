@@ -0,0 +1,106 @@
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Parquet files for every run; the most recent runs are also kept in memory
+RUN_STORE_DIR = os.getenv("RUN_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "runs"))
+RUN_STORE_MEMORY_RUNS = int(os.getenv("RUN_STORE_MEMORY_RUNS", "32"))
+
+# Run IDs double as download names, so keep them filesystem-safe
+_RUN_ID = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+def run_id_from_filename(filename):
+    """'leads_raw_<uuid>.xlsx' -> 'leads_raw_<uuid>'; None if it is not a valid run ID."""
+    run_id = os.path.splitext(os.path.basename(filename or ""))[0]
+    return run_id if _RUN_ID.match(run_id) else None
+
+
+def _parquet_safe(df):
+    """
+    Object columns holding mixed types (e.g. an LLM fit score that is sometimes
+    '7' and sometimes 7) cannot be written to Parquet; store those as strings.
+    """
+    df = df.copy()
+    for column in df.columns:
+        if df[column].dtype == object:
+            kinds = {type(value) for value in df[column] if value is not None and value == value}
+            if len(kinds) > 1:
+                df[column] = df[column].map(lambda v: v if v is None or v != v else str(v))
+    return df
+
+
+class RunStore:
+    """
+    Records of each pipeline stage, addressed by run ID. Stages hand DataFrames
+    to each other through here; Excel is only produced for downloads.
+    """
+    def __init__(self, directory=RUN_STORE_DIR, memory_runs=RUN_STORE_MEMORY_RUNS):
+        self.directory = directory
+        self.memory_runs = memory_runs
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, run_id):
+        return os.path.join(self.directory, f"{run_id}.parquet")
+
+    def save(self, run_id, data):
+        """Stores a DataFrame or list of records under run_id."""
+        df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+        try:
+            df.to_parquet(self._path(run_id), index=False)
+        except Exception:
+            _parquet_safe(df).to_parquet(self._path(run_id), index=False)
+        with self.lock:
+            self.memory[run_id] = df
+            self.memory.move_to_end(run_id)
+            while len(self.memory) > self.memory_runs:
+                self.memory.popitem(last=False)
+        return run_id
+
+    def exists(self, run_id):
+        if not run_id:
+            return False
+        with self.lock:
+            if run_id in self.memory:
+                return True
+        return os.path.exists(self._path(run_id))
+
+    def load(self, run_id):
+        """The run's DataFrame (a copy), or None if unknown."""
+        if not run_id:
+            return None
+        with self.lock:
+            if run_id in self.memory:
+                self.memory.move_to_end(run_id)
+                return self.memory[run_id].copy()
+        path = self._path(run_id)
+        if not os.path.exists(path):
+            return None
+        df = pd.read_parquet(path)
+        with self.lock:
+            self.memory[run_id] = df
+            while len(self.memory) > self.memory_runs:
+                self.memory.popitem(last=False)
+        return df.copy()
+
+    def records(self, run_id):
+        df = self.load(run_id)
+        return None if df is None else df.to_dict(orient='records')
+
+
+def to_excel_bytes(df):
+    """Renders a DataFrame as an in-memory .xlsx file for download."""
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+run_store = RunStore()
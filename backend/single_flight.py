@@ -0,0 +1,90 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from tracing import annotate
+
+# Every SingleFlight created, for stats
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution: the first
+    caller runs the work, callers arriving while it runs wait for its result.
+    Nothing is kept once the call finishes; caching is up to the work itself.
+    Sync and async callers share flights, but sync callers must not run on an
+    event loop thread (they block on the result).
+    """
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.executed = 0
+        self.shared = 0
+        with _flights_lock:
+            _flights[name] = self
+
+    def claim(self, key):
+        """
+        Returns (future, leader). The leader must call resolve() once done;
+        everyone else waits on the future.
+        """
+        with self.lock:
+            future = self.calls.get(key)
+            if future is not None:
+                self.shared += 1
+                return future, False
+            future = Future()
+            self.calls[key] = future
+            self.executed += 1
+            return future, True
+
+    def resolve(self, key, future, result=None, error=None):
+        with self.lock:
+            if self.calls.get(key) is future:
+                del self.calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn, *args, **kwargs):
+        """fn(*args, **kwargs), shared with concurrent callers using the same key."""
+        future, leader = self.claim(key)
+        if not leader:
+            annotate(shared=True)
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.resolve(key, future, error=e)
+            raise
+        self.resolve(key, future, result)
+        return result
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        """Async variant of do; fn returns an awaitable."""
+        future, leader = self.claim(key)
+        if not leader:
+            annotate(shared=True)
+            return await asyncio.wrap_future(future)
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            # Cancellation included, so waiters are never left hanging
+            self.resolve(key, future, error=e if isinstance(e, Exception) else RuntimeError(f"{self.name} call cancelled"))
+            raise
+        self.resolve(key, future, result)
+        return result
+
+    def stats(self):
+        with self.lock:
+            return {"executed": self.executed, "shared": self.shared, "in_flight": len(self.calls)}
+
+
+def single_flight_stats():
+    """Executed vs shared calls for every SingleFlight, by name."""
+    with _flights_lock:
+        flights = list(_flights.values())
+    return {flight.name: flight.stats() for flight in flights}
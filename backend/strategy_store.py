@@ -0,0 +1,103 @@
+import os
+import json
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from disk_cache import DiskCache, cache_path
+
+load_dotenv()
+
+# Agent 2 fields that feed StrategyGenerator.generate_strategy
+STRATEGY_INPUT_FIELDS = ["Company", "Fit_Score", "Category", "Recommended_Product", "Reasoning", "Hook"]
+
+
+def _normalize_value(value):
+    """
+    Makes values read back from Excel/JSON hash the same (9 == 9.0). Missing
+    values hash alike whichever way they arrive: None, NaN, '' or the 0 that
+    main.sanitize_data puts in place of NaN.
+    """
+    if value is None or (isinstance(value, (int, float)) and not isinstance(value, bool) and value == 0):
+        return ""
+    if isinstance(value, float):
+        if math.isnan(value) or math.isinf(value):
+            return ""
+        if value.is_integer():
+            return str(int(value))
+    return str(value).strip()
+
+
+def strategy_key(company_data):
+    """Hash of the Agent 2 inputs for one company."""
+    payload = [_normalize_value(company_data.get(field)) for field in STRATEGY_INPUT_FIELDS]
+    return hashlib.sha256(json.dumps(payload).encode()).hexdigest()
+
+
+class StrategyStore:
+    """
+    Agent 3 strategies keyed by a hash of their inputs: a small in-memory LRU
+    in front of a DiskCache, so results survive restarts and are shared by
+    every process using the same cache directory. refs maps each company to
+    its current strategy key; it is never evicted, so a strategy still cached
+    is always replaced when the company's inputs change.
+    """
+    def __init__(self, disk_cache, refs, memory_entries=256):
+        self.disk = disk_cache
+        self.refs = refs
+        self.memory_entries = memory_entries
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+
+    def _remember(self, key, strategy):
+        with self.lock:
+            self.memory[key] = strategy
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def get(self, company_data):
+        """Cached strategy for these exact inputs, or None."""
+        key = strategy_key(company_data)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return self.memory[key]
+        strategy = self.disk.get(f"strategy:{key}")
+        if strategy is not None:
+            self._remember(key, strategy)
+        return strategy
+
+    def put(self, company_data, strategy):
+        """Stores a strategy and invalidates the company's entry for older inputs."""
+        key = strategy_key(company_data)
+        company_ref = _normalize_value(company_data.get('Company')).lower()
+
+        previous_key = self.refs.get(company_ref)
+        if previous_key and previous_key != key:
+            self.disk.delete(f"strategy:{previous_key}")
+            with self.lock:
+                self.memory.pop(previous_key, None)
+
+        self.disk.set(f"strategy:{key}", strategy)
+        self.refs.set(company_ref, key)
+        self._remember(key, strategy)
+
+    def stats(self):
+        with self.lock:
+            memory = {"memory_entries": len(self.memory), "memory_hits": self.memory_hits}
+        return {**memory, "companies": len(self.refs), "disk": self.disk.stats()}
+
+
+strategy_store = StrategyStore(
+    DiskCache(
+        os.getenv("STRATEGY_STORE_PATH", cache_path("strategy_store.sqlite3")),
+        max_entries=int(os.getenv("STRATEGY_STORE_MAX_ENTRIES", "20000")),
+    ),
+    # One small row per company
+    DiskCache(os.getenv("STRATEGY_REFS_PATH", cache_path("strategy_refs.sqlite3")), max_entries=None),
+    memory_entries=int(os.getenv("STRATEGY_STORE_MEMORY_ENTRIES", "256")),
+)
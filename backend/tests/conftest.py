@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# Offline providers and throwaway stores, set before any backend module reads them
+_scratch = tempfile.mkdtemp(prefix="lead-gen-tests-")
+os.environ["PROVIDER_MODE"] = "local"
+os.environ["LOCAL_LATENCY_SCALE"] = "0"
+os.environ["CACHE_DIR"] = os.path.join(_scratch, "cache")
+os.environ["RUN_STORE_DIR"] = os.path.join(_scratch, "runs")
+os.environ["TRACE_DIR"] = os.path.join(_scratch, "traces")
+os.environ["COMPANY_ALIAS_LEARNING"] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
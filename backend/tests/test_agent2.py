@@ -0,0 +1,113 @@
+import json
+import asyncio
+import pandas as pd
+import local_provider
+from agent2 import ICPValidator, KeyPool
+from local_provider import icp_analysis
+
+
+def test_key_pool_caps_requests_per_key():
+    async def main():
+        pool = KeyPool(["key-a", "key-b"], per_key_limit=2)
+        running, peak = {}, {}
+
+        async def call():
+            async with pool.acquire() as client:
+                running[client.api_key] = running.get(client.api_key, 0) + 1
+                peak[client.api_key] = max(peak.get(client.api_key, 0), running[client.api_key])
+                await asyncio.sleep(0.01)
+                running[client.api_key] -= 1
+
+        await asyncio.gather(*(call() for _ in range(10)))
+        await pool.close()
+        return peak
+
+    assert asyncio.run(main()) == {"key-a": 2, "key-b": 2}
+
+
+def test_validate_dataframe_keeps_input_order():
+    companies = ["Siemens Healthineers", "Caterpillar", "Zebra Technologies", "ServiceNow"]
+    df = pd.DataFrame({"Company": companies, "Source": "Sponsor Page"})
+    validator = ICPValidator(incremental=False)
+    result = asyncio.run(validator.validate_dataframe_async(df, max_in_flight=2, batch_size=1))
+    assert list(result["Company"]) == companies
+    assert list(result["Fit_Score"]) == [icp_analysis(company)["fit_score"] for company in companies]
+    assert validator.revalidation == {"reused": 0, "recomputed": 4}
+
+
+def test_progress_reports_every_lead():
+    class Progress:
+        def __init__(self):
+            self.total, self.rows = None, []
+
+        def start(self, total):
+            self.total = total
+
+        def add_result(self, row):
+            self.rows.append(row["Company"])
+
+    progress = Progress()
+    df = pd.DataFrame({"Company": ["Caterpillar", "Zebra Technologies"], "Source": "Sponsor Page"})
+    asyncio.run(ICPValidator(incremental=False).validate_dataframe_async(df, progress=progress, batch_size=1))
+    assert progress.total == 2
+    assert sorted(progress.rows) == ["Caterpillar", "Zebra Technologies"]
+
+
+def test_leads_missing_from_a_batch_are_scored_alone(monkeypatch):
+    validator = ICPValidator(incremental=False)
+    original = validator.analyze_companies_batch_async
+
+    async def drop_second(client, leads):
+        analyses = await original(client, leads)
+        analyses.pop("2")
+        return analyses
+
+    monkeypatch.setattr(validator, "analyze_companies_batch_async", drop_second)
+    leads = [("Caterpillar", "c1"), ("Zebra Technologies", "c2"), ("ServiceNow", "c3")]
+
+    async def main():
+        pool = KeyPool(["key"])
+        try:
+            return await validator.score_leads_async(pool, leads)
+        finally:
+            await pool.close()
+
+    scores = [json.loads(analysis)["fit_score"] for analysis in asyncio.run(main())]
+    assert scores == [icp_analysis(company)["fit_score"] for company, _ in leads]
+
+
+def test_unchanged_leads_reuse_stored_analyses():
+    companies = ["Revalidation Alpha Systems", "Revalidation Beta Dynamics"]
+    df = pd.DataFrame({"Company": companies, "Source": "Sponsor Page"})
+    first = ICPValidator(incremental=True)
+    first_result = asyncio.run(first.validate_dataframe_async(df, batch_size=1))
+    assert first.revalidation == {"reused": 0, "recomputed": 2}
+
+    local_provider.reset_stats()
+    second = ICPValidator(incremental=True)
+    second_result = asyncio.run(second.validate_dataframe_async(df, batch_size=1))
+    assert second.revalidation == {"reused": 2, "recomputed": 0}
+    assert "chat" not in local_provider.stats()["calls"]
+    assert list(second_result["Fit_Score"]) == list(first_result["Fit_Score"])
+
+    full = ICPValidator(incremental=False)
+    asyncio.run(full.validate_dataframe_async(df, batch_size=1))
+    assert full.revalidation == {"reused": 0, "recomputed": 2}
+    assert local_provider.stats()["calls"]["chat"] == 2
+
+
+def test_changed_context_is_recomputed():
+    validator = ICPValidator(incremental=True)
+    analysis_json = json.dumps(icp_analysis("Revalidation Gamma Labs"))
+    validator.store_analysis("Revalidation Gamma Labs", "old context", analysis_json)
+    assert validator.stored_analysis("Revalidation Gamma Labs", "old context") == analysis_json
+    assert validator.stored_analysis("revalidation gamma labs", "old context") == analysis_json
+    assert validator.stored_analysis("Revalidation Gamma Labs", "new context") is None
+    assert validator.revalidation == {"reused": 2, "recomputed": 1}
+
+
+def test_incomplete_analyses_are_not_stored():
+    validator = ICPValidator(incremental=True)
+    validator.store_analysis("Revalidation Delta Corp", "context", json.dumps({"fit_score": 7}))
+    validator.store_analysis("Revalidation Delta Corp", "context", "not json")
+    assert validator.stored_analysis("Revalidation Delta Corp", "context") is None
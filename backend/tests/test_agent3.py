@@ -0,0 +1,76 @@
+import json
+import time
+import threading
+import pandas as pd
+from agent3 import StrategyGenerator, MIN_STRATEGY_FIT_SCORE
+from disk_cache import DiskCache
+from strategy_store import StrategyStore
+
+
+def leads():
+    return pd.DataFrame([
+        {"Company": "Acme", "Fit_Score": 6, "Category": "Moderate Fit"},
+        {"Company": "Globex", "Fit_Score": MIN_STRATEGY_FIT_SCORE - 1, "Category": "Out of Profile"},
+        {"Company": "Initech", "Fit_Score": "9", "Category": "High Fit"},
+        {"Company": "Hooli", "Fit_Score": None, "Category": "N/A"},
+    ])
+
+
+def fake_strategy(company):
+    return {"contacts": [], "product_analysis": {"product": "ResolveGPT"},
+            "email_draft": {"subject": f"Hi {company}", "body": "b", "to_email": f"ceo@{company.lower()}.com"}}
+
+
+def stub_generator(calls, delay=0.0):
+    strategist = StrategyGenerator()
+    running = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def generate(row):
+        with lock:
+            calls.append(row["Company"])
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        time.sleep(delay)
+        with lock:
+            running["now"] -= 1
+        return fake_strategy(row["Company"])
+
+    strategist.generate_single_strategy = generate
+    return strategist, running
+
+
+def test_only_eligible_rows_are_strategized_best_first():
+    calls = []
+    strategist, _ = stub_generator(calls)
+    plan = strategist.strategize_dataframe(leads(), concurrency=1)
+    assert calls == ["Initech", "Acme"]
+    assert list(plan["Company"]) == ["Acme", "Globex", "Initech", "Hooli"]
+    assert plan.loc[2, "Email_To"] == "ceo@initech.com"
+    assert json.loads(plan.loc[0, "Product_Analysis"]) == {"product": "ResolveGPT"}
+    assert plan["Email_Subject"].isna().tolist() == [False, True, False, True]
+
+
+def test_strategies_run_concurrently():
+    rows = pd.DataFrame([{"Company": f"Company {i}", "Fit_Score": 8} for i in range(6)])
+    strategist, running = stub_generator([], delay=0.05)
+    strategist.strategize_dataframe(rows, concurrency=3)
+    assert running["max"] == 3
+
+
+def test_stored_strategies_are_reused(tmp_path):
+    store = StrategyStore(DiskCache(str(tmp_path / "s.sqlite3")), DiskCache(str(tmp_path / "r.sqlite3"), max_entries=None))
+    first_calls, second_calls = [], []
+    stub_generator(first_calls)[0].strategize_dataframe(leads(), store=store)
+    plan = stub_generator(second_calls)[0].strategize_dataframe(leads(), store=store)
+    assert sorted(first_calls) == ["Acme", "Initech"]
+    assert second_calls == []
+    assert plan.loc[0, "Email_To"] == "ceo@acme.com"
+
+
+def test_local_provider_strategy():
+    row = {"Company": "Zebra Technologies", "Fit_Score": 8, "Category": "High Fit",
+           "Recommended_Product": "Predictive Spare Parts", "Reasoning": "r", "Hook": "h"}
+    strategy = StrategyGenerator().generate_single_strategy(row)
+    assert strategy["product_analysis"]["product"] == "Predictive Spare Parts"
+    assert strategy["email_draft"]["to_email"].endswith("@zebratechnologies.com")
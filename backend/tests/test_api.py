@@ -0,0 +1,73 @@
+import io
+import json
+import pytest
+import pandas as pd
+from fastapi.testclient import TestClient
+from jobs import Job
+from main import app, job_manager
+from run_store import run_store
+
+# Without the context manager the lifespan (browser pool) is not started
+client = TestClient(app)
+
+
+def test_strategize_rejects_invalid_trace_id():
+    response = client.post("/strategize", json={"filename": "leads_enriched_x.xlsx", "trace_id": "../etc"})
+    assert response.status_code == 400
+
+
+def test_strategize_reports_missing_run():
+    response = client.post("/strategize", json={"filename": "leads_enriched_missing.xlsx"})
+    assert response.status_code == 404
+
+
+def test_unknown_trace_is_404():
+    assert client.get("/traces/0123456789abcdef").status_code == 404
+
+
+def sse_events(body):
+    """(event, data) pairs of a Server-Sent Events body."""
+    events = []
+    for message in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_validation_events_deliver_rows_finished_with_the_job():
+    job = Job("validate")
+    job.start(2)
+    job.add_result({"Company": "Acme", "Fit_Score": float("nan")})
+    job.add_result({"Company": "Globex", "Fit_Score": 7})
+    job.finish({"rows": 2})
+    job_manager.jobs[job.id] = job
+
+    events = sse_events(client.get(f"/validate/{job.id}/events").text)
+    assert [event for event, _ in events] == ["progress", "completed"]
+    assert [row["Company"] for row in events[0][1]["new_results"]] == ["Acme", "Globex"]
+    assert events[0][1]["new_results"][0]["Fit_Score"] == 0
+    assert events[1][1]["result"] == {"rows": 2}
+
+
+def test_unknown_job_events_are_404():
+    assert client.get("/validate/missing/events").status_code == 404
+
+
+def test_download_renders_a_stored_run_as_excel():
+    run_store.save("leads_raw_download-test", [{"Company": "Acme", "Source": "Sponsor Page"}])
+    response = client.get("/download/leads_raw_download-test.xlsx")
+    assert response.status_code == 200
+    assert pd.read_excel(io.BytesIO(response.content))["Company"].tolist() == ["Acme"]
+    assert client.get("/download/leads_raw_missing.xlsx").status_code == 404
+
+
+def test_metrics_endpoint_exposes_request_and_queue_metrics():
+    client.get("/traces/0123456789abcdef")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/traces/{trace_id}",status="404"}' in text
+    assert 'background_queue_depth{queue="validate"}' in text
+    assert 'cache_hits_total{cache="search_cache"}' in text
+    assert "# TYPE llm_requests_total counter" in text
@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+import batch_scrape
+from batch_scrape import BatchScrape, page_domain
+
+# url -> company names found on it, or an exception / error message for a failed page
+PAGES = {
+    "https://www.expo-a.com/sponsors": ["Acme Robotics", "Globex"],
+    "https://expo-a.com/exhibitors": ["Acme Robotics Inc", "Initech"],
+    "https://expo-b.com/sponsors": ["globex", "Hooli"],
+    "https://expo-c.com/partners": "Crawl failed",
+    "https://expo-d.com/sponsors": RuntimeError("browser crashed"),
+}
+
+
+class FakeScraper:
+    """Stands in for ConferenceScraper; tracks pages in flight overall and per site."""
+    running = {}
+    peak = {}
+
+    def __init__(self, owner=None):
+        self.owner = owner
+        self.error = None
+
+    async def extract_sponsors(self, url):
+        domain = page_domain(url)
+        for key in ("all", domain):
+            self.running[key] = self.running.get(key, 0) + 1
+            self.peak[key] = max(self.peak.get(key, 0), self.running[key])
+        try:
+            await asyncio.sleep(0.01)
+            page = PAGES.get(url, [f"{domain} Sponsor"])
+            if isinstance(page, Exception):
+                raise page
+            if isinstance(page, str):
+                self.error = page
+                return []
+            return [{"Company": name, "Source": "Sponsor Page", "Logo_Url": None, "Alternate_Names": ""} for name in page]
+        finally:
+            for key in ("all", domain):
+                self.running[key] -= 1
+
+
+@pytest.fixture(autouse=True)
+def fake_scraper(monkeypatch):
+    FakeScraper.running, FakeScraper.peak = {}, {}
+    monkeypatch.setattr(batch_scrape, "ConferenceScraper", FakeScraper)
+
+
+def run_batch(batch):
+    async def main():
+        return [page async for page in batch.stream()]
+    return asyncio.run(main())
+
+
+def test_companies_are_merged_across_pages():
+    urls = list(PAGES)[:3]
+    batch = BatchScrape(urls, conferences={"https://expo-b.com/sponsors": "Expo B 2025"})
+    run_batch(batch)
+    records = {record["Company"]: record for record in batch.records()}
+    assert set(records) == {"Acme Robotics", "Globex", "Initech", "Hooli"}
+    assert records["Acme Robotics"]["Alternate_Names"] == "Acme Robotics Inc"
+    assert records["Acme Robotics"]["Conferences"] == "expo-a.com"
+    assert records["Acme Robotics"]["Source_Urls"] == "https://www.expo-a.com/sponsors; https://expo-a.com/exhibitors"
+    assert set(records["Globex"]["Conferences"].split("; ")) == {"expo-a.com", "Expo B 2025"}
+    assert batch.counts == {"pages": 3, "scraped": 3, "failed": 0, "found": 6, "companies": 4}
+
+
+def test_failed_pages_are_reported_without_stopping_the_batch():
+    urls = ["https://expo-b.com/sponsors", "https://expo-c.com/partners", "https://expo-d.com/sponsors"]
+    batch = BatchScrape(urls)
+    pages = {page["url"]: page for page in run_batch(batch)}
+    assert pages["https://expo-c.com/partners"]["status"] == "failed"
+    assert pages["https://expo-c.com/partners"]["error"] == "Crawl failed"
+    assert pages["https://expo-d.com/sponsors"]["error"] == "browser crashed"
+    assert pages["https://expo-b.com/sponsors"]["status"] == "ok"
+    assert [record["Company"] for record in pages["https://expo-b.com/sponsors"]["new"]] == ["globex", "Hooli"]
+    assert (batch.counts["scraped"], batch.counts["failed"]) == (1, 2)
+
+
+def test_repeated_urls_are_scraped_once():
+    batch = BatchScrape(["https://expo-b.com/sponsors", " https://expo-b.com/sponsors ", "", None])
+    assert batch.urls == ["https://expo-b.com/sponsors"]
+    assert len(run_batch(batch)) == 1
+
+
+def test_pages_in_flight_are_limited_overall_and_per_site():
+    urls = [f"https://site{i % 3}.com/page{i}" for i in range(12)] + [f"https://www.site0.com/extra{i}" for i in range(3)]
+    batch = BatchScrape(urls, concurrency=4, per_domain=2)
+    assert len(run_batch(batch)) == len(urls)
+    assert FakeScraper.peak["all"] == 4
+    assert max(FakeScraper.peak[f"site{i}.com"] for i in range(3)) == 2
@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from batching import MicroBatcher
+
+
+def run_batcher(items, batch_size, max_wait, handler=None, concurrency=2):
+    batches = []
+
+    async def default_handler(batch):
+        batches.append(list(batch))
+        return [item * 10 for item in batch]
+
+    async def main():
+        batcher = MicroBatcher(handler or default_handler, batch_size, max_wait, concurrency)
+        return await asyncio.gather(*(batcher.submit(item) for item in items), return_exceptions=True)
+
+    return asyncio.run(main()), batches
+
+
+def test_full_batches_are_sent_without_waiting():
+    results, batches = run_batcher(range(6), batch_size=3, max_wait=60)
+    assert results == [0, 10, 20, 30, 40, 50]
+    assert batches == [[0, 1, 2], [3, 4, 5]]
+
+
+def test_partial_batch_is_sent_after_max_wait():
+    results, batches = run_batcher(range(4), batch_size=3, max_wait=0.01)
+    assert results == [0, 10, 20, 30]
+    assert batches == [[0, 1, 2], [3]]
+
+
+def test_handler_error_fails_every_item_of_the_batch():
+    async def failing(batch):
+        raise ValueError("boom")
+
+    results, _ = run_batcher(range(3), batch_size=3, max_wait=0.01, handler=failing)
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_concurrency_bounds_batches_in_flight():
+    running = {"now": 0, "max": 0}
+
+    async def slow(batch):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        return batch
+
+    results, _ = run_batcher(range(8), batch_size=1, max_wait=0.01, handler=slow, concurrency=2)
+    assert results == list(range(8))
+    assert running["max"] == 2
+
+
+@pytest.mark.parametrize("returned", [[0], [0, 10, 20, 30]])
+def test_wrong_result_count_fails_every_item(returned):
+    async def misaligned(batch):
+        return returned
+
+    results, _ = run_batcher(range(3), batch_size=3, max_wait=0.01, handler=misaligned)
+    assert all(isinstance(result, ValueError) for result in results)
@@ -0,0 +1,142 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from browser_pool import BrowserPool
+
+
+class FakeCrawler:
+    """Stands in for AsyncWebCrawler: records start-up and shutdown."""
+    def __init__(self, number):
+        self.number = number
+        self.entered = False
+        self.closed = False
+
+    async def __aenter__(self):
+        self.entered = True
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.closed = True
+
+    async def arun(self, url, **kwargs):
+        return SimpleNamespace(success=True)
+
+
+def make_pool(size=1, **kwargs):
+    crawlers = []
+
+    def factory():
+        crawlers.append(FakeCrawler(len(crawlers) + 1))
+        return crawlers[-1]
+
+    kwargs.setdefault("max_rss_mb", 0)
+    pool = BrowserPool(size=size, health_interval=3600, factory=factory, **kwargs)
+    return pool, crawlers
+
+
+async def settle():
+    """Lets launches, replacements and hand-offs run."""
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+async def lease(pool, owner=None):
+    async with pool.crawler(owner) as crawler:
+        return crawler
+
+
+def test_browser_is_recycled_after_max_pages():
+    async def main():
+        pool, crawlers = make_pool(max_pages=2)
+        await pool.start()
+        used = []
+        for _ in range(3):
+            used.append(await lease(pool))
+            await settle()
+        await pool.stop()
+        return pool, crawlers, used
+
+    pool, crawlers, used = asyncio.run(main())
+    assert [crawler.number for crawler in used] == [1, 1, 2]
+    assert crawlers[0].closed
+    assert pool.recycles == {"pages": 1}
+
+
+def test_broken_browser_is_replaced():
+    async def main():
+        pool, crawlers = make_pool(max_pages=50)
+        await pool.start()
+        with pytest.raises(RuntimeError):
+            async with pool.crawler():
+                raise RuntimeError("page crashed")
+        await settle()
+        replacement = await lease(pool)
+        await pool.stop()
+        return pool, crawlers, replacement
+
+    pool, crawlers, replacement = asyncio.run(main())
+    assert crawlers[0].closed
+    assert replacement is crawlers[1]
+    assert pool.recycles == {"error": 1}
+
+
+def test_waiting_owners_are_served_round_robin():
+    async def main():
+        pool, _ = make_pool()
+        await pool.start()
+        await settle()
+        order = []
+        release = asyncio.Event()
+
+        async def hold():
+            async with pool.crawler("holder"):
+                await release.wait()
+
+        async def scrape(owner, name):
+            async with pool.crawler(owner):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        tasks = [asyncio.create_task(hold())]
+        await settle()
+        for owner, name in [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1"), ("b", "b2")]:
+            tasks.append(asyncio.create_task(scrape(owner, name)))
+            await settle()
+        assert pool.stats()["waiting_owners"] == 2
+        release.set()
+        await asyncio.gather(*tasks)
+        await pool.stop()
+        return order
+
+    assert asyncio.run(main()) == ["a1", "b1", "a2", "b2", "a3"]
+
+
+def test_acquire_times_out_and_leaves_no_waiter():
+    async def main():
+        pool, _ = make_pool(acquire_timeout=0.05)
+        await pool.start()
+        await settle()
+        async with pool.crawler("first"):
+            with pytest.raises(asyncio.TimeoutError):
+                await lease(pool, "second")
+            waiting = pool.stats()["waiting"]
+        # The browser is still handed out normally afterwards
+        crawler = await lease(pool, "second")
+        await pool.stop()
+        return waiting, crawler
+
+    waiting, crawler = asyncio.run(main())
+    assert waiting == 0
+    assert crawler.number == 1
+
+
+def test_unstarted_pool_starts_a_browser_per_block():
+    async def main():
+        pool, crawlers = make_pool()
+        async with pool.crawler() as crawler:
+            assert crawler.entered and not crawler.closed
+        return pool, crawlers
+
+    pool, crawlers = asyncio.run(main())
+    assert len(crawlers) == 1 and crawlers[0].closed
+    assert pool.stats()["leases"] == 0
@@ -0,0 +1,91 @@
+import pytest
+import company_names
+from company_names import CompanyIndex, normalize_name, name_similarity, is_prefix_match, collapse_records
+from disk_cache import DiskCache
+
+
+def entities(names, aliases=None):
+    index = CompanyIndex(aliases=aliases)
+    for name in names:
+        index.add(name)
+    return index, sorted(sorted(entity.variants) for entity in index.entities)
+
+
+def test_normalize_name_drops_noise_case_and_legal_forms():
+    assert normalize_name("The Salesforce, Inc. logo") == ("salesforce",)
+    assert normalize_name("Nestlé SA") == ("nestle",)
+    assert normalize_name("AT&T") == ("at", "and", "t")
+    assert normalize_name(float("nan")) == ()
+
+
+@pytest.mark.parametrize("names", [
+    ["Salesforce logo", "salesforce", "Salesforce.com", "Salesforce Field Service"],
+    ["ServiceMax", "Service Max", "Logo - ServiceMax"],
+    ["Acme", "Acme Solutions Group"],
+])
+def test_variants_of_one_company_merge(names):
+    _, groups = entities(names)
+    assert len(groups) == 1
+
+
+@pytest.mark.parametrize("names", [
+    ["Johnson Controls", "Johnson", "Johnson Matthey", "Johnson & Johnson"],
+    ["Blue Yonder", "Blue", "Blue Prism"],
+    ["General Electric", "General Motors"],
+    ["Synthetic Sponsor 3", "Synthetic Sponsor 30"],
+])
+def test_distinct_companies_sharing_a_prefix_stay_apart(names):
+    _, groups = entities(names)
+    assert len(groups) == len(names)
+
+
+def test_prefix_match_needs_a_generic_leftover():
+    assert is_prefix_match(("acme",), ("acme", "solutions"))
+    assert not is_prefix_match(("johnson",), ("johnson", "controls"))
+    assert not is_prefix_match(("johnson",), ("johnson", "and", "johnson"))
+    # A name made only of generic words identifies nothing
+    assert not is_prefix_match(("general",), ("general", "services"))
+
+
+def test_merges_do_not_chain_through_aliases():
+    # "Johnson" may join "Johnson Group", but that must not pull in "Johnson Matthey"
+    _, groups = entities(["Johnson Group", "Johnson", "Johnson Matthey"])
+    assert groups == [["Johnson", "Johnson Group"], ["Johnson Matthey"]]
+
+
+def test_name_similarity_rejects_different_numbers():
+    assert name_similarity(("sponsor", "3"), ("sponsor", "30")) == 0.0
+
+
+def test_collapse_records_keeps_every_distinct_lead():
+    rows = [{"Company": name, "Source": "Sponsor Page"} for name in
+            ["Johnson Controls", "Johnson", "Johnson Matthey", "Johnson & Johnson", "salesforce", "Salesforce logo"]]
+    collapsed = collapse_records(rows)
+    assert [row["Company"] for row in collapsed] == [
+        "Johnson Controls", "Johnson", "Johnson Matthey", "Johnson & Johnson", "salesforce",
+    ]
+    assert all(row["Alternate_Names"] == "" for row in collapsed)
+
+
+def test_collapse_records_lists_alternate_names():
+    rows = [{"Company": "Logo - ServiceMax"}, {"Company": "Service Max"}, {"Company": "Logo"}]
+    assert collapse_records(rows) == [{"Company": "ServiceMax", "Alternate_Names": "Service Max"}]
+
+
+def test_fuzzy_merges_are_learned_but_prefix_merges_are_not(tmp_path, monkeypatch):
+    monkeypatch.setattr(company_names, "ALIAS_LEARNING", True)
+    aliases = DiskCache(str(tmp_path / "aliases.sqlite3"))
+    index, _ = entities(["ServiceMax", "Service Max", "Acme", "Acme Solutions"], aliases)
+    index.learn()
+    assert dict(aliases.items()) == {"servicemax": "ServiceMax", "service max": "ServiceMax"}
+
+
+def test_stale_learned_aliases_are_ignored(tmp_path):
+    aliases = DiskCache(str(tmp_path / "aliases.sqlite3"))
+    # Written by an earlier version that merged on any prefix
+    aliases.set("johnson matthey", "Johnson")
+    aliases.set("service max", "ServiceMax")
+    _, groups = entities(["Johnson", "Johnson Matthey", "Service Max"], aliases)
+    assert groups == [["Johnson"], ["Johnson Matthey"], ["Service Max"]]
+    index, _ = entities(["Service Max"], aliases)
+    assert index.entities[0].name == "ServiceMax"
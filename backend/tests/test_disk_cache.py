@@ -0,0 +1,77 @@
+import pytest
+import disk_cache
+from disk_cache import DiskCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(disk_cache.time, "time", clock)
+    return clock
+
+
+def test_values_round_trip_as_json(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"))
+    cache.set("key", {"fit": 4, "tags": ["a"]})
+    assert cache.get("key") == {"fit": 4, "tags": ["a"]}
+    assert cache.get("missing", "default") == "default"
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+    cache.set("key", 1)
+    clock.now += 59
+    assert cache.get("key") == 1
+    clock.now += 2
+    assert cache.get("key") is None
+    assert cache.stats()["expired"] == 1
+    assert len(cache) == 0
+
+
+def test_expired_entries_are_hidden_from_items(tmp_path, clock):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+    cache.set("a:old", 1)
+    clock.now += 61
+    cache.set("a:new", 2)
+    cache.set("b:other", 3)
+    assert cache.items("a:") == [("a:new", 2)]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), max_entries=3)
+    for key in ("a", "b", "c"):
+        clock.now += 1
+        cache.set(key, key)
+    # Reading "a" makes "b" the least recently used
+    clock.now += 1
+    cache.get("a")
+    clock.now += 1
+    cache.set("d", "d")
+    assert len(cache) == 3
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in ("a", "c", "d")] == ["a", "c", "d"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_survives_reopening(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    DiskCache(path).set("key", "value")
+    assert DiskCache(path).get("key") == "value"
+
+
+
+def test_unbounded_cache_never_evicts(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), max_entries=None)
+    for i in range(300):
+        cache.set(f"k{i}", i)
+    assert len(cache) == 300
+    assert cache.stats()["evictions"] == 0
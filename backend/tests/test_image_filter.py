@@ -0,0 +1,96 @@
+import struct
+import pytest
+from image_filter import ImageFilter, image_dimensions
+
+
+def png_header(width, height):
+    return b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\rIHDR" + struct.pack(">II", width, height)
+
+
+@pytest.mark.parametrize("src", [
+    "https://cdn.example.com/sponsors/acme-analytics-logo.png",
+    "https://cdn.example.com/img/pixelworks_logo.png",
+    "https://cdn.example.com/img/beacon-technologies.png",
+    "https://cdn.example.com/img/Google_Analytics_logo.png",
+    "https://cdn.example.com/img/LinkedIn.png",
+    "https://cdn.example.com/img/tracking-systems-inc.png",
+    "https://cdn.example.com/img/spacer-industries.png",
+    "https://cdn.example.com/img/spheros.png",
+    "https://cdn.example.com/img/loudspeaker-co.svg",
+    "https://cdn.example.com/img/avatarsoft.png",
+    "https://cdn.example.com/img/backgroundcheck-inc.png",
+    "https://cdn.example.com/img/iconics.png",
+    "https://hero-motors.example.com/assets/acme.png",
+])
+def test_sponsor_logos_with_unlucky_names_pass(src):
+    assert ImageFilter().check_metadata({"src": src}) is None
+
+
+@pytest.mark.parametrize("src, rule", [
+    ("https://www.facebook.com/tr?id=123&ev=PageView", "url_tracking"),
+    ("https://ad.doubleclick.net/ddm/activity/src=1", "url_tracking"),
+    ("https://www.google-analytics.com/collect?v=1", "url_tracking"),
+    ("https://example.com/images/1x1.gif", "url_tracking"),
+    ("https://example.com/assets/spacer.gif", "url_tracking"),
+    ("https://example.com/pixel.png?uid=9", "url_tracking"),
+    ("https://example.com/favicon.ico", "url_icon"),
+    ("https://example.com/apple-touch-icon-180x180.png", "url_icon"),
+])
+def test_trackers_and_favicons_are_rejected(src, rule):
+    assert ImageFilter().check_metadata({"src": src}) == rule
+
+
+@pytest.mark.parametrize("src, rule", [
+    ("https://example.com/img/linkedin-icon.svg", "url_social"),
+    ("https://example.com/assets/social/twitter.png", "url_social"),
+    ("https://example.com/img/hero-banner.jpg", "url_banner"),
+    ("https://example.com/img/speaker-jane.jpg", "url_ui"),
+    ("https://example.com/speakers/jane-doe.jpg", "url_ui"),
+    ("https://example.com/img/avatar@2x.png", "url_ui"),
+    ("https://example.com/img/slider3.jpg", "url_banner"),
+    ("https://example.com/img/home_bg.jpg", "url_banner"),
+    ("https://example.com/img/header-image.jpg", "url_banner"),
+    ("https://example.com/icons/search.svg", "url_icon"),
+    ("https://example.com/img/menu-icon.png", "url_icon"),
+])
+def test_heuristic_rules_reject_outside_sponsor_context(src, rule):
+    assert ImageFilter().check_metadata({"src": src}) == rule
+
+
+def test_sponsor_container_overrides_heuristics():
+    src = "https://example.com/assets/social/linkedin-icon.png"
+    image_filter = ImageFilter({src: {"src": src, "width": 200, "height": 80, "sponsor": True}})
+    assert image_filter.check_metadata({"src": src}) is None
+
+
+def test_tracker_rules_apply_even_in_sponsor_context():
+    src = "https://www.facebook.com/tr?id=1"
+    image_filter = ImageFilter({src: {"src": src, "width": 200, "height": 80, "sponsor": True}})
+    assert image_filter.check_metadata({"src": src}) == "url_tracking"
+
+
+def test_geometry_rules():
+    image_filter = ImageFilter({
+        "tiny.png": {"width": 16, "height": 16},
+        "wide.png": {"width": 1920, "height": 600},
+        "logo.png": {"width": 200, "height": 80},
+    })
+    assert image_filter.check_metadata({"src": "tiny.png"}) == "dom_too_small"
+    assert image_filter.check_metadata({"src": "wide.png"}) == "dom_banner"
+    assert image_filter.check_metadata({"src": "logo.png"}) is None
+    assert image_filter.check_metadata({"src": "logo.png", "score": 0}) == "low_score"
+
+
+def test_content_rules():
+    image_filter = ImageFilter()
+    assert image_filter.check_content(100, png_header(200, 80)) == "too_few_bytes"
+    assert image_filter.check_content(5000, png_header(16, 8)) == "header_too_small"
+    assert image_filter.check_content(5000, png_header(2000, 100)) == "header_aspect_ratio"
+    assert image_filter.check_content(5000, png_header(200, 80)) is None
+    assert image_filter.summary()["passed"] == 1
+
+
+def test_image_dimensions_reads_png_and_gif_headers():
+    assert image_dimensions(png_header(320, 120)) == (320, 120)
+    assert image_dimensions(b"GIF89a" + struct.pack("<HH", 64, 32)) == (64, 32)
+    assert image_dimensions(b"not an image") is None
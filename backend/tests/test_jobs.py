@@ -0,0 +1,42 @@
+import time
+from jobs import Job, JobManager
+
+
+def wait(job):
+    while not job.done:
+        time.sleep(0.01)
+    return job
+
+
+def test_job_result_and_partial_rows():
+    manager = JobManager(workers=1)
+
+    def work(job, companies):
+        job.start(len(companies))
+        for company in companies:
+            job.add_result({"Company": company})
+        return {"rows": len(companies)}
+
+    job = wait(manager.submit("validate", work, ["Acme", "Globex"]))
+    snapshot = job.snapshot()
+    assert (snapshot["status"], snapshot["completed"], snapshot["total"]) == ("completed", 2, 2)
+    assert snapshot["result"] == {"rows": 2}
+    assert job.results_since(1) == [{"Company": "Globex"}]
+
+
+def test_failed_job_keeps_the_error():
+    def work(job):
+        raise ValueError("no rows")
+
+    job = wait(JobManager(workers=1).submit("validate", work))
+    assert (job.status, job.error) == ("failed", "no rows")
+
+
+def test_only_finished_jobs_are_pruned():
+    manager = JobManager(workers=1, max_jobs=2)
+    running = Job("validate")
+    running.start(1)
+    manager.jobs[running.id] = running
+    jobs = [wait(manager.submit("validate", lambda job: None)) for _ in range(3)]
+    assert manager.get(running.id) is running
+    assert manager.get(jobs[0].id) is None
@@ -0,0 +1,97 @@
+import json
+import base64
+import asyncio
+import pytest
+import providers
+import local_provider
+from rate_limiter import is_rate_limit_error, retry_after_seconds
+
+
+def chat(client, content, **kwargs):
+    return client.chat.completions.create(model="local", messages=[{"role": "user", "content": content}], **kwargs)
+
+
+def test_local_mode_needs_no_keys(monkeypatch):
+    monkeypatch.delenv("TEST_PROVIDER_KEY", raising=False)
+    assert providers.is_local()
+    assert providers.api_keys("TEST_PROVIDER_KEY") == ["local"]
+    monkeypatch.setenv("TEST_PROVIDER_KEY", "sk-real")
+    assert providers.api_keys("TEST_PROVIDER_KEY", "TEST_PROVIDER_KEY_MISSING") == ["sk-real"]
+
+
+def test_clients_are_local_stand_ins():
+    assert isinstance(providers.chat_client("local"), local_provider.LocalOpenAI)
+    assert isinstance(providers.async_chat_client("local"), local_provider.AsyncLocalOpenAI)
+    assert isinstance(providers.gemini_model("local", "gemini-2.5-flash"), local_provider.LocalGeminiModel)
+    assert isinstance(providers.search_client(), local_provider.LocalSearch)
+
+
+def test_lead_analysis_is_deterministic():
+    client = providers.chat_client("local")
+    response = chat(client, "**Lead Analysis:**\nCompany: Acme Robotics\nIndustry Context: none\n",
+                    response_format={"type": "json_object"})
+    analysis = json.loads(response.choices[0].message.content)
+    assert analysis == local_provider.icp_analysis("Acme Robotics")
+    assert analysis["fit_score"] == local_provider.icp_analysis(" acme robotics ")["fit_score"]
+    assert 1 <= analysis["fit_score"] <= 10
+    assert response.usage.total_tokens == response.usage.prompt_tokens + response.usage.completion_tokens
+
+
+def test_async_client_answers_batches_by_id():
+    async def run():
+        client = providers.async_chat_client("local")
+        content = "**Leads to Analyze:**\n[Lead 7]\nCompany: Globex\n\n[Lead 9]\nCompany: Initech\n"
+        return await chat(client, content, response_format={"type": "json_object"})
+
+    results = json.loads(asyncio.run(run()).choices[0].message.content)["results"]
+    assert [(r["id"], r["fit_score"]) for r in results] == [
+        ("7", local_provider.icp_analysis("Globex")["fit_score"]),
+        ("9", local_provider.icp_analysis("Initech")["fit_score"]),
+    ]
+
+
+def test_vision_reads_the_logo_marker():
+    image = b"\x89PNG fake company:Umbrella Corp\n"
+    content = [
+        {"type": "text", "text": "Which company is this?"},
+        {"type": "image_url", "image_url": {"url": "data:image/png;base64," + base64.b64encode(image).decode()}},
+    ]
+    response = chat(providers.chat_client("local"), content)
+    assert response.choices[0].message.content == "Umbrella Corp"
+    assert local_provider.logo_company(b"no marker").startswith("Sponsor ")
+
+
+def test_gemini_strategy_uses_company_and_product():
+    prompt = "Intro\nCompany: Hooli\nAgent 2 Recommendation: Field Service Copilot\nRest\n"
+    response = providers.gemini_model("local", "gemini").generate_content(prompt)
+    strategy = json.loads(response.text)
+    assert strategy["product_analysis"]["product"] == "Field Service Copilot"
+    assert strategy["email_draft"]["to_email"].endswith("@hooli.com")
+    assert strategy == local_provider.strategy_for("Hooli", "Field Service Copilot")
+
+
+def test_search_results_are_repeatable():
+    search = providers.search_client()
+    first = search.text("Stark Industries field service", max_results=3)
+    assert first == search.text("Stark Industries field service", max_results=3)
+    assert len(first) == 3
+    people = search.text("site:linkedin.com Stark Industries VP", max_results=2)
+    assert all(result["href"].startswith("https://linkedin.com/in/") for result in people)
+
+
+def test_simulated_429s_look_like_sdk_rate_limits(monkeypatch):
+    monkeypatch.setattr(local_provider, "RATE_LIMIT_RATE", 1.0)
+    local_provider.reset_stats()
+    with pytest.raises(local_provider.LocalProviderError) as excinfo:
+        providers.search_client().text("anything")
+    assert is_rate_limit_error(excinfo.value)
+    assert retry_after_seconds(excinfo.value) == 1
+    assert local_provider.stats()["errors"] == {"search_429": 1}
+
+
+def test_simulated_server_errors_are_not_rate_limits(monkeypatch):
+    monkeypatch.setattr(local_provider, "ERROR_RATE", 1.0)
+    with pytest.raises(local_provider.LocalProviderError) as excinfo:
+        chat(providers.chat_client("local"), "hello")
+    assert excinfo.value.status_code == 500
+    assert not is_rate_limit_error(excinfo.value)
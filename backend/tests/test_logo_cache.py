@@ -0,0 +1,71 @@
+import io
+import pytest
+from disk_cache import DiskCache
+from logo_cache import LogoCache, fingerprint
+
+Image = pytest.importorskip("PIL.Image")
+from PIL import ImageDraw, ImageFont
+
+WORDMARKS = ["ACME", "GLOBEX", "INITECH", "UMBRELLA", "HOOLI", "STARK", "WAYNE", "CYBERDYNE", "SOYLENT", "TYRELL"]
+
+
+def wordmark(text, scale=1.0):
+    """Black text on a mostly white 400x120 canvas, like a typical sponsor wordmark."""
+    img = Image.new("RGB", (400, 120), "white")
+    ImageDraw.Draw(img).text((20, 35), text, fill="black", font=ImageFont.load_default(size=40))
+    if scale != 1.0:
+        img = img.resize((int(400 * scale), int(120 * scale)), Image.LANCZOS)
+    buffer = io.BytesIO()
+    img.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LogoCache(DiskCache(str(tmp_path / "logos.sqlite3")))
+
+
+def remember(cache, image_bytes, company):
+    _, sha, image_fingerprint = cache.lookup(image_bytes)
+    cache.store(sha, image_fingerprint, company)
+
+
+def test_different_wordmarks_do_not_collide(cache):
+    for text in WORDMARKS:
+        company, sha, image_fingerprint = cache.lookup(wordmark(text))
+        assert company is None, f"{text} matched {company}"
+        cache.store(sha, image_fingerprint, text)
+    assert cache.stats()["perceptual_hits"] == 0
+
+
+def test_resized_copy_is_a_perceptual_hit(cache):
+    remember(cache, wordmark("GLOBEX"), "Globex")
+    remember(cache, wordmark("INITECH"), "Initech")
+    company, _, _ = cache.lookup(wordmark("GLOBEX", scale=2.0))
+    assert company == "Globex"
+    assert cache.stats()["perceptual_hits"] == 1
+    # The new bytes are remembered exactly
+    cache.lookup(wordmark("GLOBEX", scale=2.0))
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_aspect_ratio_must_match(cache):
+    remember(cache, wordmark("ACME"), "Acme")
+    image_fingerprint = fingerprint(wordmark("ACME"))
+    stretched = dict(image_fingerprint, aspect=image_fingerprint["aspect"] * 1.5)
+    assert cache._nearest(image_fingerprint) == "Acme"
+    assert cache._nearest(stretched) is None
+
+
+def test_unknown_is_only_cached_for_exact_bytes(cache):
+    remember(cache, wordmark("HOOLI"), "Unknown")
+    assert cache.lookup(wordmark("HOOLI"))[0] == "Unknown"
+    assert cache.lookup(wordmark("HOOLI", scale=2.0))[0] is None
+
+
+def test_index_is_rebuilt_from_disk(tmp_path):
+    path = str(tmp_path / "logos.sqlite3")
+    remember(LogoCache(DiskCache(path)), wordmark("STARK"), "Stark")
+    reopened = LogoCache(DiskCache(path))
+    assert reopened.stats()["indexed_logos"] == 1
+    assert reopened.lookup(wordmark("STARK", scale=2.0))[0] == "Stark"
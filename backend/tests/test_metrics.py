@@ -0,0 +1,48 @@
+from metrics import Registry
+
+
+def test_counters_render_one_sample_per_label_set():
+    registry = Registry()
+    calls = registry.counter("calls_total", "Calls.", ("agent", "outcome"))
+    calls.inc(agent="agent2", outcome="ok")
+    calls.inc(2, agent="agent2", outcome="ok")
+    calls.inc(agent="agent3", outcome="error")
+    text = registry.render()
+    assert "# HELP calls_total Calls.\n# TYPE calls_total counter\n" in text
+    assert 'calls_total{agent="agent2",outcome="ok"} 3\n' in text
+    assert 'calls_total{agent="agent3",outcome="error"} 1\n' in text
+
+
+def test_registering_a_name_twice_returns_the_same_metric():
+    registry = Registry()
+    assert registry.counter("calls_total", "Calls.") is registry.counter("calls_total", "Calls.")
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency.", ("agent",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 3):
+        latency.observe(value, agent="agent1")
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{agent="agent1",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{agent="agent1",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{agent="agent1",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{agent="agent1"} 4.25' in lines
+    assert 'latency_seconds_count{agent="agent1"} 4' in lines
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.counter("calls_total", "Calls.", ("label",)).inc(label='say "hi"\\\n')
+    assert 'calls_total{label="say \\"hi\\"\\\\\\n"} 1' in registry.render()
+
+
+def test_callback_metrics_are_read_at_render_time():
+    registry = Registry()
+    depth = {"validate": 0}
+    registry.callback("queue_depth", "gauge", "Queued jobs.", lambda: {(k,): v for k, v in depth.items()}, ("queue",))
+    registry.callback("broken", "gauge", "Always fails.", lambda: 1 / 0)
+    depth["validate"] = 4
+    text = registry.render()
+    assert 'queue_depth{queue="validate"} 4' in text
+    assert "# TYPE broken gauge" in text
@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+import pipeline
+import local_provider
+from agent3 import MIN_STRATEGY_FIT_SCORE
+
+COMPANIES = [f"Pipeline Test {i} Robotics" for i in range(100)]
+
+
+@pytest.fixture
+def scraped(monkeypatch):
+    """Replaces Agent 1 with a generator over COMPANIES; returns how many were yielded so far."""
+    produced = []
+
+    async def fake_scrape_stream(url, owner=None):
+        for company in COMPANIES:
+            produced.append(company)
+            yield "company", {"Company": company, "Source": "Sponsor Page", "Logo_Url": None, "Alternate_Names": ""}
+
+    monkeypatch.setattr(pipeline, "run_scrape_stream", fake_scrape_stream)
+    # Agent 3 would spend the process-wide Gemini rate limit
+    monkeypatch.setattr(pipeline, "StrategyGenerator", FakeStrategist)
+    return produced
+
+
+class FakeStrategist:
+    def generate_single_strategy(self, row):
+        return {"company": row["Company"]}
+
+
+def make_pipeline():
+    return pipeline.LeadPipeline(queue_size=2, score_workers=1, strategy_workers=1, batch_size=1,
+                                 store=None, incremental=False)
+
+
+def test_every_company_flows_through_a_small_queue(scraped):
+    lead_pipeline = make_pipeline()
+
+    async def run():
+        return [event async for event in lead_pipeline.stream("https://example.com")]
+
+    events = asyncio.run(run())
+    kinds = [kind for kind, _ in events]
+    eligible = sum(local_provider.icp_analysis(c)["fit_score"] >= MIN_STRATEGY_FIT_SCORE for c in COMPANIES)
+    assert kinds.count("company") == kinds.count("scored") == len(COMPANIES)
+    assert kinds.count("strategy") == eligible
+    assert [row["Company"] for row in lead_pipeline.enriched_rows()] == COMPANIES
+    assert lead_pipeline.counts["generated"] == eligible
+
+
+def test_slow_reader_pauses_the_scraper(scraped):
+    lead_pipeline = make_pipeline()
+
+    async def run():
+        stream = lead_pipeline.stream("https://example.com")
+        await stream.__anext__()
+        # Nothing is read for a while; every queue between the stages fills up
+        await asyncio.sleep(0.3)
+        stalled_at = len(scraped)
+        await asyncio.wait_for(stream.aclose(), 5)
+        return stalled_at
+
+    stalled_at = asyncio.run(run())
+    assert stalled_at < 12
+    assert len(scraped) == stalled_at
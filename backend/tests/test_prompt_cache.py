@@ -0,0 +1,34 @@
+from agent2 import ICPValidator
+from agent3 import StrategyGenerator
+from local_provider import _PromptCache, _message_parts
+
+
+def lead(company):
+    return {"Company": company, "Fit_Score": 8, "Category": "High Fit", "Recommended_Product": "Predictive Spare Parts",
+            "Reasoning": f"{company} services installed equipment.", "Hook": "h"}
+
+
+def agent2_prompt(messages):
+    """Prompt text as the local provider sees it."""
+    return _message_parts(messages)[0]
+
+
+def test_agent2_prefix_is_cached_across_companies():
+    validator, cache = ICPValidator(), _PromptCache()
+    first = agent2_prompt(validator.build_analysis_messages("Caterpillar", "mining equipment"))
+    second = agent2_prompt(validator.build_analysis_messages("Zebra Technologies", "barcode printers"))
+    assert cache.cached_tokens(first) == 0
+    assert cache.cached_tokens(second) > 0
+
+
+def test_agent2_batched_calls_share_the_prefix():
+    validator, cache = ICPValidator(), _PromptCache()
+    cache.cached_tokens(agent2_prompt(validator.build_analysis_messages("Caterpillar", "mining equipment")))
+    batch = validator.build_batch_analysis_messages([("1", "Zebra Technologies", "printers"), ("2", "ServiceNow", "software")])
+    assert cache.cached_tokens(agent2_prompt(batch)) > 0
+
+
+def test_agent3_prefix_is_cached_across_companies():
+    strategist, cache = StrategyGenerator(), _PromptCache()
+    assert cache.cached_tokens(strategist.build_strategy_prompt(lead("Caterpillar"), "No contact information found.")) == 0
+    assert cache.cached_tokens(strategist.build_strategy_prompt(lead("Siemens Healthineers"), "Jane Doe - CTO")) > 0
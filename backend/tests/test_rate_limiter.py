@@ -0,0 +1,87 @@
+import pytest
+from metrics import llm_in_flight, llm_requests
+from rate_limiter import TokenBucket, is_rate_limit_error, _instrumented
+
+
+def test_reserve_within_capacity_does_not_wait():
+    bucket = TokenBucket(60)
+    bucket.updated = 0.0
+    for _ in range(60):
+        assert bucket.reserve(1, now=0.0) == 0.0
+
+
+def test_reserve_past_capacity_waits_for_refill():
+    bucket = TokenBucket(60)
+    bucket.updated = 0.0
+    bucket.reserve(60, now=0.0)
+    # 60 per minute refills one per second
+    assert bucket.reserve(2, now=0.0) == pytest.approx(2.0)
+    assert bucket.reserve(1, now=1.0) == pytest.approx(2.0)
+
+
+def test_refill_is_capped_at_capacity():
+    bucket = TokenBucket(60)
+    bucket.updated = 0.0
+    bucket.reserve(30, now=0.0)
+    bucket.reserve(0, now=3600.0)
+    assert bucket.level == 60
+
+
+def test_oversized_reservation_costs_at_most_capacity():
+    bucket = TokenBucket(60)
+    bucket.updated = 0.0
+    assert bucket.reserve(1000, now=0.0) == 0.0
+    assert bucket.level == 0
+
+
+def test_adjust_returns_unused_estimate():
+    bucket = TokenBucket(100)
+    bucket.updated = 0.0
+    bucket.reserve(80, now=0.0)
+    bucket.adjust(50, now=0.0)
+    assert bucket.level == 70
+    bucket.adjust(500, now=0.0)
+    assert bucket.level == 100
+
+
+def test_sync_follows_provider_headers():
+    bucket = TokenBucket(100)
+    bucket.updated = 0.0
+    bucket.sync(limit=500, remaining=10, now=0.0)
+    assert bucket.capacity == 500
+    assert bucket.level == 10
+    # A stale, higher remaining count never refills the bucket
+    bucket.sync(limit=None, remaining=400, now=0.0)
+    assert bucket.level == 10
+
+
+def test_rate_limit_errors_are_matched_on_status_and_type():
+    class RateLimitError(Exception):
+        pass
+
+    class ResourceExhausted(Exception):
+        code = 429
+
+    status_error = Exception("Too Many Requests")
+    status_error.status_code = 429
+    assert is_rate_limit_error(status_error)
+    assert is_rate_limit_error(RateLimitError("slow down"))
+    assert is_rate_limit_error(ResourceExhausted("quota"))
+
+
+def test_429_in_the_message_is_not_a_rate_limit():
+    assert not is_rate_limit_error(ValueError("Failed to parse JSON for Studio 429"))
+    assert not is_rate_limit_error(RuntimeError("context length 14290 exceeds the limit"))
+    server_error = Exception("500 Internal Server Error for https://example.com/429")
+    server_error.status_code = 500
+    assert not is_rate_limit_error(server_error)
+
+
+def test_in_flight_gauge_is_released_when_the_call_fails():
+    provider = "test-in-flight"
+    with pytest.raises(ValueError):
+        with _instrumented(provider, "agent2"):
+            assert llm_in_flight.values[(provider,)] == 1
+            raise ValueError("bad response")
+    assert llm_in_flight.values[(provider,)] == 0
+    assert llm_requests.values[(provider, "agent2", "error")] == 1
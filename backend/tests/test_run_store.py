@@ -0,0 +1,43 @@
+import io
+import pandas as pd
+from run_store import RunStore, run_id_from_filename, to_excel_bytes
+
+
+def test_round_trip_through_parquet(tmp_path):
+    records = [{"Company": "Acme", "Fit_Score": 8}, {"Company": "Globex", "Fit_Score": 5}]
+    RunStore(str(tmp_path)).save("leads_raw_1", records)
+    # A new store has nothing in memory, so this reads the Parquet file
+    assert RunStore(str(tmp_path)).records("leads_raw_1") == records
+
+
+def test_mixed_type_columns_are_stored_as_strings(tmp_path):
+    RunStore(str(tmp_path)).save("leads_enriched_1", [{"Fit_Score": 7}, {"Fit_Score": "8"}])
+    assert list(RunStore(str(tmp_path)).load("leads_enriched_1")["Fit_Score"]) == ["7", "8"]
+
+
+def test_loads_are_copies(tmp_path):
+    store = RunStore(str(tmp_path))
+    store.save("run", [{"Company": "Acme"}])
+    df = store.load("run")
+    df.loc[0, "Company"] = "Changed"
+    assert store.records("run") == [{"Company": "Acme"}]
+
+
+def test_memory_keeps_only_recent_runs(tmp_path):
+    store = RunStore(str(tmp_path), memory_runs=1)
+    store.save("first", [{"Company": "Acme"}])
+    store.save("second", [{"Company": "Globex"}])
+    assert list(store.memory) == ["second"]
+    assert store.exists("first") and store.records("first") == [{"Company": "Acme"}]
+    assert not store.exists("missing") and store.load("missing") is None
+
+
+def test_run_ids_come_from_download_names():
+    assert run_id_from_filename("leads_raw_abc-123.xlsx") == "leads_raw_abc-123"
+    assert run_id_from_filename("../../etc/passwd") == "passwd"
+    assert run_id_from_filename("bad name.xlsx") is None
+
+
+def test_excel_is_rendered_on_demand():
+    df = pd.DataFrame([{"Company": "Acme", "Fit_Score": 8}])
+    assert pd.read_excel(io.BytesIO(to_excel_bytes(df))).to_dict(orient="records") == [{"Company": "Acme", "Fit_Score": 8}]
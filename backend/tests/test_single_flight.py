@@ -0,0 +1,69 @@
+import time
+import asyncio
+import threading
+import pytest
+from single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight("test_share")
+    calls = []
+    release = threading.Event()
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", work))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    # Let every follower join the flight before the leader finishes
+    deadline = time.time() + 5
+    while flight.stats()["shared"] < 4 and time.time() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"executed": 1, "shared": 4, "in_flight": 0}
+
+
+def test_finished_calls_are_not_cached():
+    flight = SingleFlight("test_not_cached")
+    assert flight.do("key", lambda: 1) == 1
+    assert flight.do("key", lambda: 2) == 2
+
+
+def test_leader_error_reaches_followers():
+    flight = SingleFlight("test_error")
+    future, leader = flight.claim("key")
+    follower, follower_leads = flight.claim("key")
+    assert leader and not follower_leads
+    flight.resolve("key", future, error=ValueError("boom"))
+    with pytest.raises(ValueError):
+        follower.result()
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_async_cancellation_releases_followers():
+    flight = SingleFlight("test_cancel")
+
+    async def main():
+        started = asyncio.Event()
+
+        async def work():
+            started.set()
+            await asyncio.sleep(10)
+
+        leader = asyncio.create_task(flight.do_async("key", work))
+        await started.wait()
+        follower = asyncio.create_task(flight.do_async("key", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(RuntimeError):
+            await follower
+
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+import math
+from disk_cache import DiskCache
+from strategy_store import StrategyStore, strategy_key
+
+
+def make_store(tmp_path, max_entries=20000, memory_entries=2):
+    return StrategyStore(
+        DiskCache(str(tmp_path / "strategies.sqlite3"), max_entries=max_entries),
+        DiskCache(str(tmp_path / "refs.sqlite3"), max_entries=None),
+        memory_entries=memory_entries,
+    )
+
+
+def lead(fit_score=8, company="Acme", **fields):
+    return {"Company": company, "Fit_Score": fit_score, "Category": "High Fit", "Recommended_Product": "ResolveGPT",
+            "Reasoning": "r", "Hook": "h", **fields}
+
+
+def test_writes_do_not_count_as_cache_misses(tmp_path):
+    store = make_store(tmp_path)
+    store.put(lead(), {"email": "v1"})
+    store.put(lead(9), {"email": "v2"})
+    disk = store.stats()["disk"]
+    assert (disk["hits"], disk["misses"]) == (0, 0)
+
+
+def test_new_inputs_replace_the_previous_strategy(tmp_path):
+    store = make_store(tmp_path)
+    store.put(lead(8), {"email": "v1"})
+    store.put(lead(9), {"email": "v2"})
+    assert store.get(lead(9)) == {"email": "v2"}
+    # Read through the disk layer, not the memory LRU
+    assert make_store(tmp_path).get(lead(8)) is None
+
+
+def test_equivalent_inputs_hit(tmp_path):
+    store = make_store(tmp_path)
+    store.put(lead(9), {"email": "v"})
+    assert make_store(tmp_path).get(lead(9.0)) == {"email": "v"}
+
+
+def test_missing_values_key_alike_raw_or_sanitized():
+    # Raw DataFrame rows carry NaN; main.sanitize_data turns it into 0
+    raw = lead(float("nan"), Reasoning=float("nan"))
+    sanitized = lead(0, Reasoning=0)
+    assert strategy_key(raw) == strategy_key(sanitized) == strategy_key(lead(None, Reasoning=None))
+    assert strategy_key(raw) != strategy_key(lead(7, Reasoning=math.nan))
+
+
+def test_category_is_a_strategy_input():
+    assert strategy_key(lead()) != strategy_key(lead(Category="Moderate Fit"))
+
+
+def test_update_invalidates_after_heavy_traffic(tmp_path):
+    # No memory layer, so every read touches the strategy on disk
+    store = make_store(tmp_path, max_entries=100, memory_entries=0)
+    store.put(lead(8), {"email": "v1"})
+    # Other companies fill the strategy cache while Acme's strategy keeps being read
+    for i in range(300):
+        store.put(lead(company=f"Other {i}"), {"email": i})
+        assert store.get(lead(8)) is not None
+    store.put(lead(9), {"email": "v2"})
+    assert make_store(tmp_path).get(lead(8)) is None
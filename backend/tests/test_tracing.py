@@ -0,0 +1,37 @@
+import os
+import time
+import tracing
+from tracing import JsonlExporter, Span
+
+
+def write_trace(exporter, trace_id, age_days=0):
+    exporter.export(Span("run", trace_id))
+    modified = time.time() - age_days * 86400
+    os.utime(exporter.path(trace_id), (modified, modified))
+
+
+def test_prune_keeps_newest_files(tmp_path):
+    exporter = JsonlExporter(str(tmp_path), max_files=2, max_age_days=0)
+    for age, trace_id in enumerate(["newest", "middle", "oldest"]):
+        write_trace(exporter, trace_id, age_days=age)
+    exporter.prune()
+    assert sorted(os.listdir(tmp_path)) == ["middle.jsonl", "newest.jsonl"]
+
+
+def test_prune_deletes_expired_files(tmp_path):
+    exporter = JsonlExporter(str(tmp_path), max_files=0, max_age_days=7)
+    write_trace(exporter, "recent", age_days=1)
+    write_trace(exporter, "expired", age_days=8)
+    exporter.prune()
+    assert exporter.load("expired") is None
+    assert len(exporter.load("recent")) == 1
+
+
+def test_new_trace_prunes(tmp_path, monkeypatch):
+    exporter = JsonlExporter(str(tmp_path), max_files=1, max_age_days=0)
+    monkeypatch.setattr(tracing, "exporter", exporter)
+    write_trace(exporter, "older", age_days=2)
+    write_trace(exporter, "old", age_days=1)
+    with tracing.start_trace("scrape") as root:
+        pass
+    assert sorted(os.listdir(tmp_path)) == sorted(["old.jsonl", f"{root.trace_id}.jsonl"])
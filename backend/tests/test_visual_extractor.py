@@ -0,0 +1,65 @@
+import json
+import uuid
+import asyncio
+from types import SimpleNamespace
+import local_provider
+import visual_extractor
+from visual_extractor import LogoBatcher, extract_brands_from_logos, recognize_logos_batch
+
+
+def logo(company):
+    """Synthetic logo bytes the local provider reads the company from; unique per call."""
+    return f"company:{company}\n{uuid.uuid4()}".encode()
+
+
+def answer(monkeypatch, logos):
+    def fake_completion(client, **kwargs):
+        content = json.dumps({"logos": logos})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+    monkeypatch.setattr(visual_extractor, "openai_chat_completion", fake_completion)
+
+
+def test_batch_answers_are_aligned_by_id(monkeypatch):
+    answer(monkeypatch, [{"id": "Image 2", "company": "Globex"}, {"id": 1, "company": " Acme "}])
+    assert recognize_logos_batch([b"a", b"b", b"c"]) == ["Acme", "Globex", None]
+
+
+def test_ambiguous_batch_answers_are_dropped(monkeypatch):
+    answer(monkeypatch, [{"id": "1", "company": "Acme"}, {"id": "1", "company": "Initech"}, {"id": "2", "company": ""}])
+    assert recognize_logos_batch([b"a", b"b"]) == [None, None]
+
+
+def test_repeated_logos_share_one_request():
+    local_provider.reset_stats()
+    acme, globex, initech = logo("Acme Corp"), logo("Globex"), logo("Initech")
+    names = extract_brands_from_logos([acme, globex, acme, initech])
+    assert names == ["Acme Corp", "Globex", "Acme Corp", "Initech"]
+    assert local_provider.stats()["calls"] == {"vision": 1}
+    # Answered from the logo cache the second time
+    assert extract_brands_from_logos([globex, initech]) == ["Globex", "Initech"]
+    assert local_provider.stats()["calls"] == {"vision": 1}
+
+
+def test_items_missing_from_the_batch_are_sent_alone(monkeypatch):
+    monkeypatch.setattr(visual_extractor, "recognize_logos_batch", lambda images: ["Hooli", None])
+    singles = []
+
+    def recognize_logo(image_bytes):
+        singles.append(image_bytes)
+        return "Pied Piper"
+
+    monkeypatch.setattr(visual_extractor, "recognize_logo", recognize_logo)
+    hooli, piper = logo("Hooli"), logo("Pied Piper")
+    assert extract_brands_from_logos([hooli, piper]) == ["Hooli", "Pied Piper"]
+    assert singles == [piper]
+
+
+def test_logo_batcher_groups_concurrent_logos():
+    local_provider.reset_stats()
+
+    async def main():
+        batcher = LogoBatcher(batch_size=3, max_wait=0.05)
+        return await asyncio.gather(*(batcher.recognize(logo(name)) for name in ("Stark", "Wayne", "Tyrell")))
+
+    assert asyncio.run(main()) == ["Stark", "Wayne", "Tyrell"]
+    assert local_provider.stats()["calls"] == {"vision": 1}
@@ -0,0 +1,74 @@
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Usage of the run the current code belongs to (None outside a tracked run)
+_run_usage = contextvars.ContextVar("run_usage", default=None)
+
+
+class TokenUsage:
+    """
+    Prompt, cached-prompt and total tokens reported by LLM responses, per provider.
+    cached_ratio is the share of prompt tokens served from the provider's prompt cache.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_provider = {}
+
+    def add(self, provider, prompt_tokens, cached_tokens, total_tokens):
+        with self.lock:
+            counts = self.by_provider.setdefault(
+                provider, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "total_tokens": 0}
+            )
+            counts["calls"] += 1
+            counts["prompt_tokens"] += prompt_tokens or 0
+            counts["cached_tokens"] += cached_tokens or 0
+            counts["total_tokens"] += total_tokens or 0
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                provider: {
+                    **counts,
+                    "cached_ratio": round(counts["cached_tokens"] / counts["prompt_tokens"], 3) if counts["prompt_tokens"] else 0.0,
+                }
+                for provider, counts in self.by_provider.items()
+            }
+
+
+# Everything since the process started
+total_usage = TokenUsage()
+
+
+def record_usage(provider, prompt_tokens, cached_tokens, total_tokens):
+    """Adds one response's usage to the process totals and the current run, if any."""
+    total_usage.add(provider, prompt_tokens, cached_tokens, total_tokens)
+    usage = _run_usage.get()
+    if usage is not None:
+        usage.add(provider, prompt_tokens, cached_tokens, total_tokens)
+
+
+@contextmanager
+def track_usage(usage=None):
+    """
+    Attributes LLM usage inside the block to usage (a new TokenUsage by default).
+    asyncio tasks and asyncio.to_thread inherit it; thread pools need bind_usage.
+    """
+    usage = usage or TokenUsage()
+    token = _run_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _run_usage.reset(token)
+
+
+def bind_usage(fn):
+    """Wraps fn so calls from worker threads count towards the caller's run."""
+    usage = _run_usage.get()
+    if usage is None:
+        return fn
+
+    def bound(*args, **kwargs):
+        with track_usage(usage):
+            return fn(*args, **kwargs)
+    return bound
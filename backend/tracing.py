@@ -0,0 +1,317 @@
+import os
+import re
+import json
+import math
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Finished spans are appended to <TRACE_DIR>/<trace_id>.jsonl
+TRACE_DIR = os.getenv("TRACE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces"))
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") != "0"
+# Trace files kept: the oldest beyond TRACE_MAX_FILES, or older than TRACE_RETENTION_DAYS, are deleted (0 disables)
+TRACE_MAX_FILES = int(os.getenv("TRACE_MAX_FILES", "500"))
+TRACE_RETENTION_DAYS = float(os.getenv("TRACE_RETENTION_DAYS", "14"))
+
+_TRACE_ID = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+# Span that new spans become children of (None outside a trace)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    One timed operation of a trace. set() records attributes (model, company,
+    cache hit); add() accumulates counters such as tokens and retries.
+    """
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = {key: value for key, value in (attributes or {}).items() if value is not None}
+        self.status = "ok"
+        self.error = None
+        self.start_time = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.lock = threading.Lock()
+
+    def set(self, **attributes):
+        with self.lock:
+            self.attributes.update({key: value for key, value in attributes.items() if value is not None})
+
+    def add(self, **counts):
+        with self.lock:
+            for key, amount in counts.items():
+                self.attributes[key] = self.attributes.get(key, 0) + (amount or 0)
+
+    def end(self):
+        self.duration = time.perf_counter() - self.started
+
+    def to_dict(self):
+        with self.lock:
+            attributes = dict(self.attributes)
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_time,
+            "duration": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "attributes": attributes,
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span outside a trace, so callers never need to check."""
+    trace_id = None
+    span_id = None
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, **counts):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class JsonlExporter:
+    """
+    Appends each finished span as one JSON line to the file of its trace.
+    prune() keeps at most max_files traces, none older than max_age_days.
+    """
+    def __init__(self, directory, max_files=TRACE_MAX_FILES, max_age_days=TRACE_RETENTION_DAYS):
+        self.directory = directory
+        self.max_files = max_files
+        self.max_age_days = max_age_days
+        self.lock = threading.Lock()
+
+    def path(self, trace_id):
+        if not is_valid_trace_id(trace_id):
+            return None
+        return os.path.join(self.directory, f"{trace_id}.jsonl")
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), default=str)
+        try:
+            with self.lock:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self.path(span.trace_id), "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except Exception as e:
+            print(f"Failed to export span {span.name}: {e}")
+
+    def prune(self):
+        """Deletes the least recently written trace files beyond the limits."""
+        if not os.path.isdir(self.directory):
+            return
+        try:
+            with self.lock, os.scandir(self.directory) as entries:
+                files = sorted(
+                    ((entry.stat().st_mtime, entry.path) for entry in entries if entry.name.endswith(".jsonl")),
+                    reverse=True,
+                )
+                cutoff = time.time() - self.max_age_days * 86400 if self.max_age_days else None
+                for position, (modified, path) in enumerate(files):
+                    if (self.max_files and position >= self.max_files) or (cutoff and modified < cutoff):
+                        os.remove(path)
+        except Exception as e:
+            print(f"Failed to prune traces: {e}")
+
+    def load(self, trace_id):
+        """Span dicts of a trace in completion order; None if the trace is unknown."""
+        path = self.path(trace_id)
+        if path is None or not os.path.exists(path):
+            return None
+        spans = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    # A line still being written by a running trace
+                    continue
+        return spans
+
+
+exporter = JsonlExporter(TRACE_DIR)
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+def is_valid_trace_id(trace_id):
+    """Trace IDs name files, so only letters, digits, '-' and '_' are allowed."""
+    return bool(_TRACE_ID.match(trace_id or ""))
+
+
+def current_span():
+    """The active span, or a no-op span outside a trace."""
+    return _current_span.get() or NOOP_SPAN
+
+
+def annotate(**attributes):
+    """Sets attributes on the active span, if any."""
+    current_span().set(**attributes)
+
+
+@contextmanager
+def _activate(span):
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.status = "error"
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Async generator closed from another context
+            pass
+        span.end()
+        exporter.export(span)
+
+
+@contextmanager
+def start_trace(name, trace_id=None, **attributes):
+    """
+    Root span of one run. Passing the trace_id of an earlier run (the scrape a
+    validation came from) adds this run to the same trace.
+    """
+    if not TRACING_ENABLED:
+        yield NOOP_SPAN
+        return
+    if trace_id is None:
+        exporter.prune()
+    with _activate(Span(name, trace_id or new_trace_id(), None, attributes)) as root:
+        yield root
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Child of the active span. asyncio tasks and asyncio.to_thread inherit the
+    active span; thread pools need bind_trace. A no-op outside a trace.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    with _activate(Span(name, parent.trace_id, parent.span_id, attributes)) as child:
+        yield child
+
+
+@contextmanager
+def use_span(parent):
+    """
+    Makes parent (a span captured elsewhere with current_span) the active span
+    inside the block. The no-op span detaches the block from any trace.
+    """
+    parent = parent if isinstance(parent, Span) else None
+    token = _current_span.set(parent)
+    try:
+        yield parent or NOOP_SPAN
+    finally:
+        _current_span.reset(token)
+
+
+def bind_trace(fn):
+    """Wraps fn so spans opened from worker threads join the caller's trace."""
+    parent = _current_span.get()
+    if parent is None:
+        return fn
+
+    def bound(*args, **kwargs):
+        with use_span(parent):
+            return fn(*args, **kwargs)
+    return bound
+
+
+def _percentile(values, pct):
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+def summarize_trace(trace_id, slowest=10):
+    """
+    Where the time of a trace went: time per span name (spans overlap, so totals
+    can exceed wall time), LLM tokens and retries per model and the slowest
+    companies per stage. None if the trace is unknown.
+    """
+    spans = exporter.load(trace_id)
+    if spans is None:
+        return None
+    spans = [s for s in spans if s.get("duration") is not None]
+    if not spans:
+        return {"trace_id": trace_id, "spans": 0, "wall_seconds": 0.0, "runs": [], "stages": {}, "models": {}, "slowest": {}}
+
+    by_name = {}
+    for s in spans:
+        by_name.setdefault(s["name"], []).append(s)
+
+    stages = {}
+    for name, group in by_name.items():
+        durations = sorted(s["duration"] for s in group)
+        stages[name] = {
+            "count": len(group),
+            "total_seconds": round(sum(durations), 3),
+            "p50_seconds": round(_percentile(durations, 50), 3),
+            "p95_seconds": round(_percentile(durations, 95), 3),
+            "max_seconds": round(durations[-1], 3),
+            "errors": sum(1 for s in group if s.get("status") == "error"),
+        }
+    stages = dict(sorted(stages.items(), key=lambda item: item[1]["total_seconds"], reverse=True))
+
+    models = {}
+    for s in by_name.get("llm", []):
+        attributes = s["attributes"]
+        counts = models.setdefault(
+            f"{attributes.get('provider', '')}:{attributes.get('model', '')}",
+            {"calls": 0, "seconds": 0.0, "prompt_tokens": 0, "cached_tokens": 0, "total_tokens": 0, "retries": 0, "rate_limit_wait": 0.0},
+        )
+        counts["calls"] += 1
+        counts["seconds"] = round(counts["seconds"] + s["duration"], 3)
+        for key in ("prompt_tokens", "cached_tokens", "total_tokens", "retries"):
+            counts[key] += attributes.get(key) or 0
+        counts["rate_limit_wait"] = round(counts["rate_limit_wait"] + (attributes.get("rate_limit_wait") or 0), 3)
+
+    # Slowest companies in each per-company stage
+    per_company = {}
+    for s in spans:
+        company = s["attributes"].get("company")
+        if company:
+            per_company.setdefault(s["name"], []).append({"company": company, "seconds": round(s["duration"], 3)})
+    slowest_companies = {
+        name: sorted(rows, key=lambda row: row["seconds"], reverse=True)[:slowest]
+        for name, rows in per_company.items()
+    }
+
+    start = min(s["start"] for s in spans)
+    end = max(s["start"] + s["duration"] for s in spans)
+    return {
+        "trace_id": trace_id,
+        "spans": len(spans),
+        "wall_seconds": round(end - start, 3),
+        "runs": [
+            {"name": s["name"], "seconds": round(s["duration"], 3), "status": s["status"], "attributes": s["attributes"]}
+            for s in sorted(spans, key=lambda s: s["start"]) if s.get("parent_id") is None
+        ],
+        "stages": stages,
+        "models": models,
+        "slowest": slowest_companies,
+    }
@@ -1,11 +1,36 @@
 import base64
 import os
-from openai import OpenAI
+import json
+import asyncio
 from dotenv import load_dotenv
+from rate_limiter import openai_chat_completion
+from logo_cache import logo_cache, content_hash
+from single_flight import SingleFlight
+from batching import MicroBatcher
+from providers import chat_client
+from metrics import vision_images
+from tracing import annotate
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = chat_client(os.getenv("OPENAI_API_KEY"))
+
+# Logos packed into one vision request, and how long to wait for a batch to fill
+LOGO_BATCH_SIZE = int(os.getenv("LOGO_BATCH_SIZE", "8"))
+LOGO_BATCH_WAIT = float(os.getenv("LOGO_BATCH_WAIT", "0.25"))
+LOGO_BATCH_CONCURRENCY = int(os.getenv("LOGO_BATCH_CONCURRENCY", "4"))
+
+# Logos being recognised right now, keyed by content hash, so concurrent
+# scrapes of the same sponsor send it to the vision API only once
+logo_flight = SingleFlight("extract_brand_from_logo")
+
+BATCH_SYSTEM_PROMPT = (
+    "You are a helpful assistant that extracts company names from logos. "
+    "You will receive several images, each preceded by its label 'Image <id>'. "
+    "Return a JSON object {\"logos\": [{\"id\": \"<id>\", \"company\": \"<company name>\"}]} "
+    "with exactly one entry per image. Use ONLY the company name. "
+    "If no company name is found or it's illegible, use 'Unknown'."
+)
 
 def encode_image(image_path):
     with open(image_path, "rb") as image_file:
@@ -14,17 +39,43 @@ def encode_image(image_path):
 def extract_brand_from_logo(image_path_or_bytes):
     """
     Analyzes an image and extracts the brand name/company name.
+    Logos seen before (same bytes or perceptually similar) are answered from logo_cache;
+    concurrent calls for the same bytes share one vision request.
+    """
+    # Check if input is a path or bytes
+    if isinstance(image_path_or_bytes, str) and os.path.exists(image_path_or_bytes):
+        with open(image_path_or_bytes, "rb") as image_file:
+            image_bytes = image_file.read()
+    else:
+        # Assuming bytes if not a path
+        image_bytes = image_path_or_bytes
+    
+    return logo_flight.do(content_hash(image_bytes), _extract_brand, image_bytes)
+
+def _extract_brand(image_bytes):
+    company, sha, image_fingerprint = logo_cache.lookup(image_bytes)
+    annotate(logo_cache_hit=company is not None)
+    if company is not None:
+        return company
+    
+    company = recognize_logo(image_bytes)
+    # Errors are transient, so they are not cached
+    if company != "Error":
+        logo_cache.store(sha, image_fingerprint, company)
+    return company
+
+def recognize_logo(image_bytes):
+    """
+    Sends one logo to GPT-4o vision and returns the company name, 'Unknown' or 'Error'.
     """
     try:
-        # Check if input is a path or bytes
-        if isinstance(image_path_or_bytes, str) and os.path.exists(image_path_or_bytes):
-            base64_image = encode_image(image_path_or_bytes)
-        else:
-            # Assuming bytes if not a path
-            # If it's pure bytes, we encode it
-            base64_image = base64.b64encode(image_path_or_bytes).decode('utf-8')
+        base64_image = base64.b64encode(image_bytes).decode('utf-8')
 
-        response = client.chat.completions.create(
+        vision_images.inc()
+        response = openai_chat_completion(
+            client,
+            label="logo",
+            agent="agent1",
             model="gpt-4o",
             messages=[
                 {
@@ -50,3 +101,135 @@ def extract_brand_from_logo(image_path_or_bytes):
     except Exception as e:
         print(f"Error extracting logo: {e}")
         return "Error"
+
+def recognize_logos_batch(images):
+    """
+    Sends several logos in one GPT-4o request. Returns names aligned with images;
+    None marks items that were missing or ambiguous in the response.
+    """
+    content = [{"type": "text", "text": f"What is the company name in each of these {len(images)} logos?"}]
+    for image_id, image_bytes in enumerate(images, start=1):
+        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+        content.append({"type": "text", "text": f"Image {image_id}"})
+        content.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}})
+    
+    try:
+        vision_images.inc(len(images))
+        response = openai_chat_completion(
+            client,
+            label=f"logo batch of {len(images)}",
+            agent="agent1",
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": content}
+            ],
+            response_format={"type": "json_object"},
+            max_tokens=50 + 30 * len(images)
+        )
+        entries = json.loads(response.choices[0].message.content).get("logos", [])
+    except Exception as e:
+        print(f"Error extracting logo batch: {e}")
+        return [None] * len(images)
+    
+    names = {}
+    duplicates = set()
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        image_id = str(entry.get("id", "")).replace("Image", "").strip()
+        company = entry.get("company")
+        if not isinstance(company, str) or not company.strip():
+            continue
+        if image_id in names:
+            duplicates.add(image_id)
+        names[image_id] = company.strip()
+    
+    return [
+        None if str(image_id) in duplicates else names.get(str(image_id))
+        for image_id in range(1, len(images) + 1)
+    ]
+
+def extract_brands_from_logos(images):
+    """
+    Batch counterpart of extract_brand_from_logo: cache first, then batched vision
+    requests, falling back to the single-image path for items the batch could not resolve.
+    """
+    results = [None] * len(images)
+    # Repeated logos (header, footer, carousel) are only sent once
+    misses = {}
+    # Logos another caller is already recognising: wait for its answer
+    shared = {}
+    for index, image_bytes in enumerate(images):
+        company, sha, image_fingerprint = logo_cache.lookup(image_bytes)
+        if company is not None:
+            results[index] = company
+        elif sha in misses:
+            misses[sha][0].append(index)
+        elif sha in shared:
+            shared[sha][0].append(index)
+        else:
+            future, leader = logo_flight.claim(sha)
+            if leader:
+                misses[sha] = ([index], image_bytes, image_fingerprint, future)
+            else:
+                shared[sha] = ([index], future)
+    
+    pending = list(misses.items())
+    annotate(
+        logo_cache_hits=sum(1 for company in results if company is not None),
+        vision_logos=len(pending),
+        shared_logos=len(shared),
+    )
+    try:
+        for start in range(0, len(pending), LOGO_BATCH_SIZE):
+            chunk = pending[start:start + LOGO_BATCH_SIZE]
+            if len(chunk) > 1:
+                names = recognize_logos_batch([image_bytes for _, (_, image_bytes, _, _) in chunk])
+            else:
+                names = [None]
+            
+            for (sha, (indexes, image_bytes, image_fingerprint, future)), company in zip(chunk, names):
+                if company is None:
+                    company = recognize_logo(image_bytes)
+                # Errors are transient, so they are not cached
+                if company != "Error":
+                    logo_cache.store(sha, image_fingerprint, company)
+                logo_flight.resolve(sha, future, company)
+                for index in indexes:
+                    results[index] = company
+    finally:
+        # Never leave other callers waiting on a logo this call claimed
+        for sha, (_, _, _, future) in pending:
+            if not future.done():
+                logo_flight.resolve(sha, future, "Error")
+    
+    # Only waited on after our own claims are resolved, so two batches can't block each other
+    for sha, (indexes, future) in shared.items():
+        company = future.result()
+        for index in indexes:
+            results[index] = company
+    
+    return results
+
+class LogoBatcher(MicroBatcher):
+    """
+    Collects logos from concurrent tasks into batched vision requests. A batch is
+    sent when it is full or LOGO_BATCH_WAIT seconds after its first logo arrived.
+    Must be used from a single event loop.
+    """
+    span_name = "logo_batch"
+
+    def __init__(self, batch_size=LOGO_BATCH_SIZE, max_wait=LOGO_BATCH_WAIT, concurrency=LOGO_BATCH_CONCURRENCY):
+        super().__init__(self._recognize_batch, batch_size, max_wait, concurrency)
+
+    async def recognize(self, image_bytes):
+        """Company name for one logo, resolved as part of a batch."""
+        return await self.submit(image_bytes)
+
+    async def _recognize_batch(self, images):
+        try:
+            return await asyncio.to_thread(extract_brands_from_logos, images)
+        except Exception as e:
+            print(f"Error extracting logo batch: {e}")
+            return ["Error"] * len(images)
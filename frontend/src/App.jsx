@@ -133,13 +133,25 @@ function App() {
 
       setProgressStep('validating'); // Start Agent 2
 
-      // Step 2: Validate
-      const validateResponse = await axios.post(`${API_URL}/validate`, {
+      // Step 2: Validate (runs as a background job on the server)
+      const jobResponse = await axios.post(`${API_URL}/validate`, {
         filename: scrapeResponse.data.filename
-      }, {
-        timeout: 300000 // 5 minutes for Agent 2 to process all companies
       });
 
+      // Poll job status, showing partial results as companies are scored
+      let job = null;
+      while (true) {
+        const statusResponse = await axios.get(`${API_URL}${jobResponse.data.status_url}`);
+        job = statusResponse.data;
+        if (job.status === 'completed') break;
+        if (job.status === 'failed') throw new Error(job.error || 'Validation failed');
+        if (job.partial_results && job.partial_results.length > 0) {
+          setData([...job.partial_results].sort((a, b) => (b.Fit_Score || 0) - (a.Fit_Score || 0)));
+        }
+        await new Promise(r => setTimeout(r, 1500));
+      }
+      const validateResponse = { data: job.result };
+
       // Sort by Fit_Score (high to low) before displaying
       const sortedData = validateResponse.data.data.sort((a, b) => {
         const scoreA = a.Fit_Score || 0;